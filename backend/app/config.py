@@ -9,11 +9,133 @@ class Settings:
     # Database
     database_url: str = config("DATABASE_URL", default="sqlite:///./backend/task_management.db")
     
+    # Connection pool (QueuePool for PostgreSQL and file-based SQLite)
+    db_pool_size: int = config("DB_POOL_SIZE", default=5, cast=int)
+    db_max_overflow: int = config("DB_MAX_OVERFLOW", default=10, cast=int)
+    db_pool_timeout: float = config("DB_POOL_TIMEOUT", default=30, cast=float)
+    db_pool_recycle: int = config("DB_POOL_RECYCLE", default=1800, cast=int)
+    db_pool_pre_ping: bool = config("DB_POOL_PRE_PING", default=True, cast=bool)
+    
+    # SQLite pragmas applied to every new connection
+    sqlite_journal_mode: str = config("SQLITE_JOURNAL_MODE", default="wal")
+    sqlite_synchronous: str = config("SQLITE_SYNCHRONOUS", default="normal")
+    sqlite_busy_timeout_ms: int = config("SQLITE_BUSY_TIMEOUT_MS", default=30000, cast=int)
+    sqlite_mmap_size: int = config("SQLITE_MMAP_SIZE", default=268435456, cast=int)
+    sqlite_cache_size_kib: int = config("SQLITE_CACHE_SIZE_KIB", default=65536, cast=int)
+    
+    # Shard task data by user across these databases (comma-separated, same backend as
+    # DATABASE_URL, which keeps users and the shard map and may itself be listed).
+    # Workers cache a user's shard for SHARD_MAP_TTL_SECONDS; moves wait that long.
+    # Task ids come from a sequence on DATABASE_URL, SHARD_ID_BLOCK_SIZE at a time
+    shard_database_urls: List[str] = config("SHARD_DATABASE_URLS", default="", cast=lambda value: [url.strip() for url in value.split(",") if url.strip()])
+    shard_map_ttl_seconds: float = config("SHARD_MAP_TTL_SECONDS", default=5, cast=float)
+    shard_id_block_size: int = config("SHARD_ID_BLOCK_SIZE", default=1000, cast=int)
+    
+    # Serve requests from async routers on an AsyncSession (aiosqlite / asyncpg)
+    async_db_enabled: bool = config("ASYNC_DB_ENABLED", default=False, cast=bool)
+    
+    # Serve task lists from column rows encoded with orjson, skipping pydantic validation
+    fast_serialization_enabled: bool = config("FAST_SERIALIZATION_ENABLED", default=False, cast=bool)
+    
+    # Largest list accepted by the /api/tasks/bulk endpoints
+    bulk_max_items: int = config("BULK_MAX_ITEMS", default=1000, cast=int)
+    
+    # Group commit: single-task creates, updates and deletes from concurrent requests are
+    # committed together by one writer thread per database, which waits up to
+    # GROUP_COMMIT_WINDOW_MS after the first write for more, up to GROUP_COMMIT_MAX_BATCH
+    group_commit_enabled: bool = config("GROUP_COMMIT_ENABLED", default=False, cast=bool)
+    group_commit_window_ms: float = config("GROUP_COMMIT_WINDOW_MS", default=2, cast=float)
+    group_commit_max_batch: int = config("GROUP_COMMIT_MAX_BATCH", default=64, cast=int)
+    
+    # Maintain per-user task counters so stats are a single primary-key read
+    task_counters_enabled: bool = config("TASK_COUNTERS_ENABLED", default=False, cast=bool)
+    
+    # Count task writes into hourly and daily rollups for the admin analytics endpoints;
+    # committed counts are added to the tables every TASK_ROLLUPS_FLUSH_SECONDS by each
+    # worker. Backfill existing data with python -m app.utils.task_rollups
+    task_rollups_enabled: bool = config("TASK_ROLLUPS_ENABLED", default=False, cast=bool)
+    task_rollups_flush_seconds: float = config("TASK_ROLLUPS_FLUSH_SECONDS", default=5, cast=float)
+    
+    # Background reminders for task due dates; the lock lets one worker per host fire them,
+    # and other workers' writes are picked up by a sweep around the current time
+    reminders_enabled: bool = config("REMINDERS_ENABLED", default=True, cast=bool)
+    reminder_sweep_seconds: float = config("REMINDER_SWEEP_SECONDS", default=60, cast=float)
+    
+    # Live change feed on /api/tasks/events; the unix broker shares events between the
+    # workers of one host, slow clients past the queue size get a resync event instead.
+    # Streams end after TASK_EVENTS_MAX_STREAM_SECONDS and the browser reconnects, which
+    # re-checks the token and lets workers restart without waiting on open feeds. Browsers
+    # connect with a ticket from POST /api/tasks/events/ticket, valid for TICKET_SECONDS
+    task_events_enabled: bool = config("TASK_EVENTS_ENABLED", default=True, cast=bool)
+    task_events_broker: str = config("TASK_EVENTS_BROKER", default="unix")
+    task_events_queue_size: int = config("TASK_EVENTS_QUEUE_SIZE", default=256, cast=int)
+    task_events_max_subscribers: int = config("TASK_EVENTS_MAX_SUBSCRIBERS", default=10, cast=int)
+    task_events_heartbeat_seconds: float = config("TASK_EVENTS_HEARTBEAT_SECONDS", default=15, cast=float)
+    task_events_max_stream_seconds: float = config("TASK_EVENTS_MAX_STREAM_SECONDS", default=300, cast=float)
+    task_events_ticket_seconds: int = config("TASK_EVENTS_TICKET_SECONDS", default=60, cast=int)
+    
+    # Delta sync on /api/tasks/changes: sync tokens expire, and tombstones of deleted
+    # tasks can be purged (python -m app.utils.task_sync), after this many days
+    task_sync_retention_days: int = config("TASK_SYNC_RETENTION_DAYS", default=30, cast=int)
+    
+    # Archiver (python -m app.utils.task_archive): moves tasks done for longer than
+    # this many days to tasks_archive, this many per transaction
+    task_archive_after_days: int = config("TASK_ARCHIVE_AFTER_DAYS", default=90, cast=int)
+    task_archive_batch_size: int = config("TASK_ARCHIVE_BATCH_SIZE", default=1000, cast=int)
+    
+    # Cache rendered task lists, keyed by user, task list version and normalized query.
+    # memory is an LRU per worker bounded by RESPONSE_CACHE_MAX_BYTES; directory shares
+    # entries between the workers of one host
+    response_cache_enabled: bool = config("RESPONSE_CACHE_ENABLED", default=True, cast=bool)
+    response_cache_backend: str = config("RESPONSE_CACHE_BACKEND", default="memory")
+    response_cache_max_bytes: int = config("RESPONSE_CACHE_MAX_BYTES", default=16777216, cast=int)
+    
+    # Admission control per worker: token-bucket rate limits ("[METHOD] /path-prefix=user|ip:COUNT/s|m|h",
+    # 429 past them) and a cap on requests in flight; requests over the cap queue, and are shed
+    # with a 503 past ADMISSION_MAX_QUEUED waiting or after waiting ADMISSION_MAX_QUEUE_MS.
+    # No ip: rules by default: behind the platform's proxy every client would share its address
+    admission_enabled: bool = config("ADMISSION_ENABLED", default=True, cast=bool)
+    rate_limits: str = config("RATE_LIMITS", default="/api/tasks=user:20/s")
+    admission_max_in_flight: int = config("ADMISSION_MAX_IN_FLIGHT", default=64, cast=int)
+    admission_max_queued: int = config("ADMISSION_MAX_QUEUED", default=256, cast=int)
+    admission_max_queue_ms: float = config("ADMISSION_MAX_QUEUE_MS", default=2000, cast=float)
+    
+    # Request metrics on /metrics; requests slower than SLOW_REQUEST_MS are logged with their SQL (0 disables)
+    metrics_enabled: bool = config("METRICS_ENABLED", default=True, cast=bool)
+    slow_request_ms: float = config("SLOW_REQUEST_MS", default=500, cast=float)
+    
+    # Request profiling, switched at runtime by admins (PUT /api/admin/profiling) or on from start.
+    # While on, requests an admin flags with X-Profile: 1 or ?profile=1, and PROFILE_SAMPLE_RATE
+    # of the rest, run under cProfile and have their SQL timed;
+    # the workers of a host share the switch and the last PROFILE_BUFFER_SIZE profiles in PROFILE_DIR
+    # (default: a directory per database in the temp directory), kept private to the app's user
+    profiling_enabled: bool = config("PROFILING_ENABLED", default=False, cast=bool)
+    profile_sample_rate: float = config("PROFILE_SAMPLE_RATE", default=0, cast=float)
+    profile_buffer_size: int = config("PROFILE_BUFFER_SIZE", default=50, cast=int)
+    profile_dir: str = config("PROFILE_DIR", default="")
+    
     # JWT
     secret_key: str = config("SECRET_KEY", default="your-secret-key-here-change-in-production")
     algorithm: str = config("ALGORITHM", default="HS256")
     access_token_expire_minutes: int = config("ACCESS_TOKEN_EXPIRE_MINUTES", default=30, cast=int)
     
+    # Password hashing: KDF ("scrypt" or "pbkdf2_sha256") and its cost
+    password_kdf: str = config("PASSWORD_KDF", default="scrypt")
+    scrypt_n: int = config("SCRYPT_N", default=16384, cast=int)
+    scrypt_r: int = config("SCRYPT_R", default=8, cast=int)
+    scrypt_p: int = config("SCRYPT_P", default=1, cast=int)
+    pbkdf2_iterations: int = config("PBKDF2_ITERATIONS", default=600000, cast=int)
+    
+    # Hashing runs in a dedicated process pool (0 workers hashes on the request threadpool);
+    # beyond PASSWORD_HASH_MAX_PENDING queued hashes, logins and registrations get a 503
+    password_hash_workers: int = config("PASSWORD_HASH_WORKERS", default=2, cast=int)
+    password_hash_max_pending: int = config("PASSWORD_HASH_MAX_PENDING", default=16, cast=int)
+    
+    # Authenticated-user cache (0 entries disables it); committed changes to a user are
+    # announced to the other workers through TASK_EVENTS_BROKER, even with the feed off
+    user_cache_size: int = config("USER_CACHE_SIZE", default=1024, cast=int)
+    user_cache_ttl_seconds: float = config("USER_CACHE_TTL_SECONDS", default=60, cast=float)
+    
     # CORS
     allowed_origins: List[str] = config("ALLOWED_ORIGINS", default="http://localhost:3000,http://localhost:3001,http://127.0.0.1:3000,http://127.0.0.1:3001").split(",")
     
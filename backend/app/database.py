@@ -1,7 +1,13 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql.util import find_tables
 from .config import settings
 import os
+import threading
+import time
 
 # Ensure the database directory exists
 if "sqlite" in settings.database_url:
@@ -12,14 +18,234 @@ if "sqlite" in settings.database_url:
     if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir, exist_ok=True)
 
+
+class PoolTelemetry:
+    """Checkout-wait counters shared by the engines' pools"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waiting = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def begin_wait(self):
+        with self._lock:
+            self.waiting += 1
+
+    def end_wait(self, seconds: float, timed_out: bool):
+        with self._lock:
+            self.waiting -= 1
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "waiting": self.waiting,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+pool_telemetry = PoolTelemetry()
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long each checkout waited for a connection"""
+
+    def connect(self):
+        pool_telemetry.begin_wait()
+        started = time.perf_counter()
+        timed_out = True
+        try:
+            connection = super().connect()
+            timed_out = False
+            return connection
+        finally:
+            pool_telemetry.end_wait(time.perf_counter() - started, timed_out)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url: str, poolclass=TimedQueuePool) -> dict:
+    """create_engine keyword arguments for the URL's backend"""
+    options = {}
+    if _is_sqlite(url):
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout_ms / 1000,
+        }
+        # In-memory databases keep SQLAlchemy's single-connection pools
+        if make_url(url).database in (None, "", ":memory:"):
+            return options
+    options.update(
+        poolclass=poolclass,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        # SQLite has no server to drop idle connections, so the ping is wasted work
+        pool_pre_ping=settings.db_pool_pre_ping and not _is_sqlite(url),
+    )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite tuning; WAL lets readers run alongside the single writer"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    # A negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")
+    cursor.close()
+
+
+def pool_status(engine) -> dict:
+    """In-use and idle connection gauges for an engine's pool"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+
+
+def _create_engine(url: str):
+    created = create_engine(url, **engine_options(url))
+    if _is_sqlite(url):
+        event.listen(created, "connect", _set_sqlite_pragmas)
+    return created
+
+
 # Create database engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+engine = _create_engine(settings.database_url)
+
+# Shards holding task data by user. Users, the shard map and the task id sequence
+# stay on DATABASE_URL; a shard with the same URL shares its engine.
+for url in settings.shard_database_urls:
+    if make_url(url).get_backend_name() != make_url(settings.database_url).get_backend_name():
+        raise ValueError(f"Shard {url} must use the same database backend as DATABASE_URL")
+shard_engines = [
+    engine if url == settings.database_url else _create_engine(url)
+    for url in settings.shard_database_urls
+]
+
+# Tables kept on DATABASE_URL when task data is sharded
+DIRECTORY_TABLES = frozenset({"users", "user_shards", "task_id_sequence"})
+
+
+def _uses_directory(mapper, clause) -> bool:
+    if mapper is not None:
+        return mapper.local_table.name in DIRECTORY_TABLES
+    if clause is not None:
+        return any(table.name in DIRECTORY_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+
+class ShardedSession(Session):
+    """Session sending everything but the directory tables to the shard in info["shard"]
+
+    Until a shard is set (see app.utils.shards.bind_user_shard) it behaves like
+    a plain session on DATABASE_URL.
+    """
+    shard_engines = shard_engines
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        shard = self.info.get("shard")
+        if shard is None or _uses_directory(mapper, clause):
+            return super().get_bind(mapper, clause, **kwargs)
+        return self.shard_engines[shard]
+
 
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine,
+    class_=ShardedSession if shard_engines else Session
+)
+
+
+def shard_session(shard=None) -> Session:
+    """Session on one shard's task data, or on the single database when shard is None"""
+    return SessionLocal(info={"shard": shard})
+
+
+def shard_ids() -> list:
+    """Shards to visit for work across all users: [None] when task data is not sharded"""
+    return list(range(len(shard_engines))) or [None]
+
+# Async engine and session factory, only built when the async request path is enabled
+def get_async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its asyncio driver"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+async_engine = None
+async_shard_engines = []
+AsyncSessionLocal = None
+if settings.async_db_enabled:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    def _create_async_engine(url: str):
+        async_url = get_async_database_url(url)
+        created = create_async_engine(async_url, **engine_options(async_url, TimedAsyncAdaptedQueuePool))
+        if _is_sqlite(async_url):
+            event.listen(created.sync_engine, "connect", _set_sqlite_pragmas)
+        return created
+
+    async_engine = _create_async_engine(settings.database_url)
+    async_shard_engines = [
+        async_engine if url == settings.database_url else _create_async_engine(url)
+        for url in settings.shard_database_urls
+    ]
+
+    class AsyncShardedSession(ShardedSession):
+        shard_engines = [shard.sync_engine for shard in async_shard_engines]
+
+    AsyncSessionLocal = sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+        sync_session_class=AsyncShardedSession if async_shard_engines else Session
+    )
+
+# A forked child (gunicorn worker of a preloaded app) must not reuse the parent's
+# pooled connections; it drops the inherited pools without closing them, which
+# would close them for the parent too, and opens its own
+def _dispose_engines_after_fork():
+    for sync_engine in {engine, *shard_engines}:
+        sync_engine.dispose(close=False)
+    for created in {async_engine, *async_shard_engines} - {None}:
+        created.sync_engine.dispose(close=False)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_engines_after_fork)
 
 # Create base class for models
 Base = declarative_base()
@@ -32,9 +258,20 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Create tables
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add any indexes declared since.
+    # IF NOT EXISTS rather than checkfirst, which can't reflect expression indexes
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
 
 if __name__ == "__main__":
     create_tables()
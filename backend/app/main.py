@@ -1,8 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import auth, tasks
-from .database import create_tables
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .routers import auth, tasks, admin, auth_async, tasks_async, admin_async
+from .database import engine, async_engine, shard_engines, async_shard_engines, pool_status, pool_telemetry
+from .utils.admission import AdmissionMiddleware, admission
+from .utils.fast_json import FastJSONResponse
+from .utils.group_commit import group_commit
+from .utils.metrics import MetricsMiddleware, instrument_engine, metrics
+from .utils.password_pool import password_hash_pool
+from .utils.profiler import ProfilingMiddleware, profile_engine, profile_routes
+from .utils.reminders import reminder_scheduler
+from .utils.response_cache import response_cache
+from .utils.task_events import task_feed
+from .utils.task_rollups import task_rollup_buffer
+from .utils.user_cache import start_user_invalidations, user_cache, user_invalidations
+from .utils.schema import ensure_schema
 from .config import settings
+import asyncio
 import logging
 
 # Configure logging
@@ -13,9 +27,24 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Task Management API",
     description="A modern task management API with JWT authentication",
-    version="1.0.0"
+    version="1.0.0",
+    # Opt-in orjson rendering for every JSON response
+    default_response_class=FastJSONResponse if settings.fast_serialization_enabled else JSONResponse
 )
 
+# Request profiling, innermost so a profile covers the app's own work. The switch is
+# flipped at runtime by admins; while it is off a request costs one clock read
+# and a statement one context variable lookup
+for sync_engine in {engine, *shard_engines}:
+    profile_engine(sync_engine)
+for created in {async_engine, *async_shard_engines} - {None}:
+    profile_engine(created.sync_engine)
+app.add_middleware(ProfilingMiddleware)
+
+# Rate limits and load shedding, inside CORS so browsers can read the 429/503
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -23,22 +52,60 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Profile-Id"],
 )
 
-# Include routers
-app.include_router(auth.router)
-app.include_router(tasks.router)
+# Per-route latency and SQL metrics, outermost so CORS and errors are included
+if settings.metrics_enabled:
+    for sync_engine in {engine, *shard_engines}:
+        instrument_engine(sync_engine)
+    for created in {async_engine, *async_shard_engines} - {None}:
+        instrument_engine(created.sync_engine)
+    app.add_middleware(MetricsMiddleware)
+
+# Include routers - async twins run on an AsyncSession instead of the threadpool
+if settings.async_db_enabled:
+    app.include_router(auth_async.router)
+    app.include_router(tasks_async.router)
+    app.include_router(admin_async.router)
+else:
+    app.include_router(auth.router)
+    app.include_router(tasks.router)
+    app.include_router(admin.router)
+profile_routes(app)
 
 @app.on_event("startup")
 async def startup_event():
-    """Create database tables on startup."""
+    """Check the database schema and start background work."""
     try:
-        logger.info("Creating database tables...")
-        create_tables()
-        logger.info("Database tables created successfully!")
+        # One SELECT when the schema is current, nothing at all in workers forked
+        # from a preloaded master that already checked
+        if ensure_schema():
+            logger.info("Database tables created successfully!")
     except Exception as e:
         logger.error(f"Warning: Could not create database tables: {e}")
         # Don't raise the exception to allow the app to start
+    
+    start_user_invalidations()
+    if settings.task_events_enabled:
+        task_feed.start()
+    if settings.reminders_enabled:
+        reminder_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work and close pooled database connections."""
+    await reminder_scheduler.stop()
+    await task_feed.stop()
+    user_invalidations.stop()
+    # Commit writes still queued, then their rollup counts, before the pools close
+    await asyncio.get_running_loop().run_in_executor(None, group_commit.stop)
+    await asyncio.get_running_loop().run_in_executor(None, task_rollup_buffer.stop)
+    password_hash_pool.shutdown()
+    for created in {async_engine, *async_shard_engines} - {None}:
+        await created.dispose()
+    for sync_engine in {engine, *shard_engines}:
+        sync_engine.dispose()
 
 @app.get("/")
 async def root():
@@ -52,4 +119,77 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy"} 
\ No newline at end of file
+    return {"status": "healthy"} 
+
+@app.get("/health/pool")
+async def pool_health():
+    """Connection pool gauges and checkout-wait counters for this worker."""
+    pools = {"sync": pool_status(engine)}
+    if async_engine is not None:
+        pools["async"] = pool_status(async_engine)
+    for shard, shard_engine in enumerate(shard_engines):
+        if shard_engine is not engine:
+            pools[f"shard{shard}"] = pool_status(shard_engine)
+    return {**pools, "checkout": pool_telemetry.stats()}
+
+
+def _pool_samples(engine, label: str) -> list:
+    status = pool_status(engine)
+    return [
+        (f"db_pool_{label}_{name}", "gauge", f"{label} engine pool {name.replace('_', ' ')}", status[name])
+        for name in ("size", "checked_out", "checked_in", "overflow") if name in status
+    ]
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus metrics for this worker."""
+    if not settings.metrics_enabled:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    checkout = pool_telemetry.stats()
+    cache = user_cache.stats()
+    hashing = password_hash_pool.stats()
+    reminders = reminder_scheduler.stats()
+    feed = task_feed.stats()
+    responses = response_cache.stats()
+    admitted = admission.stats()
+    grouped = group_commit.stats()
+    extra = _pool_samples(engine, "sync")
+    if async_engine is not None:
+        extra += _pool_samples(async_engine, "async")
+    for shard, shard_engine in enumerate(shard_engines):
+        if shard_engine is not engine:
+            extra += _pool_samples(shard_engine, f"shard{shard}")
+    extra += [
+        ("db_pool_checkouts_total", "counter", "Connections checked out of the pools", checkout["checkouts"]),
+        ("db_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for a pooled connection", checkout["wait_seconds_total"]),
+        ("db_pool_checkout_wait_seconds_max", "gauge", "Longest wait for a pooled connection", checkout["wait_seconds_max"]),
+        ("db_pool_checkout_timeouts_total", "counter", "Checkouts that gave up waiting", checkout["timeouts"]),
+        ("db_pool_waiting", "gauge", "Requests currently waiting for a pooled connection", checkout["waiting"]),
+        ("user_cache_hits_total", "counter", "Authenticated-user cache hits", cache["hits"]),
+        ("user_cache_misses_total", "counter", "Authenticated-user cache misses", cache["misses"]),
+        ("user_cache_size", "gauge", "Authenticated-user cache entries", cache["size"]),
+        ("password_hash_pending", "gauge", "Password hashes queued or running", hashing["pending"]),
+        ("password_hash_rejected_total", "counter", "Sign-ins refused with 503 because the hash queue was full", hashing["rejected"]),
+        ("reminders_scheduled", "gauge", "Due dates held by this worker's reminder scheduler", reminders["scheduled"]),
+        ("reminders_fired_total", "counter", "Reminders fired by this worker", reminders["fired"]),
+        ("task_feed_subscribers", "gauge", "Open change feed connections on this worker", feed["subscribers"]),
+        ("task_events_published_total", "counter", "Task events published by this worker", feed["published"]),
+        ("task_events_dropped_total", "counter", "Queued events replaced by a resync for slow feed clients", feed["dropped"]),
+        ("task_events_broker_dropped_total", "counter", "Event messages other workers could not accept", feed["broker_dropped"]),
+        ("response_cache_hits_total", "counter", "Task list responses served from the response cache", responses["hits"]),
+        ("response_cache_misses_total", "counter", "Task list responses rendered on a cache miss", responses["misses"]),
+        ("response_cache_invalidations_total", "counter", "Users whose cached responses were dropped after a write", responses["invalidations"]),
+        ("response_cache_evictions_total", "counter", "Cached responses evicted to stay within the size limit", responses["evictions"]),
+        ("response_cache_entries", "gauge", "Responses in this worker's memory cache", responses["entries"]),
+        ("response_cache_bytes", "gauge", "Bytes of response bodies in this worker's memory cache", responses["bytes"]),
+        ("admission_in_flight", "gauge", "Requests holding an admission slot", admitted["in_flight"]),
+        ("admission_queued", "gauge", "Requests waiting for an admission slot", admitted["queued"]),
+        ("admission_queue_wait_seconds_total", "counter", "Time requests spent waiting for an admission slot", admitted["queue_seconds"]),
+        ("admission_rate_limited_user_total", "counter", "Requests refused with 429 by a per-user rate limit", admitted["rate_limited_user"]),
+        ("admission_rate_limited_ip_total", "counter", "Requests refused with 429 by a per-IP rate limit", admitted["rate_limited_ip"]),
+        ("admission_shed_total", "counter", "Requests shed with 503 by the concurrency cap or queue time", admitted["shed"]),
+        ("group_commit_batches_total", "counter", "Transactions committed by the group commit writers", grouped["batches"]),
+        ("group_commit_writes_total", "counter", "Task writes committed by the group commit writers", grouped["writes"]),
+        ("group_commit_batch_max", "gauge", "Most task writes committed in one group commit", grouped["largest"]),
+    ]
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
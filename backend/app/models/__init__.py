@@ -1,3 +1,11 @@
 # Models package
 from .user import User, UserRole
-from .task import Task, TaskStatus, TaskPriority 
\ No newline at end of file
+from .task import Task, TaskStatus, TaskPriority
+from .task_counter import UserTaskCounter
+from .task_version import UserTaskVersion
+from .task_sync import TaskSyncLog
+from .task_archive import ArchivedTask
+from .schema_version import SchemaVersion
+from .user_shard import UserShard
+from .task_id_sequence import TaskIdSequence
+from .task_rollup import TaskRollupHourly, TaskRollupDaily
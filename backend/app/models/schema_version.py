@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class SchemaVersion(Base):
+    """Fingerprint of the schema the database was last brought up to, a single row"""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    fingerprint = Column(String(64), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Index, case, literal_column
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.elements import Grouping
 from sqlalchemy.sql import func
 from enum import Enum as PyEnum
 from ..database import Base
@@ -18,6 +20,27 @@ class TaskPriority(str, PyEnum):
     critical = "critical"
 
 
+def task_priority_rank(priority):
+    """Rank of a priority column, higher for more important priorities
+
+    Written with literal constants, not bound parameters, so a query ordering
+    by it matches the expression of the rank index; parenthesized, as
+    PostgreSQL requires of an expression in CREATE INDEX.
+    """
+    ranks = (TaskPriority.low, TaskPriority.medium, TaskPriority.high, TaskPriority.critical)
+    return Grouping(case(
+        {literal_column(f"'{member.name}'"): literal_column(str(rank)) for rank, member in enumerate(ranks)},
+        value=priority,
+    ))
+
+
+# SQLite's CURRENT_TIMESTAMP has no fractional seconds; binding created_at in the
+# same text format keeps keyset comparisons against stored values exact
+SQLITE_TIMESTAMP = sqlite.DATETIME(
+    storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+)
+
+
 class Task(Base):
     __tablename__ = "tasks"
 
@@ -27,9 +50,28 @@ class Task(Base):
     status = Column(Enum(TaskStatus), default=TaskStatus.todo, nullable=False)
     priority = Column(Enum(TaskPriority), default=TaskPriority.medium, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(
+        DateTime(timezone=True).with_variant(SQLITE_TIMESTAMP, "sqlite"),
+        server_default=func.now()
+    )
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     due_date = Column(DateTime(timezone=True), nullable=True)
 
     # Relationship to user
-    owner = relationship("User", back_populates="tasks")
\ No newline at end of file
+    owner = relationship("User", back_populates="tasks")
+
+    __table_args__ = (
+        # Serves the per-user list ordering and keyset pagination
+        Index("ix_tasks_user_created_id", "user_id", "created_at", "id"),
+        # Serve a single status or priority filter together with that ordering
+        Index("ix_tasks_user_status_created_id", "user_id", "status", "created_at", "id"),
+        Index("ix_tasks_user_priority_created_id", "user_id", "priority", "created_at", "id"),
+        # Serves sort=priority
+        Index("ix_tasks_user_priority_rank_created_id", user_id, task_priority_rank(priority), created_at, id),
+        # Serves sort=updated_at
+        Index("ix_tasks_user_updated_id", "user_id", "updated_at", "id"),
+        # Serves the per-user due/overdue lists, sort=due_date and due date ranges
+        Index("ix_tasks_user_due_date_id", "user_id", "due_date", "id"),
+        # Serves the reminder scheduler's range scans across all users
+        Index("ix_tasks_due_date", "due_date"),
+    )
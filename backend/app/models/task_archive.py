@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.sql import func
+from ..database import Base
+from .task import TaskStatus, TaskPriority, SQLITE_TIMESTAMP
+
+
+class ArchivedTask(Base):
+    """Completed tasks moved out of `tasks` by the archiver (python -m app.utils.task_archive)
+
+    Columns mirror Task so rows are copied across unchanged and the two tables
+    can be read together with UNION ALL.
+    """
+    __tablename__ = "tasks_archive"
+
+    # Keeps the id the task had in `tasks`
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String, nullable=False)
+    description = Column(Text)
+    status = Column(Enum(TaskStatus), nullable=False)
+    priority = Column(Enum(TaskPriority), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True).with_variant(SQLITE_TIMESTAMP, "sqlite"))
+    updated_at = Column(DateTime(timezone=True))
+    due_date = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Serves the per-user list with include_archived=true and the stats count
+        Index("ix_tasks_archive_user_created_id", "user_id", "created_at", "id"),
+    )
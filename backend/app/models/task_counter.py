@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from ..database import Base
+
+
+class UserTaskCounter(Base):
+    """Per-user task counts by status and priority, kept in step with task writes"""
+    __tablename__ = "user_task_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    # One column per TaskStatus value
+    status_todo = Column(Integer, default=0, nullable=False)
+    status_in_progress = Column(Integer, default=0, nullable=False)
+    status_done = Column(Integer, default=0, nullable=False)
+
+    # One column per TaskPriority value
+    priority_low = Column(Integer, default=0, nullable=False)
+    priority_medium = Column(Integer, default=0, nullable=False)
+    priority_high = Column(Integer, default=0, nullable=False)
+    priority_critical = Column(Integer, default=0, nullable=False)
+
+    total = Column(Integer, default=0, nullable=False)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer
+from ..database import Base
+
+
+class TaskIdSequence(Base):
+    """Next unallocated task id across all shards, a single row"""
+    __tablename__ = "task_id_sequence"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    next_id = Column(Integer, nullable=False)
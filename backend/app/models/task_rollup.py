@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, DateTime, Enum
+from ..database import Base
+from .task import TaskStatus, TaskPriority, SQLITE_TIMESTAMP
+
+
+class TaskRollupColumns:
+    """Task write counts for one UTC bucket by the task's status and priority
+
+    created, updated and completed are keyed by the task's status and priority
+    after the write, deleted by the ones it had when it was deleted. Each shard
+    counts the writes to its own tasks; totals are the sum over shards.
+    """
+    # Start of the bucket, UTC
+    bucket = Column(DateTime(timezone=True).with_variant(SQLITE_TIMESTAMP, "sqlite"), primary_key=True)
+    status = Column(Enum(TaskStatus), primary_key=True)
+    priority = Column(Enum(TaskPriority), primary_key=True)
+
+    created = Column(Integer, default=0, nullable=False)
+    updated = Column(Integer, default=0, nullable=False)
+    # Tasks that were created as done or moved to done from another status
+    completed = Column(Integer, default=0, nullable=False)
+    deleted = Column(Integer, default=0, nullable=False)
+
+
+class TaskRollupHourly(TaskRollupColumns, Base):
+    __tablename__ = "task_rollups_hourly"
+
+
+class TaskRollupDaily(TaskRollupColumns, Base):
+    __tablename__ = "task_rollups_daily"
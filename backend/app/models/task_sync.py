@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, DateTime, Index
+from ..database import Base
+
+
+class TaskSyncLog(Base):
+    """Latest change of each task, for delta sync; rows with deleted_at are tombstones"""
+    __tablename__ = "task_sync_log"
+
+    # No foreign key to tasks: a tombstone outlives the task it records
+    task_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    # The user's task list version (user_task_versions.version) of the last write
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Serves GET /api/tasks/changes, a range scan past the client's sequence
+        Index("ix_task_sync_log_user_seq_task", "user_id", "change_seq", "task_id"),
+        # Serves the tombstone purge
+        Index("ix_task_sync_log_deleted_at", "deleted_at"),
+    )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from ..database import Base
+
+
+class UserTaskVersion(Base):
+    """Per-user version of the task list, bumped by every task write"""
+    __tablename__ = "user_task_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
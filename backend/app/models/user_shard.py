@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from ..database import Base
+
+
+class UserShard(Base):
+    """Shard holding a user's task data; users without a row are on shard 0"""
+    __tablename__ = "user_shards"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    shard_id = Column(Integer, nullable=False)
+    # Set while the user's data is copied to another shard; writes are refused meanwhile
+    moving_to = Column(Integer, nullable=True)
@@ -1,2 +1,2 @@
 # Routers package
-from . import auth, tasks 
\ No newline at end of file
+from . import auth, tasks, admin, auth_async, tasks_async, admin_async
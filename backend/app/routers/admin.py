@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from ..database import get_db
+from ..models.user import User
+from ..schemas.analytics import TaskAnalytics, TaskAnalyticsTotals
+from ..schemas.profiling import ProfilingSwitch, ProfilingStatus, ProfileSummary, ProfileDetail
+from ..utils.dependencies import get_current_admin_user
+from ..utils.profiler import get_profile_or_404, profiler
+from ..utils.task_rollups import parse_rollup_range, query_task_rollups, query_task_rollup_totals
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+@router.get("/analytics/tasks", response_model=TaskAnalytics)
+def get_task_analytics(
+    interval: str = Query("day", regex="^(hour|day)$", description="Bucket size: hour or day"),
+    start: Optional[datetime] = Query(None, description="Start of the range, default 1 day (hour) or 30 days (day) before end"),
+    end: Optional[datetime] = Query(None, description="End of the range (exclusive), default now"),
+    group_by: Optional[str] = Query(None, regex="^(status|priority)$", description="Split each bucket by status or priority"),
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Task writes across all users per hour or day, from the rollup tables"""
+    start, end = parse_rollup_range(interval, start, end)
+    return query_task_rollups(db, interval, start, end, group_by)
+
+@router.get("/analytics/tasks/totals", response_model=TaskAnalyticsTotals)
+def get_task_analytics_totals(
+    start: Optional[datetime] = Query(None, description="Start of the range, default 30 days before end"),
+    end: Optional[datetime] = Query(None, description="End of the range (exclusive), default now"),
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Task writes across all users over a range of days, by status and by priority"""
+    start, end = parse_rollup_range("day", start, end)
+    return query_task_rollup_totals(db, start, end)
+
+@router.get("/profiling", response_model=ProfilingStatus)
+def get_profiling(current_user: User = Depends(get_current_admin_user)):
+    """The request profiling switch shared by the workers of this host"""
+    return profiler.status()
+
+@router.put("/profiling", response_model=ProfilingStatus)
+def switch_profiling(switch: ProfilingSwitch, current_user: User = Depends(get_current_admin_user)):
+    """Turn request profiling on or off for every worker of this host"""
+    profiler.switch(switch.enabled, switch.sample_rate, switch.user_id, switch.duration_seconds)
+    return profiler.status()
+
+@router.get("/profiles", response_model=List[ProfileSummary])
+def list_profiles(current_user: User = Depends(get_current_admin_user)):
+    """Profiles kept on this host, from every worker, newest first"""
+    return [profile.summary() for profile in profiler.recent()]
+
+@router.get("/profiles/{profile_id}", response_model=ProfileDetail)
+def get_profile(profile_id: str, current_user: User = Depends(get_current_admin_user)):
+    """A profile's SQL with timings and its functions with the most self time"""
+    return get_profile_or_404(profile_id).detail()
+
+@router.get("/profiles/{profile_id}/pstats")
+def download_profile_pstats(profile_id: str, current_user: User = Depends(get_current_admin_user)):
+    """The profile as a pstats file (python -m pstats, snakeviz)"""
+    return Response(
+        get_profile_or_404(profile_id).pstats(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'}
+    )
@@ -2,32 +2,71 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from ..database import get_db
 from ..models.user import User
 from ..schemas.user import UserCreate, User as UserSchema, UserLogin, Token
-from ..utils.auth import verify_password, get_password_hash, create_access_token
+from ..utils.auth import create_access_token, dummy_password_hash
 from ..utils.dependencies import get_current_user
+from ..utils.password_pool import password_hash_pool
+from ..utils.shards import assign_user_shard
 from ..config import settings
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
-@router.post("/register", response_model=UserSchema)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    """Register a new user"""
+# Auth endpoints are async so they wait for the password hash pool without holding a
+# threadpool thread; their short database steps run in the threadpool instead, and
+# end their transaction so no pooled connection is held while a hash is computed.
+def _find_user(db: Session, email: str):
+    user = db.query(User.id, User.email, User.hashed_password).filter(User.email == email).first()
+    db.rollback()
+    return user
+
+def _store_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(User).filter(User.id == user_id).update(
+        {User.hashed_password: hashed_password}, synchronize_session=False
+    )
+    db.commit()
+
+async def _authenticate(db: Session, email: str, password: str) -> dict:
+    """Check credentials and issue an access token"""
     
-    # Check if user already exists
-    db_user = db.query(User).filter(
-        (User.email == user.email) | (User.username == user.username)
-    ).first()
+    # Get user from database
+    user = await run_in_threadpool(_find_user, db, email)
     
-    if db_user:
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_hash_pool.verify_and_update(password, user.hashed_password)
+    else:
+        # Run the KDF anyway, so the response time doesn't tell which emails have accounts
+        await password_hash_pool.verify_and_update(password, dummy_password_hash())
+    if not valid:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email or username already registered"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+    # Upgrade legacy or outdated hashes now that the plain password is known
+    if new_hash:
+        await run_in_threadpool(_store_password_hash, db, user.id, new_hash)
+    
+    # Create access token
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    access_token = create_access_token(
+        data={"sub": user.email}, expires_delta=access_token_expires
+    )
+    
+    return {"access_token": access_token, "token_type": "bearer"}
+
+def _user_exists(db: Session, email: str, username: str) -> bool:
+    exists = db.query(User.id).filter(
+        (User.email == email) | (User.username == username)
+    ).first() is not None
+    db.rollback()
+    return exists
+
+def _create_user(db: Session, user: UserCreate, hashed_password: str) -> User:
     db_user = User(
         email=user.email,
         username=user.username,
@@ -35,57 +74,42 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
+    db.flush()
+    assign_user_shard(db, db_user.id)
     db.commit()
     db.refresh(db_user)
     
     return db_user
 
-@router.post("/login", response_model=Token)
-def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
-    """Login user and return access token"""
-    
-    # Get user from database
-    user = db.query(User).filter(User.email == user_credentials.email).first()
+@router.post("/register", response_model=UserSchema)
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+    """Register a new user"""
     
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    # Check if user already exists
+    if await run_in_threadpool(_user_exists, db, user.email, user.username):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or username already registered"
         )
     
-    # Create access token
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    # Create new user
+    hashed_password = await password_hash_pool.hash(user.password)
+    return await run_in_threadpool(_create_user, db, user, hashed_password)
+
+@router.post("/login", response_model=Token)
+async def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
+    """Login user and return access token"""
+    return await _authenticate(db, user_credentials.email, user_credentials.password)
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """OAuth2 compatible token login (for FastAPI docs)"""
     
-    # Get user from database (using username as email)
-    user = db.query(User).filter(User.email == form_data.username).first()
-    
-    if not user or not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Create access token
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    # Username is the email
+    return await _authenticate(db, form_data.username, form_data.password)
 
 @router.get("/me", response_model=UserSchema)
 def get_current_user_info(current_user: User = Depends(get_current_user)):
@@ -0,0 +1,98 @@
+from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
+from ..models.user import User
+from ..schemas.user import UserCreate, User as UserSchema, UserLogin, Token
+from ..utils.auth import create_access_token, dummy_password_hash
+from ..utils.dependencies import get_current_user_async
+from ..utils.password_pool import password_hash_pool
+from ..utils.shards import assign_user_shard
+from ..config import settings
+
+# Async twin of routers/auth.py, mounted instead of it when ASYNC_DB_ENABLED is set
+router = APIRouter(prefix="/api/auth", tags=["authentication"])
+
+
+async def _authenticate(db: AsyncSession, email: str, password: str) -> dict:
+    """Check credentials and issue an access token"""
+    
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
+    
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_hash_pool.verify_and_update(password, user.hashed_password)
+    else:
+        # Run the KDF anyway, so the response time doesn't tell which emails have accounts
+        await password_hash_pool.verify_and_update(password, dummy_password_hash())
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Upgrade legacy or outdated hashes now that the plain password is known
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    # Create access token
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    access_token = create_access_token(
+        data={"sub": user.email}, expires_delta=access_token_expires
+    )
+    
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/register", response_model=UserSchema)
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    """Register a new user"""
+    
+    # Check if user already exists
+    result = await db.execute(select(User).where(
+        (User.email == user.email) | (User.username == user.username)
+    ))
+    
+    if result.scalars().first():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or username already registered"
+        )
+    
+    # Create new user
+    hashed_password = await password_hash_pool.hash(user.password)
+    db_user = User(
+        email=user.email,
+        username=user.username,
+        hashed_password=hashed_password
+    )
+    
+    db.add(db_user)
+    await db.flush()
+    await db.run_sync(assign_user_shard, db_user.id)
+    await db.commit()
+    await db.refresh(db_user)
+    
+    return db_user
+
+@router.post("/login", response_model=Token)
+async def login_user(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    """Login user and return access token"""
+    return await _authenticate(db, user_credentials.email, user_credentials.password)
+
+@router.post("/token", response_model=Token)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """OAuth2 compatible token login (for FastAPI docs)"""
+    return await _authenticate(db, form_data.username, form_data.password)
+
+@router.get("/me", response_model=UserSchema)
+async def get_current_user_info(current_user: User = Depends(get_current_user_async)):
+    """Get current user information"""
+    return current_user
@@ -1,51 +1,99 @@
+from datetime import datetime, timezone
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, select
 from ..database import get_db
-from ..models.task import Task, TaskStatus, TaskPriority
+from ..models.task import Task
+from ..models.task_archive import ArchivedTask
 from ..models.user import User
-from ..schemas.task import TaskCreate, TaskUpdate, Task as TaskSchema
-from ..utils.dependencies import get_current_user
+from ..schemas.task import TaskCreate, TaskUpdate, Task as TaskSchema, TaskBulkUpdate, TaskBulkResult, TaskChanges, TaskEventsTicket
+from ..config import settings
+from ..utils.auth import create_stream_ticket
+from ..utils.dependencies import get_current_user, get_stream_user
+from ..utils.fast_json import FastJSONResponse
+from ..utils.group_commit import group_commit
+from ..utils.response_cache import response_cache, render_task_list, task_list_cache_key
+from ..utils.task_queries import tasks_with_archive, task_columns, filter_task_list, paginate_task_list, next_page_cursor, task_rows_to_dicts, parse_due_window, due_task_list
+from ..utils.task_export import EXPORT_COLUMNS, EXPORT_CHUNK_ROWS, EXPORT_MEDIA_TYPES, encode_export
+from ..utils.task_search import search_task_list
+from ..utils.task_bulk import bulk_create_tasks, bulk_update_tasks, bulk_delete_tasks
+from ..utils.task_events import task_feed, stream_task_events
+from ..utils.task_stats import get_user_task_stats
+from ..utils.task_sync import get_task_changes
+from ..utils.task_versions import get_task_version, task_list_etag, task_etag, etag_matches, not_modified
+from ..utils.task_writes import create_user_task, update_user_task, delete_user_task
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
+
+def check_bulk_size(items: list):
+    """Reject bulk requests that are empty or over the configured limit"""
+    if not items or len(items) > settings.bulk_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Bulk requests must contain between 1 and {settings.bulk_max_items} items"
+        )
+
 @router.get("", response_model=List[TaskSchema])
 def get_tasks_root(
-    status: Optional[str] = Query(None, description="Filter by status"),
-    priority: Optional[str] = Query(None, description="Filter by priority"),
+    status: Optional[str] = Query(None, description="Filter by status, one or more comma-separated (todo,in_progress)"),
+    priority: Optional[str] = Query(None, description="Filter by priority, one or more comma-separated"),
+    due_after: Optional[datetime] = Query(None, description="Only tasks due at or after this time"),
+    due_before: Optional[datetime] = Query(None, description="Only tasks due before this time"),
     skip: int = Query(0, ge=0, description="Number of tasks to skip"),
     limit: int = Query(100, ge=1, le=100, description="Number of tasks to return"),
+    sort: str = Query("created_at", regex="^(created_at|updated_at|due_date|priority)$", description="Order: created_at or updated_at (newest first), due_date (soonest first) or priority (highest first)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header"),
+    include_archived: bool = Query(False, description="Also list completed tasks moved to the archive"),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all tasks for the current user with optional filtering"""
+    """Get all tasks for the current user with optional filtering
+
+    Pages can be walked either with skip/limit or, for deep pages, by passing
+    back the X-Next-Cursor header as `cursor` (keyset pagination on the
+    (user_id, created_at, id) index, default sort only).
     
-    query = db.query(Task).filter(Task.user_id == current_user.id)
+    The ETag changes whenever any of the user's tasks is written, so a client
+    sending it back in If-None-Match gets a 304 without the list being queried.
+    """
+    
+    # Read the version before the list so a racing write can only make the ETag older
+    version = get_task_version(db, current_user.id)
+    etag = task_list_etag(current_user.id, version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     
-    # Apply filters - convert string to enum if valid
-    if status and status.strip():
-        try:
-            status_enum = TaskStatus(status.strip())
-            query = query.filter(Task.status == status_enum)
-        except ValueError:
-            # Invalid status value, ignore the filter
-            pass
-    
-    if priority and priority.strip():
-        try:
-            priority_enum = TaskPriority(priority.strip())
-            query = query.filter(Task.priority == priority_enum)
-        except ValueError:
-            # Invalid priority value, ignore the filter
-            pass
-    
-    # Order by created_at descending
-    query = query.order_by(Task.created_at.desc())
-    
-    # Apply pagination
-    tasks = query.offset(skip).limit(limit).all()
+    # Identical queries at the same version share a cached response
+    if settings.response_cache_enabled:
+        cache_key = task_list_cache_key(current_user.id, version, status, priority, due_after, due_before, skip, limit, sort, cursor, include_archived)
+        cached = response_cache.lookup(cache_key, response.headers)
+        if cached is not None:
+            return cached
     
+    # The fast path reads plain column rows and encodes them without pydantic
+    # The archive is only read on request, so the default list stays on the hot table
+    source = tasks_with_archive(current_user.id) if include_archived else Task
+    if settings.fast_serialization_enabled:
+        query = db.query(*task_columns(source)).filter(source.user_id == current_user.id)
+    else:
+        query = db.query(source).filter(source.user_id == current_user.id)
+    query = filter_task_list(query, status, priority, due_after, due_before, model=source, sort=sort)
+    tasks = paginate_task_list(query, skip, limit, cursor, sort, model=source).all()
+    
+    next_cursor = next_page_cursor(tasks, limit, sort)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    if settings.response_cache_enabled:
+        return response_cache.store(current_user.id, cache_key, render_task_list(tasks), response.headers)
+    if settings.fast_serialization_enabled:
+        return FastJSONResponse(task_rows_to_dicts(tasks), headers=dict(response.headers))
     return tasks
 
 @router.post("", response_model=TaskSchema, status_code=status.HTTP_201_CREATED)
@@ -56,87 +104,252 @@ def create_task_root(
 ):
     """Create a new task"""
     
-    db_task = Task(
-        **task.dict(),
-        user_id=current_user.id
-    )
+    if settings.group_commit_enabled:
+        return group_commit.run(db, create_user_task, current_user.id, task.dict())
     
-    db.add(db_task)
+    db_task = create_user_task(db, current_user.id, task.dict())
     db.commit()
     db.refresh(db_task)
     
     return db_task
 
+# Search, due, changes, events, export and bulk routes are declared before /{task_id} so they are not taken as an id
+@router.get("/search", response_model=List[TaskSchema])
+def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to search for in title and description"),
+    skip: int = Query(0, ge=0, description="Number of results to skip"),
+    limit: int = Query(20, ge=1, le=100, description="Number of results to return"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Full-text search over the current user's tasks, best match first"""
+    
+    query = db.query(Task).filter(Task.user_id == current_user.id)
+    query = search_task_list(query, db.bind.dialect.name, q)
+    
+    return query.offset(skip).limit(limit).all()
+
+@router.get("/due", response_model=List[TaskSchema])
+def get_due_tasks(
+    window: str = Query("24h", description="How far ahead to look, e.g. 30m, 24h or 7d"),
+    skip: int = Query(0, ge=0, description="Number of tasks to skip"),
+    limit: int = Query(100, ge=1, le=100, description="Number of tasks to return"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Unfinished tasks due between now and the end of the window, soonest first"""
+    
+    now = datetime.now(timezone.utc)
+    query = db.query(Task).filter(Task.user_id == current_user.id)
+    query = due_task_list(query, now, now + parse_due_window(window))
+    
+    return query.offset(skip).limit(limit).all()
+
+@router.get("/overdue", response_model=List[TaskSchema])
+def get_overdue_tasks(
+    skip: int = Query(0, ge=0, description="Number of tasks to skip"),
+    limit: int = Query(100, ge=1, le=100, description="Number of tasks to return"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Unfinished tasks whose due date has passed, most overdue first"""
+    
+    query = db.query(Task).filter(Task.user_id == current_user.id)
+    query = due_task_list(query, None, datetime.now(timezone.utc))
+    
+    return query.offset(skip).limit(limit).all()
+
+@router.get("/changes", response_model=TaskChanges)
+def get_task_changes_since(
+    since: Optional[str] = Query(None, description="Token from a previous response's `next`; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=1000, description="Most tasks and deletions to return"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Tasks created, updated or deleted since a sync token
+
+    Clients keep the `next` token and call again with it; while `has_more` is
+    true there are further changes to fetch straight away. An expired token gets
+    410 and the client starts over with a full sync.
+    """
+    
+    return get_task_changes(db, current_user.id, since, limit)
+
+@router.post("/events/ticket", response_model=TaskEventsTicket)
+def create_task_events_ticket(
+    current_user: User = Depends(get_current_user)
+):
+    """Short-lived ticket for opening the change feed from a browser
+
+    EventSource cannot send an Authorization header, and a URL ends up in
+    access logs, so GET /api/tasks/events takes this instead of the token.
+    """
+    
+    return {
+        "ticket": create_stream_ticket(current_user.email),
+        "expires_in": settings.task_events_ticket_seconds
+    }
+
+@router.get("/events")
+async def task_events(
+    current_user: User = Depends(get_stream_user)
+):
+    """Server-Sent Events feed of the current user's task changes
+
+    Each message's data is {"type": "created"|"updated"|"deleted"|"due", "task_id": ...}.
+    A {"type": "resync"} message means events were dropped and the list should be refetched.
+    """
+    
+    if not settings.task_events_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Change feed is disabled"
+        )
+    subscription = task_feed.subscribe(current_user.id)
+    
+    return StreamingResponse(
+        stream_task_events(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/export")
+def export_tasks(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    status: Optional[str] = Query(None, description="Filter by status, one or more comma-separated (todo,in_progress)"),
+    priority: Optional[str] = Query(None, description="Filter by priority, one or more comma-separated"),
+    due_after: Optional[datetime] = Query(None, description="Only tasks due at or after this time"),
+    due_before: Optional[datetime] = Query(None, description="Only tasks due before this time"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stream every task of the current user as NDJSON or CSV
+
+    Rows come from a server-side cursor in fixed-size chunks, so memory use
+    does not grow with the number of tasks.
+    """
+    
+    query = select(*EXPORT_COLUMNS).where(Task.user_id == current_user.id)
+    query = filter_task_list(query, status, priority, due_after, due_before).order_by(Task.id)
+    result = db.execute(query.execution_options(stream_results=True))
+    
+    return StreamingResponse(
+        encode_export(result.partitions(EXPORT_CHUNK_ROWS), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'}
+    )
+
+@router.post("/bulk", response_model=List[TaskBulkResult], status_code=status.HTTP_201_CREATED)
+def create_tasks_bulk(
+    tasks: List[TaskCreate],
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create many tasks in one transaction"""
+    
+    check_bulk_size(tasks)
+    results = bulk_create_tasks(db, current_user.id, tasks)
+    db.commit()
+    
+    return results
+
+@router.patch("/bulk", response_model=List[TaskBulkResult])
+def update_tasks_bulk(
+    items: List[TaskBulkUpdate],
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update many tasks in one transaction; unknown ids are reported as not_found, items with no fields as unchanged"""
+    
+    check_bulk_size(items)
+    results = bulk_update_tasks(db, current_user.id, items)
+    db.commit()
+    
+    return results
+
+@router.delete("/bulk", response_model=List[TaskBulkResult])
+def delete_tasks_bulk(
+    task_ids: List[int],
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete many tasks in one transaction; unknown ids are reported as not_found"""
+    
+    check_bulk_size(task_ids)
+    results = bulk_delete_tasks(db, current_user.id, task_ids)
+    db.commit()
+    
+    return results
+
 @router.get("/{task_id}", response_model=TaskSchema)
 def get_task(
     task_id: int,
+    include_archived: bool = Query(False, description="Also look for the task in the archive"),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get a specific task by ID"""
+    """Get a specific task by ID; archived tasks are read-only and found with include_archived"""
     
     task = db.query(Task).filter(
         and_(Task.id == task_id, Task.user_id == current_user.id)
     ).first()
     
+    if not task and include_archived:
+        task = db.query(ArchivedTask).filter(
+            and_(ArchivedTask.id == task_id, ArchivedTask.user_id == current_user.id)
+        ).first()
+    
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found"
         )
     
+    etag = task_etag(task)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    
     return task
 
 @router.put("/{task_id}", response_model=TaskSchema)
 def update_task(
     task_id: int,
     task_update: TaskUpdate,
+    if_match: Optional[str] = Header(None),
+    response: Response = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Update a specific task"""
-    
-    # Get the task
-    task = db.query(Task).filter(
-        and_(Task.id == task_id, Task.user_id == current_user.id)
-    ).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found"
-        )
+    """Update a specific task; an If-Match header makes the update conditional"""
     
-    # Update task fields
     update_data = task_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(task, field, value)
-    
-    db.commit()
-    db.refresh(task)
+    if settings.group_commit_enabled:
+        task = group_commit.run(db, update_user_task, current_user.id, task_id, update_data, if_match)
+    else:
+        task = update_user_task(db, current_user.id, task_id, update_data, if_match)
+        db.commit()
+        db.refresh(task)
+    response.headers["ETag"] = task_etag(task)
     
     return task
 
 @router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_task(
     task_id: int,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a specific task"""
+    """Delete a specific task; an If-Match header makes the delete conditional"""
     
-    task = db.query(Task).filter(
-        and_(Task.id == task_id, Task.user_id == current_user.id)
-    ).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found"
-        )
-    
-    db.delete(task)
-    db.commit()
+    if settings.group_commit_enabled:
+        group_commit.run(db, delete_user_task, current_user.id, task_id, if_match)
+    else:
+        delete_user_task(db, current_user.id, task_id, if_match)
+        db.commit()
     
     return None
 
@@ -147,24 +360,4 @@ def get_task_stats(
 ):
     """Get task statistics for the current user"""
     
-    # Count tasks by status
-    stats = {}
-    for status in TaskStatus:
-        count = db.query(Task).filter(
-            and_(Task.user_id == current_user.id, Task.status == status)
-        ).count()
-        stats[status.value] = count
-    
-    # Count tasks by priority
-    priority_stats = {}
-    for priority in TaskPriority:
-        count = db.query(Task).filter(
-            and_(Task.user_id == current_user.id, Task.priority == priority)
-        ).count()
-        priority_stats[priority.value] = count
-    
-    return {
-        "status_stats": stats,
-        "priority_stats": priority_stats,
-        "total_tasks": sum(stats.values())
-    } 
\ No newline at end of file
+    return get_user_task_stats(db, current_user.id)
@@ -0,0 +1,361 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
+from ..models.task import Task
+from ..models.task_archive import ArchivedTask
+from ..models.user import User
+from ..schemas.task import TaskCreate, TaskUpdate, Task as TaskSchema, TaskBulkUpdate, TaskBulkResult, TaskChanges, TaskEventsTicket
+from ..utils.auth import create_stream_ticket
+from ..utils.dependencies import get_current_user_async, get_stream_user_async
+from ..config import settings
+from ..utils.fast_json import FastJSONResponse
+from ..utils.group_commit import group_commit
+from ..utils.response_cache import response_cache, render_task_list, task_list_cache_key
+from ..utils.task_queries import tasks_with_archive, task_columns, filter_task_list, paginate_task_list, next_page_cursor, task_rows_to_dicts, parse_due_window, due_task_list
+from ..utils.task_export import EXPORT_COLUMNS, EXPORT_CHUNK_ROWS, EXPORT_MEDIA_TYPES, encode_export_async
+from ..utils.task_search import search_task_list
+from ..utils.task_bulk import bulk_create_tasks, bulk_update_tasks, bulk_delete_tasks
+from ..utils.task_events import task_feed, stream_task_events
+from ..utils.task_stats import get_user_task_stats
+from ..utils.task_sync import get_task_changes
+from ..utils.task_versions import get_task_version, task_list_etag, task_etag, etag_matches, not_modified
+from ..utils.task_writes import create_user_task, update_user_task, delete_user_task
+from .tasks import check_bulk_size
+
+# Async twin of routers/tasks.py, mounted instead of it when ASYNC_DB_ENABLED is set.
+# Sync helpers shared with the sync router run through AsyncSession.run_sync.
+router = APIRouter(prefix="/api/tasks", tags=["tasks"])
+
+
+async def _get_user_task(db: AsyncSession, task_id: int, user_id: int, include_archived: bool = False) -> Task:
+    result = await db.execute(
+        select(Task).where(and_(Task.id == task_id, Task.user_id == user_id))
+    )
+    task = result.scalars().first()
+    
+    if not task and include_archived:
+        result = await db.execute(
+            select(ArchivedTask).where(and_(ArchivedTask.id == task_id, ArchivedTask.user_id == user_id))
+        )
+        task = result.scalars().first()
+    
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    
+    return task
+
+@router.get("", response_model=List[TaskSchema])
+async def get_tasks_root(
+    status: Optional[str] = Query(None, description="Filter by status, one or more comma-separated (todo,in_progress)"),
+    priority: Optional[str] = Query(None, description="Filter by priority, one or more comma-separated"),
+    due_after: Optional[datetime] = Query(None, description="Only tasks due at or after this time"),
+    due_before: Optional[datetime] = Query(None, description="Only tasks due before this time"),
+    skip: int = Query(0, ge=0, description="Number of tasks to skip"),
+    limit: int = Query(100, ge=1, le=100, description="Number of tasks to return"),
+    sort: str = Query("created_at", regex="^(created_at|updated_at|due_date|priority)$", description="Order: created_at or updated_at (newest first), due_date (soonest first) or priority (highest first)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header"),
+    include_archived: bool = Query(False, description="Also list completed tasks moved to the archive"),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all tasks for the current user with optional filtering"""
+    
+    # Read the version before the list so a racing write can only make the ETag older
+    version = await db.run_sync(get_task_version, current_user.id)
+    etag = task_list_etag(current_user.id, version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    
+    # Identical queries at the same version share a cached response
+    if settings.response_cache_enabled:
+        cache_key = task_list_cache_key(current_user.id, version, status, priority, due_after, due_before, skip, limit, sort, cursor, include_archived)
+        cached = response_cache.lookup(cache_key, response.headers)
+        if cached is not None:
+            return cached
+    
+    # The fast path reads plain column rows and encodes them without pydantic
+    # The archive is only read on request, so the default list stays on the hot table
+    source = tasks_with_archive(current_user.id) if include_archived else Task
+    if settings.fast_serialization_enabled:
+        query = select(*task_columns(source)).where(source.user_id == current_user.id)
+    else:
+        query = select(source).where(source.user_id == current_user.id)
+    query = filter_task_list(query, status, priority, due_after, due_before, model=source, sort=sort)
+    result = await db.execute(paginate_task_list(query, skip, limit, cursor, sort, model=source))
+    
+    if settings.fast_serialization_enabled:
+        tasks = result.all()
+    else:
+        tasks = result.scalars().all()
+    
+    next_cursor = next_page_cursor(tasks, limit, sort)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    if settings.response_cache_enabled:
+        return response_cache.store(current_user.id, cache_key, render_task_list(tasks), response.headers)
+    if settings.fast_serialization_enabled:
+        return FastJSONResponse(task_rows_to_dicts(tasks), headers=dict(response.headers))
+    return tasks
+
+@router.post("", response_model=TaskSchema, status_code=status.HTTP_201_CREATED)
+async def create_task_root(
+    task: TaskCreate,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create a new task"""
+    
+    if settings.group_commit_enabled:
+        return await group_commit.run_async(db, create_user_task, current_user.id, task.dict())
+    
+    db_task = await db.run_sync(create_user_task, current_user.id, task.dict())
+    await db.commit()
+    await db.refresh(db_task)
+    
+    return db_task
+
+# Search, due, changes, events, export and bulk routes are declared before /{task_id} so they are not taken as an id
+@router.get("/search", response_model=List[TaskSchema])
+async def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to search for in title and description"),
+    skip: int = Query(0, ge=0, description="Number of results to skip"),
+    limit: int = Query(20, ge=1, le=100, description="Number of results to return"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Full-text search over the current user's tasks, best match first"""
+    
+    query = select(Task).where(Task.user_id == current_user.id)
+    query = search_task_list(query, db.bind.dialect.name, q)
+    result = await db.execute(query.offset(skip).limit(limit))
+    
+    return result.scalars().all()
+
+@router.get("/due", response_model=List[TaskSchema])
+async def get_due_tasks(
+    window: str = Query("24h", description="How far ahead to look, e.g. 30m, 24h or 7d"),
+    skip: int = Query(0, ge=0, description="Number of tasks to skip"),
+    limit: int = Query(100, ge=1, le=100, description="Number of tasks to return"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Unfinished tasks due between now and the end of the window, soonest first"""
+    
+    now = datetime.now(timezone.utc)
+    query = select(Task).where(Task.user_id == current_user.id)
+    query = due_task_list(query, now, now + parse_due_window(window))
+    result = await db.execute(query.offset(skip).limit(limit))
+    
+    return result.scalars().all()
+
+@router.get("/overdue", response_model=List[TaskSchema])
+async def get_overdue_tasks(
+    skip: int = Query(0, ge=0, description="Number of tasks to skip"),
+    limit: int = Query(100, ge=1, le=100, description="Number of tasks to return"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Unfinished tasks whose due date has passed, most overdue first"""
+    
+    query = select(Task).where(Task.user_id == current_user.id)
+    query = due_task_list(query, None, datetime.now(timezone.utc))
+    result = await db.execute(query.offset(skip).limit(limit))
+    
+    return result.scalars().all()
+
+@router.get("/changes", response_model=TaskChanges)
+async def get_task_changes_since(
+    since: Optional[str] = Query(None, description="Token from a previous response's `next`; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=1000, description="Most tasks and deletions to return"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Tasks created, updated or deleted since a sync token
+
+    Clients keep the `next` token and call again with it; while `has_more` is
+    true there are further changes to fetch straight away. An expired token gets
+    410 and the client starts over with a full sync.
+    """
+    
+    return await db.run_sync(get_task_changes, current_user.id, since, limit)
+
+@router.post("/events/ticket", response_model=TaskEventsTicket)
+async def create_task_events_ticket(
+    current_user: User = Depends(get_current_user_async)
+):
+    """Short-lived ticket for opening the change feed from a browser
+
+    EventSource cannot send an Authorization header, and a URL ends up in
+    access logs, so GET /api/tasks/events takes this instead of the token.
+    """
+    
+    return {
+        "ticket": create_stream_ticket(current_user.email),
+        "expires_in": settings.task_events_ticket_seconds
+    }
+
+@router.get("/events")
+async def task_events(
+    current_user: User = Depends(get_stream_user_async)
+):
+    """Server-Sent Events feed of the current user's task changes
+
+    Each message's data is {"type": "created"|"updated"|"deleted"|"due", "task_id": ...}.
+    A {"type": "resync"} message means events were dropped and the list should be refetched.
+    """
+    
+    if not settings.task_events_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Change feed is disabled"
+        )
+    subscription = task_feed.subscribe(current_user.id)
+    
+    return StreamingResponse(
+        stream_task_events(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/export")
+async def export_tasks(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    status: Optional[str] = Query(None, description="Filter by status, one or more comma-separated (todo,in_progress)"),
+    priority: Optional[str] = Query(None, description="Filter by priority, one or more comma-separated"),
+    due_after: Optional[datetime] = Query(None, description="Only tasks due at or after this time"),
+    due_before: Optional[datetime] = Query(None, description="Only tasks due before this time"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream every task of the current user as NDJSON or CSV"""
+    
+    query = select(*EXPORT_COLUMNS).where(Task.user_id == current_user.id)
+    query = filter_task_list(query, status, priority, due_after, due_before).order_by(Task.id)
+    result = await db.stream(query)
+    
+    return StreamingResponse(
+        encode_export_async(result.partitions(EXPORT_CHUNK_ROWS), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'}
+    )
+
+@router.post("/bulk", response_model=List[TaskBulkResult], status_code=status.HTTP_201_CREATED)
+async def create_tasks_bulk(
+    tasks: List[TaskCreate],
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create many tasks in one transaction"""
+    
+    check_bulk_size(tasks)
+    results = await db.run_sync(bulk_create_tasks, current_user.id, tasks)
+    await db.commit()
+    
+    return results
+
+@router.patch("/bulk", response_model=List[TaskBulkResult])
+async def update_tasks_bulk(
+    items: List[TaskBulkUpdate],
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Update many tasks in one transaction; unknown ids are reported as not_found, items with no fields as unchanged"""
+    
+    check_bulk_size(items)
+    results = await db.run_sync(bulk_update_tasks, current_user.id, items)
+    await db.commit()
+    
+    return results
+
+@router.delete("/bulk", response_model=List[TaskBulkResult])
+async def delete_tasks_bulk(
+    task_ids: List[int],
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Delete many tasks in one transaction; unknown ids are reported as not_found"""
+    
+    check_bulk_size(task_ids)
+    results = await db.run_sync(bulk_delete_tasks, current_user.id, task_ids)
+    await db.commit()
+    
+    return results
+
+@router.get("/{task_id}", response_model=TaskSchema)
+async def get_task(
+    task_id: int,
+    include_archived: bool = Query(False, description="Also look for the task in the archive"),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a specific task by ID; archived tasks are read-only and found with include_archived"""
+    
+    task = await _get_user_task(db, task_id, current_user.id, include_archived)
+    
+    etag = task_etag(task)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    
+    return task
+
+@router.put("/{task_id}", response_model=TaskSchema)
+async def update_task(
+    task_id: int,
+    task_update: TaskUpdate,
+    if_match: Optional[str] = Header(None),
+    response: Response = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Update a specific task; an If-Match header makes the update conditional"""
+    
+    update_data = task_update.dict(exclude_unset=True)
+    if settings.group_commit_enabled:
+        task = await group_commit.run_async(db, update_user_task, current_user.id, task_id, update_data, if_match)
+    else:
+        task = await db.run_sync(update_user_task, current_user.id, task_id, update_data, if_match)
+        await db.commit()
+        await db.refresh(task)
+    response.headers["ETag"] = task_etag(task)
+    
+    return task
+
+@router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_task(
+    task_id: int,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Delete a specific task; an If-Match header makes the delete conditional"""
+    
+    if settings.group_commit_enabled:
+        await group_commit.run_async(db, delete_user_task, current_user.id, task_id, if_match)
+    else:
+        await db.run_sync(delete_user_task, current_user.id, task_id, if_match)
+        await db.commit()
+    
+    return None
+
+@router.get("/stats/summary")
+async def get_task_stats(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get task statistics for the current user"""
+    
+    return await db.run_sync(get_user_task_stats, current_user.id)
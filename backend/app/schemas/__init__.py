@@ -1,3 +1,5 @@
 # Schemas package
 from .user import User, UserCreate, UserUpdate, UserLogin, Token, TokenData
-from .task import Task, TaskCreate, TaskUpdate, TaskWithOwner 
\ No newline at end of file
+from .task import Task, TaskCreate, TaskUpdate, TaskWithOwner, TaskBulkUpdate, TaskBulkResult, TaskChanges, TaskEventsTicket
+from .analytics import TaskWriteCounts, TaskAnalytics, TaskAnalyticsBucket, TaskAnalyticsTotals
+from .profiling import ProfilingSwitch, ProfilingStatus, ProfileSummary, ProfileDetail
\ No newline at end of file
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Dict, List, Optional
+from ..models.task import TaskStatus, TaskPriority
+
+
+class TaskWriteCounts(BaseModel):
+    created: int = Field(..., description="Tasks created")
+    updated: int = Field(..., description="Updates to existing tasks")
+    completed: int = Field(..., description="Tasks created as done or moved to done")
+    deleted: int = Field(..., description="Tasks deleted")
+
+
+class TaskAnalyticsBucket(TaskWriteCounts):
+    bucket: datetime = Field(..., description="Start of the hour or day, UTC")
+    status: Optional[TaskStatus] = Field(None, description="Task status, with group_by=status")
+    priority: Optional[TaskPriority] = Field(None, description="Task priority, with group_by=priority")
+
+
+class TaskAnalytics(BaseModel):
+    interval: str = Field(..., description="hour or day")
+    start: datetime = Field(..., description="Start of the first bucket in range")
+    end: datetime = Field(..., description="End of the range (exclusive)")
+    buckets: List[TaskAnalyticsBucket] = Field(..., description="Buckets with task writes, oldest first")
+
+
+class TaskAnalyticsTotals(TaskWriteCounts):
+    start: datetime = Field(..., description="Start of the first day in range")
+    end: datetime = Field(..., description="End of the range (exclusive)")
+    by_status: Dict[str, TaskWriteCounts] = Field(..., description="Counts by task status")
+    by_priority: Dict[str, TaskWriteCounts] = Field(..., description="Counts by task priority")
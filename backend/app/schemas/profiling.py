@@ -0,0 +1,55 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+
+
+class ProfilingSwitch(BaseModel):
+    enabled: bool = Field(..., description="Profile requests on every worker of the host")
+    sample_rate: float = Field(0, ge=0, le=1, description="Fraction of requests to profile besides those flagged by an admin")
+    user_id: Optional[int] = Field(None, description="Only sample this user's requests")
+    duration_seconds: Optional[float] = Field(900, gt=0, description="Switch off again after this long; null keeps it on")
+
+
+class ProfilingStatus(BaseModel):
+    enabled: bool
+    sample_rate: float
+    user_id: Optional[int]
+    expires_at: Optional[datetime] = Field(None, description="When the switch turns itself off")
+    buffer_size: int = Field(..., description="Most profiles kept on the host")
+    profiles: int = Field(..., description="Profiles kept on the host")
+    pid: int = Field(..., description="Worker that answered; the switch and the profiles are shared by the host's workers")
+
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    query: str
+    user_id: Optional[int] = Field(None, description="User of the request, when their token was valid")
+    trigger: str = Field(..., description="flag (asked for by an admin) or sample")
+    started_at: datetime
+    status_code: int
+    duration_ms: float
+    calls: int = Field(..., description="Python function calls profiled")
+    sql_count: int
+    sql_ms: float
+
+
+class ProfileStatement(BaseModel):
+    offset_ms: float = Field(..., description="Start of the statement from the start of the request")
+    duration_ms: float
+    statement: str
+
+
+class ProfileFunction(BaseModel):
+    function: str
+    file: str
+    line: int
+    calls: int
+    self_ms: float = Field(..., description="Time in the function itself")
+    total_ms: float = Field(..., description="Time in the function and the functions it called")
+
+
+class ProfileDetail(ProfileSummary):
+    statements: List[ProfileStatement] = Field(..., description="SQL in execution order, the first 1000")
+    functions: List[ProfileFunction] = Field(..., description="Functions with the most self time")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from ..models.task import TaskStatus, TaskPriority
 
 
@@ -40,4 +40,27 @@ class Task(TaskInDB):
 
 class TaskWithOwner(Task):
     owner_username: str = Field(..., description="Task owner username")
-    owner_email: str = Field(..., description="Task owner email")
\ No newline at end of file
+    owner_email: str = Field(..., description="Task owner email")
+
+
+class TaskBulkUpdate(TaskUpdate):
+    id: int = Field(..., description="ID of the task to update")
+
+
+class TaskBulkResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    id: Optional[int] = Field(None, description="Task ID")
+    result: str = Field(..., description="created, updated, unchanged (no fields given), deleted or not_found")
+    task: Optional[Task] = Field(None, description="Task after the write")
+
+
+class TaskChanges(BaseModel):
+    tasks: List[Task] = Field(..., description="Tasks created or updated since the token, in their current state")
+    deleted: List[int] = Field(..., description="IDs of tasks deleted since the token; apply these before `tasks`")
+    next: str = Field(..., description="Token to pass as `since` on the next call")
+    has_more: bool = Field(..., description="Whether more changes are waiting; call again with `next` right away")
+
+
+class TaskEventsTicket(BaseModel):
+    ticket: str = Field(..., description="Pass as `ticket` to GET /api/tasks/events; opens nothing else")
+    expires_in: int = Field(..., description="Seconds until the ticket stops opening the feed")
@@ -1,3 +1,6 @@
 # Utils package
-from .auth import get_password_hash, verify_password, create_access_token, verify_token, get_token_from_header
-from .dependencies import get_current_user, get_current_admin_user 
\ No newline at end of file
+from .auth import get_password_hash, verify_password, verify_and_update_password, password_needs_rehash, create_access_token, decode_token, verify_token, get_token_from_header
+from .dependencies import get_current_user, get_current_admin_user, get_current_user_async, get_current_admin_user_async, get_stream_user, get_stream_user_async
+from .pagination import encode_cursor, decode_cursor
+from .password_pool import PasswordHashPool, password_hash_pool
+from .user_cache import UserSnapshot, user_cache
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import math
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, NamedTuple, Optional
+from ..config import settings
+from .user_cache import user_cache
+
+# Never limited, so probes and scrapes keep working while the worker sheds load
+UNLIMITED_PATHS = frozenset({"/health", "/health/pool", "/metrics"})
+
+# Rate limited but outside the concurrency cap: they stay open by design
+LONG_LIVED_PATHS = frozenset({"/api/tasks/events"})
+
+# Most token buckets kept per worker; the least recently used are dropped
+# (which refills them) past this
+MAX_BUCKETS = 100_000
+
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+
+class RateLimit(NamedTuple):
+    """One RATE_LIMITS rule: `count` requests per `period` seconds per user or per IP"""
+    method: Optional[str]
+    prefix: str
+    scope: str
+    count: int
+    period: float
+
+
+def parse_rate_limits(spec: str) -> List[RateLimit]:
+    """Parse rules such as "POST /api/auth/login=ip:10/m, /api/tasks=user:20/s"
+
+    The method is optional and the path matches as a prefix. A request is
+    checked against every rule it matches.
+    """
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        match = re.fullmatch(r"(?:([A-Z]+)\s+)?(/\S*)\s*=\s*(user|ip):(\d+)/([smh])", item)
+        if not match:
+            raise ValueError(f"Invalid RATE_LIMITS rule {item!r}, expected [METHOD] /path=user|ip:COUNT/s|m|h")
+        method, prefix, scope, count, unit = match.groups()
+        rules.append(RateLimit(method, prefix, scope, int(count), RATE_PERIODS[unit]))
+    return rules
+
+
+class TokenBuckets:
+    """Token buckets by key, each holding up to `count` tokens and refilling at count/period"""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[tuple, List[float]]" = OrderedDict()
+
+    def take(self, key: tuple, count: int, period: float, now: float) -> float:
+        """Spend a token and return 0, or return the seconds until one is available"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(count), now]
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(count, bucket[0] + (now - bucket[1]) * count / period)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) * period / count
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionController:
+    """Per-worker rate limits and a cap on requests in flight
+
+    Requests over the cap wait in a FIFO queue of at most `max_queued` and are
+    shed once they have waited `max_queue_seconds`. Everything runs on the
+    event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, rules: List[RateLimit], max_in_flight: int, max_queued: int, max_queue_seconds: float):
+        self.rules = rules
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_queue_seconds = max_queue_seconds
+        self.buckets = TokenBuckets()
+        self.in_flight = 0
+        self.rate_limited: Dict[str, int] = {"user": 0, "ip": 0}
+        self.shed = 0
+        self.queue_seconds = 0.0
+        self._waiters: deque = deque()
+
+    def check_rate(self, method: str, path: str, client_ip: Optional[str], user_id: Optional[int]) -> float:
+        """Seconds the client should wait before retrying, 0 when the request is allowed"""
+        now = time.monotonic()
+        for index, rule in enumerate(self.rules):
+            if (rule.method and rule.method != method) or not path.startswith(rule.prefix):
+                continue
+            identity = user_id if rule.scope == "user" else client_ip
+            if identity is None:
+                continue
+            wait = self.buckets.take((index, identity), rule.count, rule.period, now)
+            if wait:
+                self.rate_limited[rule.scope] += 1
+                return wait
+        return 0.0
+
+    async def acquire(self) -> bool:
+        """Take an in-flight slot, queueing for one if needed; False when the request is shed"""
+        if self.max_in_flight <= 0:
+            return True
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queued:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            # release() hands its slot straight to the waiter, so in_flight is unchanged
+            await asyncio.wait_for(waiter, self.max_queue_seconds)
+            return True
+        except BaseException as error:
+            handed_over = waiter.done() and not waiter.cancelled()
+            if not handed_over:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(error, asyncio.TimeoutError):
+                if handed_over:
+                    return True
+                self.shed += 1
+                return False
+            if handed_over:
+                self.release()
+            raise
+        finally:
+            self.queue_seconds += time.monotonic() - started
+
+    def release(self):
+        if self.max_in_flight <= 0:
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "rate_limited_user": self.rate_limited["user"],
+            "rate_limited_ip": self.rate_limited["ip"],
+            "shed": self.shed,
+            "queue_seconds": self.queue_seconds,
+            "buckets": len(self.buckets),
+        }
+
+
+admission = AdmissionController(
+    parse_rate_limits(settings.rate_limits),
+    max_in_flight=settings.admission_max_in_flight,
+    max_queued=settings.admission_max_queued,
+    max_queue_seconds=settings.admission_max_queue_ms / 1000,
+)
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _user_id(scope) -> Optional[int]:
+    """The user behind the bearer token, if the user cache has already verified it
+
+    Unverified tokens are never trusted here, so a forged token can't drain
+    another user's bucket; they are limited by IP until authentication succeeds.
+    """
+    authorization = _header(scope, b"authorization")
+    if not authorization or not authorization.startswith(b"Bearer "):
+        return None
+    snapshot = user_cache.peek(authorization[7:].decode("latin-1"))
+    return snapshot.id if snapshot is not None else None
+
+
+def _waited_upstream(scope) -> float:
+    """Seconds since a proxy's X-Request-Start (t=<s|ms|us>), 0 without one"""
+    value = _header(scope, b"x-request-start")
+    if not value:
+        return 0.0
+    try:
+        started = float(value.decode("latin-1").strip().removeprefix("t="))
+    except ValueError:
+        return 0.0
+    while started > 1e11:
+        started /= 1000
+    waited = time.time() - started
+    # Ignore clock skew and nonsense rather than shedding on it
+    return waited if 0 < waited < 3600 else 0.0
+
+
+async def _reject(send, status_code: int, retry_after: float, detail: str):
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": json.dumps({"detail": detail}).encode()})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware answering 429 past a rate limit and 503 when the worker is saturated"""
+
+    def __init__(self, app: Callable, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNLIMITED_PATHS:
+            return await self.app(scope, receive, send)
+
+        controller = self.controller
+        client = scope.get("client")
+        retry_after = controller.check_rate(scope["method"], scope["path"], client[0] if client else None, _user_id(scope))
+        if retry_after:
+            return await _reject(send, 429, retry_after, "Too many requests, slow down")
+
+        if scope["path"] in LONG_LIVED_PATHS:
+            return await self.app(scope, receive, send)
+
+        # A request that already queued too long upstream would time out anyway
+        if _waited_upstream(scope) > controller.max_queue_seconds:
+            controller.shed += 1
+            return await _reject(send, 503, 1, "Server is busy, retry shortly")
+        if not await controller.acquire():
+            return await _reject(send, 503, 1, "Server is busy, retry shortly")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release()
@@ -1,30 +1,88 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 import jwt
 import hashlib
+import hmac
 import os
 from fastapi import HTTPException, status
 from ..config import settings
 
-# Simple password hashing using SHA256 + salt (no external dependencies)
+# Password hashes are "<scheme>$<cost params>$<salt>$<digest>" (scrypt or
+# pbkdf2_sha256, cost from Settings). Hashes from before that are "<salt>$<sha256>"
+# and still verify, but report needing a rehash.
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, dklen=32,
+        maxmem=256 * n * r + 1024 * 1024
+    )
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
 def get_password_hash(password: str) -> str:
-    """Hash a password using SHA256 + salt"""
-    salt = os.urandom(32).hex()
-    hash_obj = hashlib.sha256((password + salt).encode())
-    return f"{salt}${hash_obj.hexdigest()}"
+    """Hash a password with the configured KDF and a random salt"""
+    salt = os.urandom(16)
+    if settings.password_kdf == "pbkdf2_sha256":
+        iterations = settings.pbkdf2_iterations
+        return f"pbkdf2_sha256${iterations}${salt.hex()}${_pbkdf2(password, salt, iterations).hex()}"
+    n, r, p = settings.scrypt_n, settings.scrypt_r, settings.scrypt_p
+    return f"scrypt${n},{r},{p}${salt.hex()}${_scrypt(password, salt, n, r, p).hex()}"
+
+
+def dummy_password_hash() -> str:
+    """A hash in the configured KDF that no password matches, for costing a failed lookup like a real check"""
+    salt, digest = os.urandom(16).hex(), os.urandom(32).hex()
+    if settings.password_kdf == "pbkdf2_sha256":
+        return f"pbkdf2_sha256${settings.pbkdf2_iterations}${salt}${digest}"
+    return f"scrypt${settings.scrypt_n},{settings.scrypt_r},{settings.scrypt_p}${salt}${digest}"
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     try:
-        salt, hash_value = hashed_password.split('$')
-        hash_obj = hashlib.sha256((plain_password + salt).encode())
-        return hash_obj.hexdigest() == hash_value
+        parts = hashed_password.split('$')
+        if len(parts) == 2:
+            # Legacy salt$sha256
+            salt, hash_value = parts
+            digest = hashlib.sha256((plain_password + salt).encode()).hexdigest()
+        elif parts[0] == "scrypt":
+            n, r, p = (int(value) for value in parts[1].split(","))
+            digest = _scrypt(plain_password, bytes.fromhex(parts[2]), n, r, p).hex()
+            hash_value = parts[3]
+        elif parts[0] == "pbkdf2_sha256":
+            digest = _pbkdf2(plain_password, bytes.fromhex(parts[2]), int(parts[1])).hex()
+            hash_value = parts[3]
+        else:
+            return False
+        return hmac.compare_digest(digest, hash_value)
     except Exception as e:
         print(f"Password verification error: {e}")
         return False
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a hash uses a legacy format or different KDF settings than configured"""
+    parts = hashed_password.split('$')
+    if settings.password_kdf == "pbkdf2_sha256":
+        return parts[:2] != ["pbkdf2_sha256", str(settings.pbkdf2_iterations)]
+    return parts[:2] != ["scrypt", f"{settings.scrypt_n},{settings.scrypt_r},{settings.scrypt_p}"]
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and, if its hash is outdated, return a fresh one to store"""
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if password_needs_rehash(hashed_password):
+        return True, get_password_hash(plain_password)
+    return True, None
+
+
+# Scope of stream tickets, which go in URLs (and so access logs) and are refused anywhere else
+STREAM_TICKET_SCOPE = "task_events"
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -38,16 +96,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def verify_token(token: str, credentials_exception):
-    """Verify and decode a JWT token"""
+def create_stream_ticket(email: str) -> str:
+    """Create a short-lived JWT that only opens the task change feed"""
+    return create_access_token(
+        data={"sub": email, "scope": STREAM_TICKET_SCOPE},
+        expires_delta=timedelta(seconds=settings.task_events_ticket_seconds)
+    )
+
+
+def decode_token(token: str, credentials_exception, scope: Optional[str] = None) -> dict:
+    """Verify a JWT token and return its payload; tokens issued for another scope are rejected"""
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        return email
     except jwt.PyJWTError:
         raise credentials_exception
+    if payload.get("sub") is None or payload.get("scope") != scope:
+        raise credentials_exception
+    return payload
+
+
+def verify_token(token: str, credentials_exception):
+    """Verify and decode a JWT token"""
+    return decode_token(token, credentials_exception)["sub"]
 
 
 def get_token_from_header(authorization: str) -> str:
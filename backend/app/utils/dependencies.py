@@ -1,44 +1,147 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models.user import User
-from ..utils.auth import verify_token
+from ..utils.auth import STREAM_TICKET_SCOPE, decode_token
+from ..utils.shards import bind_user_shard
+from ..utils.user_cache import UserSnapshot, user_cache
 
 # Security scheme
 security = HTTPBearer()
+# Long-lived streams also take a stream ticket from the query string, since browsers'
+# EventSource cannot set an Authorization header
+stream_security = HTTPBearer(auto_error=False)
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user"""
-    
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def user_from_token(token: str, db: Session) -> UserSnapshot:
+    """The user a bearer token belongs to; raises 401 if it is invalid or the user is gone"""
+    credentials_exception = _credentials_exception()
+    
+    # Tokens verified recently resolve without touching the database
+    snapshot = user_cache.get(token)
+    if snapshot is not None:
+        return snapshot
     
     # Verify token and get email
-    email = verify_token(credentials.credentials, credentials_exception)
+    payload = decode_token(token, credentials_exception)
     
     # Get user from database
-    user = db.query(User).filter(User.email == email).first()
+    user = db.query(User).filter(User.email == payload["sub"]).first()
+    if user is None:
+        raise credentials_exception
+    
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.set(token, snapshot, payload.get("exp"))
+    return snapshot
+
+
+async def _user_from_token_async(token: str, db) -> UserSnapshot:
+    credentials_exception = _credentials_exception()
+    
+    snapshot = user_cache.get(token)
+    if snapshot is not None:
+        return snapshot
+    
+    payload = decode_token(token, credentials_exception)
+    
+    result = await db.execute(select(User).where(User.email == payload["sub"]))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
     
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.set(token, snapshot, payload.get("exp"))
+    return snapshot
+
+
+def _stream_user(
+    db: Session, credentials: Optional[HTTPAuthorizationCredentials], ticket: Optional[str]
+) -> UserSnapshot:
+    if credentials:
+        return user_from_token(credentials.credentials, db)
+    if not ticket:
+        raise _credentials_exception()
+    # Tickets are short-lived, so they are not cached like bearer tokens
+    payload = decode_token(ticket, _credentials_exception(), STREAM_TICKET_SCOPE)
+    user = db.query(User).filter(User.email == payload["sub"]).first()
+    if user is None:
+        raise _credentials_exception()
+    return UserSnapshot.from_user(user)
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> UserSnapshot:
+    """Get current authenticated user; task queries on the request's session go to their shard"""
+    user = user_from_token(credentials.credentials, db)
+    bind_user_shard(db, user.id)
+    return user
+
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db=Depends(get_async_db)
+) -> UserSnapshot:
+    """Get current authenticated user through an AsyncSession, bound to their shard"""
+    user = await _user_from_token_async(credentials.credentials, db)
+    await db.run_sync(bind_user_shard, user.id)
     return user
 
 
+def get_stream_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(stream_security),
+    ticket: Optional[str] = Query(None, description="Stream ticket from POST /api/tasks/events/ticket, for clients that cannot send headers"),
+    db: Session = Depends(get_db)
+) -> UserSnapshot:
+    """Authenticated user of a long-lived stream
+    
+    The session is closed straight away so the stream does not keep a pooled
+    connection for as long as the client stays connected.
+    """
+    try:
+        return _stream_user(db, credentials, ticket)
+    finally:
+        db.close()
+
+
+async def get_stream_user_async(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(stream_security),
+    ticket: Optional[str] = Query(None, description="Stream ticket from POST /api/tasks/events/ticket, for clients that cannot send headers"),
+    db=Depends(get_async_db)
+) -> UserSnapshot:
+    """Authenticated user of a long-lived stream through an AsyncSession"""
+    try:
+        return await db.run_sync(_stream_user, credentials, ticket)
+    finally:
+        await db.close()
+
+
 def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserSnapshot = Depends(get_current_user)
+) -> UserSnapshot:
     """Get current authenticated admin user"""
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+async def get_current_admin_user_async(
+    current_user: UserSnapshot = Depends(get_current_user_async)
+) -> UserSnapshot:
+    """Get current authenticated admin user on the async path"""
+    return get_current_admin_user(current_user)
@@ -0,0 +1,156 @@
+import asyncio
+import copy
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter:
+    """Commits task writes from concurrent requests together, one writer thread per database
+
+    A writer takes the first queued write, waits up to `window_ms` for more
+    (at most `max_batch`), runs each in a savepoint of one transaction and
+    commits them all at once, so the batch shares one commit and one fsync.
+    A write that raises is rolled back alone and its caller gets the
+    exception; the others get their results once the commit has returned.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queues: Dict[object, queue.Queue] = {}
+        self._threads: Dict[object, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._writes = 0
+        self._largest = 0
+
+    def _queue(self, shard) -> queue.Queue:
+        with self._lock:
+            pending = self._queues.get(shard)
+            if pending is None:
+                pending = self._queues[shard] = queue.Queue()
+                thread = threading.Thread(target=self._drain, args=(shard, pending), name=f"group-commit-{shard}", daemon=True)
+                self._threads[shard] = thread
+                thread.start()
+            return pending
+
+    def submit(self, shard, moving: bool, write: Callable, *args) -> Future:
+        """Queue write(session, *args) for the shard's writer; the future resolves after its commit"""
+        future = Future()
+        self._queue(shard).put((future, moving, write, args))
+        return future
+
+    def run(self, db: Session, write: Callable, *args):
+        """Run a write in the next batch for the request's shard and wait for it to commit"""
+        shard, moving = db.info.get("shard"), db.info.get("shard_moving", False)
+        # Hand the request's connection back to the pool while waiting on the writer
+        db.rollback()
+        return self.submit(shard, moving, write, *args).result()
+
+    async def run_async(self, db, write: Callable, *args):
+        """run() for an AsyncSession; the write itself runs on the writer's sync session"""
+        info = db.sync_session.info
+        shard, moving = info.get("shard"), info.get("shard_moving", False)
+        await db.rollback()
+        return await asyncio.wrap_future(self.submit(shard, moving, write, *args))
+
+    def _drain(self, shard, pending: queue.Queue):
+        while True:
+            batch = [pending.get()]
+            if batch[0] is None:
+                return
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    item = pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Stopping: commit what was taken, then exit
+                    pending.put(None)
+                    break
+                batch.append(item)
+            try:
+                self._commit(shard, batch)
+            except Exception:
+                logger.exception("Group commit writer for shard %s failed", shard)
+
+    def _commit(self, shard, batch: list):
+        db = SessionLocal(info={"shard": shard}, expire_on_commit=False)
+        written = []
+        try:
+            connection = db.connection()
+            if connection.dialect.name == "sqlite":
+                # pysqlite opens no transaction before a SAVEPOINT, so each RELEASE would
+                # commit on its own; open the batch's transaction first, with the write lock
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            for future, moving, write, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # Per-transaction work queued in info (events, cache drops, reminders)
+                # must be undone along with a failed write's savepoint
+                saved = copy.deepcopy(db.info)
+                db.info["shard_moving"] = moving
+                try:
+                    with db.begin_nested():
+                        result = write(db, *args)
+                except Exception as exc:
+                    db.info.clear()
+                    db.info.update(saved)
+                    future.set_exception(exc)
+                else:
+                    written.append((future, result))
+            if written:
+                db.commit()
+        except Exception as exc:
+            # Nothing in the batch was committed
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            db.close()
+
+        with self._lock:
+            self._batches += 1
+            self._writes += len(written)
+            self._largest = max(self._largest, len(written))
+        for future, result in written:
+            future.set_result(result)
+
+    def stop(self, timeout: float = 5.0):
+        """Commit what is queued and end the writer threads"""
+        with self._lock:
+            queues, threads = dict(self._queues), dict(self._threads)
+            self._queues.clear()
+            self._threads.clear()
+        for pending in queues.values():
+            pending.put(None)
+        for thread in threads.values():
+            thread.join(timeout)
+
+    def reset(self):
+        # Writer threads don't survive a fork; the child starts its own
+        with self._lock:
+            self._queues.clear()
+            self._threads.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"batches": self._batches, "writes": self._writes, "largest": self._largest}
+
+
+group_commit = GroupCommitWriter(settings.group_commit_window_ms, settings.group_commit_max_batch)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=group_commit.reset)
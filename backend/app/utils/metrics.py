@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Most statements kept per request for the slow-request log
+SLOW_LOG_MAX_STATEMENTS = 20
+
+
+class Histogram:
+    """Fixed-bucket histogram rendered in Prometheus cumulative form"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+        total = 0
+        result = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class RequestSQL:
+    """SQL statement count and time accumulated by the current request"""
+
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: List[Tuple[float, str]] = []
+
+
+_request_sql: ContextVar[Optional[RequestSQL]] = ContextVar("request_sql", default=None)
+
+
+class MetricsRegistry:
+    """In-process request and SQL metrics for one worker"""
+
+    def __init__(self):
+        self.requests: Dict[tuple, int] = {}
+        self.latency: Dict[tuple, Histogram] = {}
+        self.request_sql_count: Dict[tuple, int] = {}
+        self.request_sql_seconds: Dict[tuple, float] = {}
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.in_progress = 0
+        self.slow_requests = 0
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        with self._lock:
+            self.in_progress += 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float, sql: RequestSQL, slow: bool):
+        key = (method, route)
+        with self._lock:
+            self.in_progress -= 1
+            self.slow_requests += slow
+            status_key = (method, route, str(status))
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram()
+            histogram.observe(seconds)
+            self.request_sql_count[key] = self.request_sql_count.get(key, 0) + sql.count
+            self.request_sql_seconds[key] = self.request_sql_seconds.get(key, 0.0) + sql.seconds
+
+    def sql_executed(self, seconds: float):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_seconds += seconds
+
+    def render(self, extra: List[Tuple[str, str, str, float]] = ()) -> str:
+        """Prometheus text exposition format, plus (name, type, help, value) samples"""
+        lines = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("http_requests_total", "counter", "HTTP requests by route and status code")
+            for (method, route, status), value in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {value}')
+
+            family("http_request_duration_seconds", "histogram", "HTTP request latency by route")
+            for (method, route), histogram in sorted(self.latency.items()):
+                labels = f'method="{method}",route="{route}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {sum(histogram.counts)}")
+
+            family("http_request_sql_statements_total", "counter", "SQL statements executed while serving a route")
+            for (method, route), value in sorted(self.request_sql_count.items()):
+                lines.append(f'http_request_sql_statements_total{{method="{method}",route="{route}"}} {value}')
+
+            family("http_request_sql_seconds_total", "counter", "Time spent in SQL while serving a route")
+            for (method, route), value in sorted(self.request_sql_seconds.items()):
+                lines.append(f'http_request_sql_seconds_total{{method="{method}",route="{route}"}} {value}')
+
+            family("http_requests_in_progress", "gauge", "HTTP requests currently being served")
+            lines.append(f"http_requests_in_progress {self.in_progress}")
+
+            family("http_slow_requests_total", "counter", "Requests slower than SLOW_REQUEST_MS")
+            lines.append(f"http_slow_requests_total {self.slow_requests}")
+
+            family("db_statements_total", "counter", "SQL statements executed by this worker")
+            lines.append(f"db_statements_total {self.sql_count}")
+
+            family("db_statement_seconds_total", "counter", "Time spent executing SQL statements")
+            lines.append(f"db_statement_seconds_total {self.sql_seconds}")
+
+        for name, kind, help_text, value in extra:
+            family(name, kind, help_text)
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# The start time lives on the per-statement execution context, so a statement
+# that raises simply never reports instead of skewing the next one
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._metrics_started
+    metrics.sql_executed(seconds)
+    sql = _request_sql.get()
+    if sql is not None:
+        sql.count += 1
+        sql.seconds += seconds
+        if len(sql.statements) < SLOW_LOG_MAX_STATEMENTS:
+            sql.statements.append((seconds, statement))
+
+
+def instrument_engine(engine: Engine):
+    """Time every statement the engine executes (pass async_engine.sync_engine for async)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _log_slow_request(method: str, path: str, seconds: float, sql: RequestSQL):
+    statements = "\n".join(
+        f"  {statement_seconds * 1000:.1f} ms  {' '.join(statement.split())}"
+        for statement_seconds, statement in sql.statements
+    )
+    if sql.count > len(sql.statements):
+        statements += f"\n  ... {sql.count - len(sql.statements)} more"
+    logger.warning(
+        "Slow request %s %s took %.1f ms, %d SQL statements in %.1f ms\n%s",
+        method, path, seconds * 1000, sql.count, sql.seconds * 1000, statements
+    )
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL work per route template"""
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        sql = RequestSQL()
+        token = _request_sql.set(sql)
+        status_code = 500
+        event_stream = False
+        metrics.request_started()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code, event_stream
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                event_stream = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - started
+            _request_sql.reset(token)
+            # Event streams stay open by design and are never reported as slow
+            slow = bool(settings.slow_request_ms) and seconds * 1000 >= settings.slow_request_ms and not event_stream
+            metrics.request_finished(scope["method"], _route_label(scope), status_code, seconds, sql, slow)
+            if slow:
+                _log_slow_request(scope["method"], scope["path"], seconds, sql)
+
+
+_endpoint_paths: Dict[Callable, str] = {}
+
+
+def _route_label(scope) -> str:
+    """Path template of the route that served the request, e.g. /api/tasks/{task_id}
+
+    The router leaves the matched endpoint in the scope; labelling by template
+    rather than by path keeps one series per route instead of one per task id.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _endpoint_paths.get(endpoint)
+    if path is None:
+        path = "unmatched"
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is endpoint:
+                path = route.path_format
+                break
+        _endpoint_paths[endpoint] = path
+    return path
@@ -0,0 +1,86 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from ..config import settings
+from .auth import get_password_hash, verify_and_update_password
+
+
+def _lower_priority():
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+
+class PasswordHashPool:
+    """Runs password hashing off the request path with a bounded queue
+
+    KDF work goes to a dedicated process pool so a burst of logins cannot use up
+    the threadpool that serves task requests. Once `max_pending` hashes are queued
+    or running, new ones are refused at once with a 503 instead of waiting.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use, i.e. after gunicorn has forked the worker; spawned
+        # children avoid inheriting the parent's threads and held locks. They run
+        # at a lower CPU priority so request handling wins when cores are scarce.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent sign-ins, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            try:
+                return await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool for the next caller
+                self._executor = None
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Password hashing unavailable, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; the second value is a replacement hash when the stored one is outdated"""
+        return await self._run(verify_and_update_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "pending": self.pending, "rejected": self.rejected}
+
+
+password_hash_pool = PasswordHashPool(settings.password_hash_workers, settings.password_hash_max_pending)
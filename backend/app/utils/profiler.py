@@ -0,0 +1,546 @@
+import cProfile
+import functools
+import inspect
+import itertools
+import json
+import marshal
+import os
+import pstats
+import random
+import stat
+import tempfile
+import threading
+import time
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from fastapi import FastAPI, HTTPException, status
+from fastapi.dependencies.models import Dependant
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from ..config import settings
+from ..database import SessionLocal
+from .admission import LONG_LIVED_PATHS
+from .dependencies import user_from_token
+from .user_cache import UserSnapshot, user_cache
+
+# Most SQL statements kept per profile
+PROFILE_MAX_STATEMENTS = 1000
+
+# How often a worker re-reads the switch shared by the workers of its host
+SWITCH_POLL_SECONDS = 1.0
+
+# Never profiled: the profiling endpoints themselves and streams that stay open
+UNPROFILED_PREFIXES = ("/api/admin/profil",)
+
+Frame = Tuple[str, int, str]
+
+_DISABLE: Frame = ("~", 0, "<method 'disable' of '_lsprof.Profiler' objects>")
+
+
+class RequestProfile:
+    """cProfile statistics and timed SQL of one request"""
+
+    __slots__ = (
+        "id", "method", "path", "query", "user_id", "trigger", "started_at", "status_code",
+        "seconds", "stats", "calls", "statements", "sql_count", "sql_seconds",
+        "_loop_profile", "_thread_profiles", "_lock", "_started",
+    )
+    # Kept when a finished profile is stored for the other workers
+    STORED = (
+        "id", "method", "path", "query", "user_id", "trigger", "status_code",
+        "seconds", "calls", "sql_count", "sql_seconds",
+    )
+
+    def __init__(self, profile_id: str, scope, user_id: Optional[int], trigger: str):
+        self.id = profile_id
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query = scope["query_string"].decode("latin-1")
+        self.user_id = user_id
+        self.trigger = trigger
+        self.started_at = datetime.now(timezone.utc)
+        self.status_code = 500
+        self.seconds = 0.0
+        # pstats table: function -> (primitive calls, calls, self seconds, total seconds, callers)
+        self.stats: Dict[Frame, tuple] = {}
+        self.calls = 0
+        self.statements: List[Tuple[float, float, str]] = []
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        # The request's slices of the event loop, and one profile per threadpool call
+        self._loop_profile = cProfile.Profile()
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def run_profiled(self, call: Callable, *args, **kwargs):
+        """Call a function of the request in this thread under its own cProfile"""
+        call_profile = cProfile.Profile()
+        if not _enable(call_profile):
+            return call(*args, **kwargs)
+        try:
+            return call(*args, **kwargs)
+        finally:
+            call_profile.disable()
+            with self._lock:
+                self._thread_profiles.append(call_profile)
+
+    def collect(self):
+        """Merge the event loop and threadpool profiles into the pstats table"""
+        with self._lock:
+            profiles = [self._loop_profile, *self._thread_profiles]
+            self._thread_profiles = []
+        merged = pstats.Stats()
+        for profile in profiles:
+            merged.add(profile)
+        # Each profile records the call that switched it off
+        merged.stats.pop(_DISABLE, None)
+        for _, _, _, _, callers in merged.stats.values():
+            callers.pop(_DISABLE, None)
+        self.stats = merged.stats
+        self.calls = sum(nc for _, nc, _, _, _ in self.stats.values())
+
+    def dumps(self) -> str:
+        return json.dumps({
+            **{name: getattr(self, name) for name in self.STORED},
+            "started_at": self.started_at.isoformat(),
+            "stats": [
+                [function, cc, nc, own, total, [[caller, *counts] for caller, counts in callers.items()]]
+                for function, (cc, nc, own, total, callers) in self.stats.items()
+            ],
+            "statements": self.statements,
+        })
+
+    @classmethod
+    def loads(cls, data: str) -> "RequestProfile":
+        """A finished profile back from dumps(), possibly written by another worker"""
+        stored = json.loads(data)
+        profile = cls.__new__(cls)
+        for name in cls.STORED:
+            setattr(profile, name, stored[name])
+        profile.started_at = datetime.fromisoformat(stored["started_at"])
+        profile.stats = {
+            tuple(function): (cc, nc, own, total, {tuple(caller): tuple(counts) for caller, *counts in callers})
+            for function, cc, nc, own, total, callers in stored["stats"]
+        }
+        profile.statements = [tuple(statement) for statement in stored["statements"]]
+        return profile
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "user_id": self.user_id,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "status_code": self.status_code,
+            "duration_ms": self.seconds * 1000,
+            "calls": self.calls,
+            "sql_count": self.sql_count,
+            "sql_ms": self.sql_seconds * 1000,
+        }
+
+    def detail(self, top: int = 30) -> dict:
+        functions = sorted(self.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        return {
+            **self.summary(),
+            "statements": [
+                {"offset_ms": offset * 1000, "duration_ms": seconds * 1000, "statement": statement}
+                for offset, seconds, statement in self.statements
+            ],
+            "functions": [
+                {
+                    "function": name, "file": filename, "line": line, "calls": nc,
+                    "self_ms": own * 1000, "total_ms": total * 1000,
+                }
+                for (filename, line, name), (_, nc, own, total, _) in functions
+            ],
+        }
+
+    def pstats(self) -> bytes:
+        """The profile as a marshalled pstats table, readable by pstats.Stats and snakeviz"""
+        return marshal.dumps(self.stats)
+
+
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+class RequestProfiler:
+    """Profiling switch and ring buffer of finished profiles
+
+    The switch and the last `buffer_size` profiles live in `directory`, so the
+    worker processes of a host share them like DirectoryCacheBackend entries;
+    each worker re-reads the switch every SWITCH_POLL_SECONDS. Writes are
+    atomic renames, so no worker reads a partial file.
+
+    A profiled request runs under cProfile only while its own code runs: its
+    slices of the event loop, through ProfilingMiddleware, and its sync
+    endpoints and dependencies on the threadpool, through profile_routes and
+    the request's context variable. Other requests served meanwhile are not
+    counted. Times are wall time, so waiting on the database shows too.
+    """
+
+    def __init__(self, enabled: bool, sample_rate: float, buffer_size: int, directory: str):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.user_id: Optional[int] = None
+        self.expires_at: Optional[float] = None
+        self.buffer_size = max(1, buffer_size)
+        self.directory = directory
+        self._switch_path = os.path.join(directory, "switch.json")
+        self._profiles_dir = os.path.join(directory, "profiles")
+        _private_directory(directory)
+        os.makedirs(self._profiles_dir, mode=0o700, exist_ok=True)
+        self._switch_version: Optional[Tuple[int, int]] = None
+        self._next_poll = 0.0
+        self._ids = itertools.count(1)
+
+    def switch(self, enabled: bool, sample_rate: float = 0.0, user_id: Optional[int] = None,
+               duration_seconds: Optional[float] = None):
+        """Flip the switch for every worker of the host"""
+        switch = {
+            "enabled": enabled,
+            "sample_rate": sample_rate,
+            "user_id": user_id,
+            "expires_at": time.time() + duration_seconds if enabled and duration_seconds else None,
+        }
+        self._write(self._switch_path, json.dumps(switch))
+        self._apply(switch)
+        self._next_poll = 0.0
+
+    def _apply(self, switch: dict):
+        self.sample_rate = switch["sample_rate"]
+        self.user_id = switch["user_id"]
+        self.expires_at = switch["expires_at"]
+        self.enabled = switch["enabled"]
+
+    def _expire(self):
+        # Each worker turns an expired switch off by itself; writing it back
+        # could overwrite a newer switch this worker hasn't read yet
+        if self.expires_at is not None and time.time() >= self.expires_at:
+            self._apply({"enabled": False, "sample_rate": 0.0, "user_id": None, "expires_at": None})
+
+    def is_on(self) -> bool:
+        """Whether the switch is on, as last read from the shared switch file"""
+        if time.monotonic() >= self._next_poll:
+            self._poll()
+        return self.enabled
+
+    def _poll(self):
+        self._next_poll = time.monotonic() + SWITCH_POLL_SECONDS
+        try:
+            # Every switch is a new file renamed into place
+            info = os.stat(self._switch_path)
+            version = (info.st_ino, info.st_mtime_ns)
+            if version != self._switch_version:
+                with open(self._switch_path) as switch:
+                    self._apply(json.load(switch))
+                self._switch_version = version
+        except (OSError, ValueError, KeyError):
+            # Never switched at runtime: the settings stand
+            pass
+
+    def status(self) -> dict:
+        self._poll()
+        self._expire()
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "user_id": self.user_id,
+            "expires_at": datetime.fromtimestamp(self.expires_at, timezone.utc) if self.expires_at else None,
+            "buffer_size": self.buffer_size,
+            "profiles": len(self._stored()),
+            "pid": os.getpid(),
+        }
+
+    async def choose(self, scope) -> Optional[Tuple[Optional[int], str]]:
+        """(user id, trigger) when the request should be profiled, otherwise None"""
+        self._expire()
+        if not self.enabled:
+            return None
+        path = scope["path"]
+        if path in LONG_LIVED_PATHS or path.startswith(UNPROFILED_PREFIXES):
+            return None
+        if _flagged(scope):
+            # Only admins may ask for a profile; anyone else's flag is ignored
+            user = await _request_user(scope)
+            if user is not None and user.role == "admin":
+                return user.id, "flag"
+            return None
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        user = await _request_user(scope)
+        user_id = user.id if user is not None else None
+        if self.user_id is not None and user_id != self.user_id:
+            return None
+        return user_id, "sample"
+
+    def start(self, scope, user_id: Optional[int], trigger: str) -> RequestProfile:
+        return RequestProfile(f"{os.getpid()}-{next(self._ids)}", scope, user_id, trigger)
+
+    def finish(self, profile: RequestProfile):
+        profile.seconds = time.perf_counter() - profile._started
+        profile.collect()
+
+    def keep(self, profile: RequestProfile):
+        """Store a finished profile for every worker, dropping the oldest past buffer_size"""
+        name = f"{time.time_ns():020d}-{profile.id}.json"
+        self._write(os.path.join(self._profiles_dir, name), profile.dumps())
+        for old in self._stored()[:-self.buffer_size]:
+            try:
+                os.remove(os.path.join(self._profiles_dir, old))
+            except FileNotFoundError:
+                # Another worker pruned it first
+                pass
+
+    def _stored(self) -> List[str]:
+        """Stored profile file names, oldest first"""
+        return sorted(name for name in os.listdir(self._profiles_dir) if name.endswith(".json"))
+
+    def _load(self, name: str) -> Optional[RequestProfile]:
+        try:
+            with open(os.path.join(self._profiles_dir, name)) as stored:
+                return RequestProfile.loads(stored.read())
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: str, data: str):
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+        with os.fdopen(fd, "w") as written:
+            written.write(data)
+        os.replace(temp_path, path)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        for name in reversed(self._stored()):
+            if name.endswith(f"-{profile_id}.json"):
+                return self._load(name)
+        return None
+
+    def recent(self) -> List[RequestProfile]:
+        """Finished profiles of every worker, newest first"""
+        profiles = (self._load(name) for name in reversed(self._stored()))
+        return [profile for profile in profiles if profile is not None]
+
+    def clear(self):
+        for name in self._stored():
+            try:
+                os.remove(os.path.join(self._profiles_dir, name))
+            except FileNotFoundError:
+                pass
+
+
+def _enable(profile: cProfile.Profile) -> bool:
+    try:
+        profile.enable()
+        return True
+    except ValueError:
+        # From Python 3.12 only one cProfile runs at a time in a process; another
+        # request's code is being profiled in another thread
+        return False
+
+
+def _private_directory(directory: str):
+    """Create the directory readable by this user only, refusing one another user made first"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    # Profiles hold SQL and the switch decides what gets profiled; in a shared
+    # temp directory another user could have planted either
+    if not stat.S_ISDIR(info.st_mode) or (hasattr(os, "getuid") and info.st_uid != os.getuid()):
+        raise RuntimeError(f"Profile directory {directory} is not a directory owned by this user; set PROFILE_DIR")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(directory, 0o700)
+
+
+def _default_directory() -> str:
+    if settings.profile_dir:
+        return settings.profile_dir
+    # One directory per database, shared by the worker processes on this host
+    database_id = zlib.crc32(settings.database_url.encode())
+    return os.path.join(tempfile.gettempdir(), f"task-profiles-{database_id:08x}")
+
+
+profiler = RequestProfiler(
+    settings.profiling_enabled,
+    sample_rate=settings.profile_sample_rate,
+    buffer_size=settings.profile_buffer_size,
+    directory=_default_directory(),
+)
+
+
+def get_profile_or_404(profile_id: str) -> RequestProfile:
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return profile
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+async def _request_user(scope) -> Optional[UserSnapshot]:
+    """The user behind the bearer token, verified as get_current_user would; None if it is invalid"""
+    authorization = _header(scope, b"authorization")
+    if not authorization or not authorization.startswith(b"Bearer "):
+        return None
+    token = authorization[7:].decode("latin-1")
+    snapshot = user_cache.get(token)
+    if snapshot is not None:
+        return snapshot
+    return await run_in_threadpool(_verify_token, token)
+
+
+def _verify_token(token: str) -> Optional[UserSnapshot]:
+    with SessionLocal() as db:
+        try:
+            return user_from_token(token, db)
+        except HTTPException:
+            return None
+
+
+def _flagged(scope) -> bool:
+    """X-Profile: 1 or ?profile=1"""
+    if _header(scope, b"x-profile") in (b"1", b"true"):
+        return True
+    query = scope["query_string"]
+    return b"profile=" in query and any(
+        key == "profile" and value in ("1", "true") for key, value in parse_qsl(query.decode("latin-1"))
+    )
+
+
+# As in metrics, the start time lives on the statement's execution context
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _profile.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile.get()
+    started = getattr(context, "_profile_started", None)
+    if profile is None or started is None:
+        return
+    seconds = time.perf_counter() - started
+    profile.sql_count += 1
+    profile.sql_seconds += seconds
+    if len(profile.statements) < PROFILE_MAX_STATEMENTS:
+        profile.statements.append((started - profile._started, seconds, statement))
+
+
+def profile_engine(engine: Engine):
+    """Time the statements of profiled requests (pass async_engine.sync_engine for async)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _profiled_call(call: Callable) -> Callable:
+    @functools.wraps(call)
+    def profiled(*args, **kwargs):
+        profile = _profile.get()
+        if profile is None:
+            return call(*args, **kwargs)
+        return profile.run_profiled(call, *args, **kwargs)
+    profiled._profiled = True
+    return profiled
+
+
+def _profile_dependant(dependant: Dependant, wrapped: Dict[Callable, Callable]):
+    call = dependant.call
+    # Only plain functions FastAPI sends to the threadpool; coroutines run in the
+    # request's slices of the event loop, which ProfilingMiddleware profiles
+    if (inspect.isfunction(call) and not getattr(call, "_profiled", False)
+            and not inspect.iscoroutinefunction(call) and not inspect.isgeneratorfunction(call)
+            and not inspect.isasyncgenfunction(call)):
+        if call not in wrapped:
+            wrapped[call] = _profiled_call(call)
+        dependant.call = wrapped[call]
+    for sub_dependant in dependant.dependencies:
+        _profile_dependant(sub_dependant, wrapped)
+
+
+def profile_routes(app: FastAPI):
+    """Profile the sync endpoints and dependencies of profiled requests; call once the routers are included"""
+    wrapped: Dict[Callable, Callable] = {}
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            _profile_dependant(route.dependant, wrapped)
+
+
+class _ProfiledCoroutine:
+    """Awaits a coroutine with a cProfile enabled around each of its steps on the event loop"""
+
+    def __init__(self, coroutine, profile: cProfile.Profile):
+        self.coroutine = coroutine
+        self.profile = profile
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            enabled = _enable(self.profile)
+            try:
+                if error is None:
+                    yielded = self.coroutine.send(value)
+                else:
+                    yielded = self.coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                if enabled:
+                    self.profile.disable()
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                self.coroutine.close()
+                raise
+            except BaseException as thrown:
+                # Cancellation and anything else thrown into the task go on to the request
+                value, error = None, thrown
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests the switch picks; one clock read while it is off
+
+    Child tasks the request starts, such as a streaming response body, only
+    have their SQL timed.
+    """
+
+    def __init__(self, app: Callable, request_profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.profiler = request_profiler or profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.is_on() or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        chosen = await self.profiler.choose(scope)
+        if chosen is None:
+            return await self.app(scope, receive, send)
+
+        profile = self.profiler.start(scope, *chosen)
+        token = _profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", ()), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        try:
+            await _ProfiledCoroutine(self.app(scope, receive, send_wrapper), profile._loop_profile)
+        finally:
+            _profile.reset(token)
+            self.profiler.finish(profile)
+            await run_in_threadpool(self.profiler.keep, profile)
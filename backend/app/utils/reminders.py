@@ -0,0 +1,345 @@
+import asyncio
+import functools
+import heapq
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Deque, Iterable, List, Optional, Sequence, Set, Tuple, Union
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from ..config import settings
+from ..database import shard_ids, shard_session
+from ..models.task import Task, TaskStatus
+from .task_events import task_feed
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Heap entries are plain ints, (due epoch seconds << 32) | task id, which keeps a
+# million scheduled tasks at roughly 44 bytes each (int object + list slot)
+# instead of the ~150 a (datetime, id) tuple would take.
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+# Rows fetched per round trip when loading or sweeping, and entries fired per batch
+LOAD_CHUNK_ROWS = 10000
+FIRE_BATCH_SIZE = 500
+
+
+def _epoch_seconds(value: datetime) -> int:
+    # Naive datetimes (SQLite) are taken as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _utc(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+@dataclass(frozen=True)
+class ReminderEvent:
+    """A task that has just reached its due date"""
+    task_id: int
+    user_id: int
+    title: str
+    due_date: datetime
+
+
+class ReminderScheduler:
+    """Min-heap of upcoming task due dates that fires reminder events
+
+    The heap is loaded once from the due_date index and then kept current by
+    task writes in this process (see schedule_reminders) plus a periodic range
+    scan around the current time for writes made by other processes. Entries
+    are never updated or removed in place: when one comes due it is checked
+    against the tasks table, so moved, completed and deleted tasks are dropped
+    then.
+
+    `session_factory` may be a list, one per shard, when task data is sharded.
+    `clock` returns Unix seconds and can be replaced in tests, which drive the
+    scheduler by calling load(), schedule() and fire_due() directly.
+    """
+
+    def __init__(
+        self,
+        session_factory: Union[Callable[[], Session], Sequence[Callable[[], Session]]],
+        clock: Callable[[], float] = time.time,
+        sweep_seconds: float = 60.0,
+        lock_path: Optional[str] = None,
+    ):
+        self.session_factories = list(session_factory) if isinstance(session_factory, (list, tuple)) else [session_factory]
+        self.clock = clock
+        self.sweep_seconds = sweep_seconds
+        self.lock_path = lock_path
+        self.active = False
+        self.fired = 0
+        self._loading = False
+        self._heap: List[int] = []
+        # Fired entries a sweep could push again, in firing order for pruning
+        self._fired_keys: Set[int] = set()
+        self._fired_order: Deque[int] = deque()
+        self._subscribers: List[Callable[[ReminderEvent], None]] = []
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: Callable[[ReminderEvent], None]):
+        """Call `callback` with every fired ReminderEvent (from a worker thread)"""
+        self._subscribers.append(callback)
+
+    # Heap maintenance
+
+    def schedule(self, items: Iterable[Tuple[int, Optional[datetime]]], since: Optional[float] = None):
+        """Add (task_id, due_date) pairs; missing due dates and those before `since` (default now) are ignored"""
+        if not (self.active or self._loading):
+            return
+        since = self.clock() if since is None else since
+        earliest = None
+        with self._lock:
+            for task_id, due_date in items:
+                if due_date is None:
+                    continue
+                due = _epoch_seconds(due_date)
+                if due < since:
+                    continue
+                key = (due << _ID_BITS) | (task_id & _ID_MASK)
+                if key in self._fired_keys:
+                    continue
+                heapq.heappush(self._heap, key)
+                earliest = key if earliest is None else min(earliest, key)
+            wake = earliest is not None and self._heap[0] == earliest
+        if wake:
+            self._wake()
+
+    def load(self):
+        """Fill the heap with every unfinished task due from now on"""
+        now = self.clock()
+        keys = []
+        # Writes committed while the table is read are pushed onto the old heap
+        # and merged below
+        self._loading = True
+        for session_factory in self.session_factories:
+            with session_factory() as db:
+                result = db.execute(
+                    select(Task.id, Task.due_date)
+                    .where(Task.due_date >= _utc(now), Task.status != TaskStatus.done)
+                    .execution_options(stream_results=True)
+                )
+                for rows in result.partitions(LOAD_CHUNK_ROWS):
+                    keys.extend((_epoch_seconds(due) << _ID_BITS) | (task_id & _ID_MASK) for task_id, due in rows)
+        with self._lock:
+            keys.extend(self._heap)
+            heapq.heapify(keys)
+            self._heap = keys
+            self.active = True
+            self._loading = False
+        logger.info("Reminder scheduler loaded %d upcoming due dates", len(keys))
+
+    def sweep(self):
+        """Pick up due dates written by other processes, from one sweep ago to two ahead
+
+        Every sweep scans its whole window, since a write elsewhere may land in
+        a range already swept. Looking back fires, late, due dates written less
+        than a sweep before they came due. Entries already in the heap or
+        fired since the window began are not fired twice.
+        """
+        now = self.clock()
+        window_start = now - self.sweep_seconds
+        window_end = now + 2 * self.sweep_seconds
+        rows = []
+        for session_factory in self.session_factories:
+            with session_factory() as db:
+                rows += db.execute(
+                    select(Task.id, Task.due_date).where(
+                        Task.due_date >= _utc(window_start),
+                        Task.due_date < _utc(window_end),
+                        Task.status != TaskStatus.done,
+                    )
+                ).all()
+        self.schedule(rows, since=window_start)
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            return float(self._heap[0] >> _ID_BITS) if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    # Firing
+
+    def _pop_due(self, now: float) -> List[int]:
+        keys = []
+        with self._lock:
+            # Entries due before the next sweep's window can't be pushed again
+            while self._fired_order and (self._fired_order[0] >> _ID_BITS) < now - self.sweep_seconds:
+                self._fired_keys.discard(self._fired_order.popleft())
+            while self._heap and (self._heap[0] >> _ID_BITS) <= now and len(keys) < FIRE_BATCH_SIZE:
+                key = heapq.heappop(self._heap)
+                if key not in self._fired_keys:
+                    keys.append(key)
+                    self._fired_keys.add(key)
+                    self._fired_order.append(key)
+        return keys
+
+    def fire_due(self) -> List[ReminderEvent]:
+        """Fire every entry due by now whose task still has that due date"""
+        events = []
+        while True:
+            keys = self._pop_due(self.clock())
+            if not keys:
+                self.fired += len(events)
+                return events
+            expected = {key & _ID_MASK: key >> _ID_BITS for key in keys}
+            rows = []
+            for session_factory in self.session_factories:
+                with session_factory() as db:
+                    rows += db.execute(
+                        select(Task.id, Task.user_id, Task.title, Task.due_date, Task.status)
+                        .where(Task.id.in_(list(expected)))
+                    ).all()
+            for row in rows:
+                if row.status == TaskStatus.done or row.due_date is None:
+                    continue
+                if _epoch_seconds(row.due_date) != expected[row.id]:
+                    continue
+                reminder = ReminderEvent(row.id, row.user_id, row.title, row.due_date)
+                events.append(reminder)
+                for callback in self._subscribers:
+                    try:
+                        callback(reminder)
+                    except Exception:
+                        logger.exception("Reminder subscriber failed")
+
+    # Background loop
+
+    def _try_lead(self) -> bool:
+        """Take the per-host lock so only one worker process fires reminders"""
+        if fcntl is None or not self.lock_path:
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _wake(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, seconds))
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def run(self):
+        next_sweep = 0.0
+        while True:
+            try:
+                if not self.active:
+                    if not self._try_lead():
+                        # Another worker is firing reminders; take over if it exits
+                        await self._sleep(self.sweep_seconds)
+                        continue
+                    await run_in_threadpool(self.load)
+                    next_sweep = self.clock() + self.sweep_seconds
+                if self.clock() >= next_sweep:
+                    await run_in_threadpool(self.sweep)
+                    next_sweep = self.clock() + self.sweep_seconds
+                await run_in_threadpool(self.fire_due)
+                wake_at = min(next_sweep, self.next_due() or math.inf)
+                await self._sleep(wake_at - self.clock())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reminder scheduler iteration failed")
+                await asyncio.sleep(self.sweep_seconds)
+
+    def start(self):
+        """Start the background loop on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.active = False
+
+    def stats(self) -> dict:
+        return {"active": self.active, "scheduled": len(self._heap), "fired": self.fired}
+
+
+def _default_lock_path() -> str:
+    # One lock per database, shared by the worker processes on this host
+    database_id = zlib.crc32(settings.database_url.encode())
+    return os.path.join(tempfile.gettempdir(), f"task-reminders-{database_id:08x}.lock")
+
+
+def _log_reminder(reminder: ReminderEvent):
+    logger.info("Task %s of user %s is due (%s)", reminder.task_id, reminder.user_id, reminder.due_date)
+
+
+def _publish_reminder(reminder: ReminderEvent):
+    if settings.task_events_enabled:
+        task_feed.publish(reminder.user_id, [{"type": "due", "task_id": reminder.task_id}])
+
+
+def _create_scheduler() -> ReminderScheduler:
+    # Task ids are unique across shards, so one heap covers them all
+    scheduler = ReminderScheduler(
+        [functools.partial(shard_session, shard) for shard in shard_ids()],
+        sweep_seconds=settings.reminder_sweep_seconds,
+        lock_path=_default_lock_path(),
+    )
+    scheduler.subscribe(_log_reminder)
+    scheduler.subscribe(_publish_reminder)
+    return scheduler
+
+
+reminder_scheduler = _create_scheduler()
+
+
+def schedule_reminders(db: Session, due_dates: Iterable[Tuple[int, Optional[datetime]]]):
+    """Queue (task_id, due_date) pairs for the scheduler once the transaction commits"""
+    due_dates = [item for item in due_dates if item[1] is not None]
+    if due_dates:
+        db.info.setdefault("reminder_due_dates", []).extend(due_dates)
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_committed(session):
+    due_dates = session.info.pop("reminder_due_dates", None)
+    if due_dates:
+        reminder_scheduler.schedule(due_dates)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("reminder_due_dates", None)
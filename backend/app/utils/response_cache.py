@@ -0,0 +1,252 @@
+import abc
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..schemas.task import Task as TaskSchema
+from .fast_json import FastJSONResponse
+from ..models.task import TaskStatus, TaskPriority
+from .task_queries import parse_enum_list, task_rows_to_dicts
+
+# Largest share of the byte budget one response may take, so a few huge pages
+# can't flush the rest of the cache
+MAX_ENTRY_FRACTION = 16
+
+# The directory backend keeps at most this many responses per user; past it the
+# user's entries are dropped and refilled
+DIRECTORY_MAX_ENTRIES_PER_USER = 256
+
+
+class CacheBackend(abc.ABC):
+    """Stores response bodies by key, grouped by user so a write can drop them all"""
+
+    evictions = 0
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """The cached body, or None"""
+
+    @abc.abstractmethod
+    def set(self, user_id: int, key: str, value: bytes):
+        """Cache a body under the user's entries"""
+
+    @abc.abstractmethod
+    def invalidate_user(self, user_id: int):
+        """Drop every entry of the user"""
+
+    def stats(self) -> dict:
+        """Size gauges, where the backend can report them cheaply"""
+        return {"entries": 0, "bytes": 0}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-worker LRU bounded by the total size of the cached bodies"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self._user_keys: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, user_id: int, key: str, value: bytes):
+        if len(value) > self.max_bytes // MAX_ENTRY_FRACTION:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (user_id, value)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id, value = entry
+        self._bytes -= len(value)
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class DirectoryCacheBackend(CacheBackend):
+    """Shares entries between the worker processes of one host, one file per response
+
+    Stands in for a shared cache (memcached, Redis) behind the same interface.
+    Writes are atomic renames, so readers never see a partial body.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.evictions = 0
+
+    def _user_dir(self, user_id: int) -> str:
+        return os.path.join(self.directory, str(user_id))
+
+    def _path(self, key: str) -> str:
+        user_id, _ = key.split(":", 1)
+        return os.path.join(self._user_dir(int(user_id)), hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as cached:
+                return cached.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, user_id: int, key: str, value: bytes):
+        user_dir = self._user_dir(user_id)
+        try:
+            os.makedirs(user_dir, exist_ok=True)
+            if len(os.listdir(user_dir)) >= DIRECTORY_MAX_ENTRIES_PER_USER:
+                self.invalidate_user(user_id)
+                self.evictions += 1
+                os.makedirs(user_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=user_dir, prefix=".")
+            with os.fdopen(fd, "wb") as cached:
+                cached.write(value)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            # Another worker dropped the user's entries meanwhile; the next read refills
+            pass
+
+    def invalidate_user(self, user_id: int):
+        shutil.rmtree(self._user_dir(user_id), ignore_errors=True)
+
+
+class ResponseCache:
+    """Cached task list responses, keyed by user, task list version and normalized query
+
+    The version is the user's user_task_versions counter, read by the list route
+    for its ETag and bumped in the same transaction as every task write, so an
+    entry can only be served while the list it was built from is current, in
+    any worker. Write handlers also drop the user's entries once they commit,
+    which returns the space straight away.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(user_id: int, version: int, route: str, params: dict) -> str:
+        return f"{user_id}:{version}:{route}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    def lookup(self, key: str, headers) -> Optional[Response]:
+        """The cached response for `key` with `headers` added, or None on a miss"""
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        next_cursor, body = value.split(b"\n", 1)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor.decode()
+        return Response(body, media_type="application/json", headers=dict(headers))
+
+    def store(self, user_id: int, key: str, body: bytes, headers) -> Response:
+        """Cache a rendered body with its X-Next-Cursor header and return the response"""
+        next_cursor = headers.get("X-Next-Cursor", "")
+        self.backend.set(user_id, key, next_cursor.encode() + b"\n" + body)
+        return Response(body, media_type="application/json", headers=dict(headers))
+
+    def invalidate_user(self, user_id: int):
+        self.invalidations += 1
+        self.backend.invalidate_user(user_id)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+            **self.backend.stats(),
+        }
+
+
+def task_list_cache_key(user_id: int, version: int, status: Optional[str], priority: Optional[str],
+                        due_after: Optional[datetime], due_before: Optional[datetime], skip: int, limit: int,
+                        sort: str, cursor: Optional[str], include_archived: bool) -> str:
+    """Cache key of a GET /api/tasks request; filters are normalized so equivalent queries share it"""
+    return ResponseCache.key(user_id, version, "list", {
+        "status": sorted(value.value for value in parse_enum_list(status, TaskStatus, "status")),
+        "priority": sorted(value.value for value in parse_enum_list(priority, TaskPriority, "priority")),
+        "due_after": due_after.isoformat() if due_after else None,
+        "due_before": due_before.isoformat() if due_before else None,
+        # skip is ignored once a cursor is given
+        "skip": 0 if cursor else skip,
+        "limit": limit,
+        "sort": sort,
+        "cursor": cursor,
+        "include_archived": include_archived,
+    })
+
+
+def render_task_list(tasks) -> bytes:
+    """JSON body of a task list exactly as the list route would return it"""
+    if settings.fast_serialization_enabled:
+        return FastJSONResponse(task_rows_to_dicts(tasks)).body
+    return JSONResponse(jsonable_encoder([TaskSchema.from_orm(task) for task in tasks])).body
+
+
+def _create_backend() -> CacheBackend:
+    if settings.response_cache_backend == "directory":
+        # One directory per database, shared by the worker processes on this host
+        database_id = zlib.crc32(settings.database_url.encode())
+        return DirectoryCacheBackend(os.path.join(tempfile.gettempdir(), f"task-responses-{database_id:08x}"))
+    return MemoryCacheBackend(settings.response_cache_max_bytes)
+
+
+response_cache = ResponseCache(_create_backend())
+
+
+def invalidate_cached_responses(db: Session, user_id: int):
+    """Drop the user's cached responses once the current transaction commits"""
+    db.info.setdefault("response_cache_users", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for user_id in session.info.pop("response_cache_users", ()):
+        response_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("response_cache_users", None)
@@ -0,0 +1,147 @@
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+from typing import List, Optional
+from sqlalchemy import delete, insert, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from ..database import DIRECTORY_TABLES, Base, create_tables, engine, shard_engines
+from ..models import SchemaVersion
+from .task_search import create_search_index
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when DDL that isn't declared on the models changes, e.g. the search
+# index triggers, so existing databases pick it up
+SCHEMA_REVISION = 1
+
+# Key of the Postgres advisory lock held while the schema is brought up to date
+SCHEMA_LOCK_KEY = 0x7461736B
+
+_schema_current = False
+
+
+def _schema_targets() -> list:
+    """(engine, tables) for every database, tables None meaning all of them
+
+    With sharding, DATABASE_URL holds the directory tables (and everything,
+    if it is also a shard) and each other shard the task tables.
+    """
+    if not shard_engines:
+        return [(engine, None)]
+    shard_tables = [table for table in Base.metadata.sorted_tables if table.name not in DIRECTORY_TABLES]
+    directory_tables = [
+        table for table in Base.metadata.sorted_tables
+        if table.name in DIRECTORY_TABLES or table.name == SchemaVersion.__tablename__
+    ]
+    targets = [(engine, None if engine in shard_engines else directory_tables)]
+    return targets + [(shard_engine, shard_tables) for shard_engine in shard_engines if shard_engine is not engine]
+
+
+def schema_fingerprint(tables: Optional[List] = None) -> str:
+    """Hash of the declared tables, columns and indexes plus SCHEMA_REVISION"""
+    parts = [f"revision {SCHEMA_REVISION}"]
+    for table in tables or Base.metadata.sorted_tables:
+        parts.append(f"table {table.name}")
+        parts += sorted(f"column {column.name} {type(column.type).__name__} {column.nullable}" for column in table.columns)
+        parts += sorted(f"index {index.name} {[column.name for column in index.columns]}" for index in table.indexes)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def stored_fingerprint(target: Engine = engine):
+    """Fingerprint recorded in the database, None before the first schema setup"""
+    try:
+        with target.connect() as connection:
+            return connection.execute(select(SchemaVersion.fingerprint)).scalar()
+    except DBAPIError:
+        # No schema_version table yet
+        return None
+
+
+@contextlib.contextmanager
+def _schema_lock(target: Engine):
+    """Serialize schema setup between the workers starting at once"""
+    if target.dialect.name == "postgresql":
+        with target.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        return
+    if fcntl is None:
+        yield
+        return
+    # One lock per database, shared by the worker processes on this host
+    database_id = zlib.crc32(target.url.render_as_string(hide_password=False).encode())
+    with open(os.path.join(tempfile.gettempdir(), f"task-schema-{database_id:08x}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _create_tables(target: Engine, tables: Optional[List]):
+    if tables is None:
+        create_tables()
+    elif target is engine:
+        Base.metadata.create_all(bind=target, tables=tables)
+    else:
+        # A shard has no users table, so its tables are created without foreign keys to it
+        with target.begin() as connection:
+            existing = set(inspect(connection).get_table_names())
+            for table in tables:
+                if table.name not in existing:
+                    connection.execute(CreateTable(table, include_foreign_key_constraints=[]))
+    with target.begin() as connection:
+        for table in tables or ():
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+    if tables is None or any(table.name == "tasks" for table in tables):
+        create_search_index(target)
+
+
+def ensure_schema() -> bool:
+    """Create missing tables, indexes and the search index unless the schema is current
+
+    Normally a single SELECT of the stored fingerprint per database (one per
+    shard when task data is sharded). The result is kept for
+    the life of the process, so gunicorn workers forked from a preloaded master
+    that already checked skip even that. Returns True when DDL ran. Like
+    create_tables() this only adds what is missing; it does not alter columns.
+    """
+    global _schema_current
+    if _schema_current:
+        return False
+
+    updated = False
+    for target, tables in _schema_targets():
+        fingerprint = schema_fingerprint(tables)
+        if stored_fingerprint(target) == fingerprint:
+            continue
+        with _schema_lock(target):
+            # Another worker may have finished while this one waited for the lock
+            if stored_fingerprint(target) != fingerprint:
+                _create_tables(target, tables)
+                with target.begin() as connection:
+                    connection.execute(delete(SchemaVersion))
+                    connection.execute(insert(SchemaVersion).values(id=1, fingerprint=fingerprint))
+                logger.info("Database schema of %s brought up to %s", target.url.database, fingerprint[:12])
+                updated = True
+    _schema_current = True
+    return updated
+
+
+if __name__ == "__main__":
+    # Apply the schema ahead of a deploy: python -m app.utils.schema
+    print("Schema updated" if ensure_schema() else "Schema already current")
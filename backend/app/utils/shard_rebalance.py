@@ -0,0 +1,127 @@
+import logging
+import sys
+import time
+from typing import Dict, Optional
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import shard_engines, shard_session
+from ..models import ArchivedTask, Task, TaskSyncLog, User, UserShard, UserTaskCounter, UserTaskVersion
+
+logger = logging.getLogger(__name__)
+
+# Every table holding a user's task data, copied in this order when a user moves
+USER_SHARD_TABLES = [
+    Task.__table__,
+    ArchivedTask.__table__,
+    TaskSyncLog.__table__,
+    UserTaskVersion.__table__,
+    UserTaskCounter.__table__,
+]
+
+# Rows read and inserted per statement when a user moves
+MOVE_CHUNK_ROWS = 5000
+
+
+def _user_version(db: Session, user_id: int) -> int:
+    return db.execute(
+        select(UserTaskVersion.version).where(UserTaskVersion.user_id == user_id)
+    ).scalar() or 0
+
+
+def _copy_user_rows(source: Session, target: Session, user_id: int) -> int:
+    """Replace the user's rows on the target shard with those on the source; returns the version copied"""
+    version = _user_version(source, user_id)
+    for table in USER_SHARD_TABLES:
+        # Leftovers of an earlier move of the same user
+        target.execute(delete(table).where(table.c.user_id == user_id))
+    for table in USER_SHARD_TABLES:
+        result = source.execute(
+            select(table).where(table.c.user_id == user_id).execution_options(stream_results=True)
+        )
+        for rows in result.partitions(MOVE_CHUNK_ROWS):
+            target.execute(insert(table), [dict(row._mapping) for row in rows])
+    target.commit()
+    source.commit()
+    return version
+
+
+def move_user(user_id: int, target_shard: int, wait_seconds: Optional[float] = None) -> bool:
+    """Move a user's task data to another shard; False when it is already there
+
+    1. Mark the user as moving and wait for every worker's shard map to expire,
+       after which their task writes are refused with 503.
+    2. Copy the user's rows to the target shard, again if the source's version
+       changed meanwhile (a write that was already in flight).
+    3. Point the user at the target and wait again, while workers that still
+       read from the source find the rows there, then delete the source rows.
+    """
+    if not 0 <= target_shard < len(shard_engines):
+        raise ValueError(f"Shard {target_shard} is not configured, SHARD_DATABASE_URLS has {len(shard_engines)}")
+    if wait_seconds is None:
+        wait_seconds = settings.shard_map_ttl_seconds + 1
+
+    with shard_session() as directory:
+        if directory.get(User, user_id) is None:
+            raise ValueError(f"User {user_id} does not exist")
+        placement = directory.get(UserShard, user_id)
+        source_shard = placement.shard_id if placement else 0
+        if source_shard == target_shard:
+            return False
+        if placement is None:
+            directory.add(UserShard(user_id=user_id, shard_id=source_shard, moving_to=target_shard))
+        else:
+            placement.moving_to = target_shard
+        directory.commit()
+    time.sleep(wait_seconds)
+
+    with shard_session(source_shard) as source, shard_session(target_shard) as target:
+        version = _copy_user_rows(source, target, user_id)
+        while _user_version(source, user_id) != version:
+            source.commit()
+            version = _copy_user_rows(source, target, user_id)
+
+    with shard_session() as directory:
+        directory.execute(
+            update(UserShard).where(UserShard.user_id == user_id).values(shard_id=target_shard, moving_to=None)
+        )
+        directory.commit()
+    time.sleep(wait_seconds)
+
+    with shard_session(source_shard) as source:
+        for table in USER_SHARD_TABLES:
+            source.execute(delete(table).where(table.c.user_id == user_id))
+        source.commit()
+    logger.info("Moved user %s from shard %s to shard %s", user_id, source_shard, target_shard)
+    return True
+
+
+def shard_user_counts() -> Dict[int, int]:
+    """Users placed on each shard"""
+    counts = dict.fromkeys(range(len(shard_engines)), 0)
+    with shard_session() as directory:
+        placed = dict(directory.execute(
+            select(UserShard.shard_id, func.count(UserShard.user_id)).group_by(UserShard.shard_id)
+        ).all())
+        unplaced = directory.execute(
+            select(func.count(User.id)).outerjoin(UserShard, UserShard.user_id == User.id)
+            .where(UserShard.user_id.is_(None))
+        ).scalar()
+    counts.update(placed)
+    counts[0] = counts.get(0, 0) + unplaced
+    return counts
+
+
+if __name__ == "__main__":
+    # python -m app.utils.shard_rebalance               users per shard
+    # python -m app.utils.shard_rebalance USER SHARD    move a user's tasks to another shard
+    from .schema import ensure_schema
+
+    if not shard_engines:
+        sys.exit("Task data is not sharded, set SHARD_DATABASE_URLS")
+    ensure_schema()
+    if len(sys.argv) == 3:
+        user, shard = int(sys.argv[1]), int(sys.argv[2])
+        print(f"Moved user {user} to shard {shard}" if move_user(user, shard) else f"User {user} is already on shard {shard}")
+    for shard, users in shard_user_counts().items():
+        print(f"shard {shard}: {users} users  {settings.shard_database_urls[shard]}")
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import engine, shard_engines
+from ..models import ArchivedTask, Task, TaskIdSequence, TaskSyncLog, User, UserShard
+
+
+class ShardMap:
+    """Per-worker cache of user id -> (shard, moving_to), read from user_shards
+
+    Entries live for `ttl` seconds, so a move is seen by every worker that long
+    after it is recorded.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[int, Optional[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, db: Session, user_id: int) -> Tuple[int, Optional[int]]:
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[2] > now:
+            return entry[0], entry[1]
+        row = db.execute(
+            select(UserShard.shard_id, UserShard.moving_to).where(UserShard.user_id == user_id)
+        ).first()
+        shard, moving_to = (row.shard_id, row.moving_to) if row else (0, None)
+        with self._lock:
+            self._entries[user_id] = (shard, moving_to, now + self.ttl)
+        return shard, moving_to
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+shard_map = ShardMap(settings.shard_map_ttl_seconds)
+
+
+def bind_user_shard(db: Session, user_id: int):
+    """Route the session's task queries to the user's shard (no-op when not sharded)"""
+    if not shard_engines:
+        return
+    shard, moving_to = shard_map.lookup(db, user_id)
+    db.info["shard"] = shard
+    db.info["shard_moving"] = moving_to is not None
+
+
+def check_shard_writable(db: Session):
+    """Refuse task writes while the user's data is being moved to another shard"""
+    if db.info.get("shard_moving"):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Tasks are being moved, retry shortly",
+            headers={"Retry-After": str(max(1, round(settings.shard_map_ttl_seconds)))}
+        )
+
+
+def assign_user_shard(db: Session, user_id: int):
+    """Place a new user on a shard, round robin by id, within the caller's transaction"""
+    if shard_engines:
+        db.add(UserShard(user_id=user_id, shard_id=user_id % len(shard_engines)))
+
+
+def users_on_shard(db: Session):
+    """select() of the ids of users whose task data is on the session's shard"""
+    query = select(User.id)
+    shard = db.info.get("shard")
+    if shard is None:
+        return query
+    return query.outerjoin(UserShard, UserShard.user_id == User.id).where(
+        func.coalesce(UserShard.shard_id, 0) == shard
+    )
+
+
+class TaskIdAllocator:
+    """Hands out task ids unique across shards, reserving blocks from task_id_sequence
+
+    A block costs one short transaction on DATABASE_URL, outside the caller's
+    own, so writers on different shards don't queue behind each other for ids.
+    Unused ids of a block are skipped when the process exits.
+    """
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._next = self._end = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, count: int = 1) -> int:
+        """First of `count` consecutive ids"""
+        with self._lock:
+            if self._end - self._next < count:
+                self._next = self._reserve_block(max(count, self.block_size))
+                self._end = self._next + max(count, self.block_size)
+            first = self._next
+            self._next += count
+            return first
+
+    def reset(self):
+        with self._lock:
+            self._next = self._end = 0
+
+    def _reserve_block(self, size: int) -> int:
+        while True:
+            with engine.begin() as connection:
+                updated = connection.execute(
+                    update(TaskIdSequence).where(TaskIdSequence.id == 1)
+                    .values(next_id=TaskIdSequence.next_id + size)
+                ).rowcount
+                if updated:
+                    return connection.execute(select(TaskIdSequence.next_id)).scalar() - size
+            self._create_sequence()
+
+    def _create_sequence(self):
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(TaskIdSequence).values(id=1, next_id=_highest_task_id(connection) + 1))
+        except IntegrityError:
+            # Another process created it first
+            pass
+
+
+def _database(bind) -> URL:
+    """The database an engine or connection is on, whichever driver it uses"""
+    url = bind.engine.url
+    return url.set(drivername=url.get_backend_name())
+
+
+def _highest_task_id(connection) -> int:
+    """Highest task id ever handed out, live, archived or deleted, on any shard
+
+    The sequence starts above it, e.g. for ids from before sharding was
+    enabled or from before SQLite ids were reserved at all.
+    """
+    here = _database(connection)
+    shards = {_database(shard_engine): shard_engine for shard_engine in shard_engines}
+    # DATABASE_URL holds no task data when it is not itself a shard
+    highest = _highest_task_id_on(connection) if not shards or here in shards else 0
+    for url, shard_engine in shards.items():
+        if url != here:
+            with shard_engine.connect() as shard_connection:
+                highest = max(highest, _highest_task_id_on(shard_connection))
+    return highest
+
+
+def _highest_task_id_on(connection) -> int:
+    return max(
+        connection.execute(select(func.max(column))).scalar() or 0
+        for column in (Task.id, ArchivedTask.id, TaskSyncLog.task_id)
+    )
+
+
+task_ids = TaskIdAllocator(settings.shard_id_block_size)
+
+
+def _reserve_in_transaction(connection, count: int) -> int:
+    # The caller's transaction may already hold SQLite's write lock, which a
+    # separate transaction on the same file would wait on until busy_timeout
+    updated = connection.execute(
+        update(TaskIdSequence).where(TaskIdSequence.id == 1)
+        .values(next_id=TaskIdSequence.next_id + count)
+    ).rowcount
+    if updated:
+        return connection.execute(select(TaskIdSequence.next_id)).scalar() - count
+    first = _highest_task_id(connection) + 1
+    connection.execute(insert(TaskIdSequence).values(id=1, next_id=first + count))
+    return first
+
+
+def allocate_task_ids(connection, count: int) -> Optional[int]:
+    """First of `count` consecutive new task ids for an insert on `connection`, None when the database assigns them
+
+    Ids are never reused, so archived rows and sync tombstones keep theirs.
+    SQLite would hand the highest id out again once its row is deleted or
+    archived, so there ids always come from task_id_sequence: within the
+    caller's transaction when it is on DATABASE_URL, where the sequence lives
+    and the single writer serializes them anyway, otherwise in blocks.
+    PostgreSQL's own sequence never goes back, so unsharded it assigns them.
+    """
+    if connection.dialect.name == "sqlite" and _database(connection) == _database(engine):
+        return _reserve_in_transaction(connection, count)
+    return task_ids.reserve(count) if shard_engines else None
+
+
+@event.listens_for(Task, "before_insert")
+def _assign_task_id(mapper, connection, target):
+    if target.id is None:
+        target.id = allocate_task_ids(connection, 1)
+
+
+# A forked worker must not hand out ids from the block its parent reserved
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=task_ids.reset)
@@ -0,0 +1,87 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.task import Task, TaskStatus
+from ..models.task_archive import ArchivedTask
+from .response_cache import invalidate_cached_responses
+from .task_events import publish_task_changes
+from .task_queries import TASK_FIELDS, TASK_COLUMNS
+from .task_sync import record_sync_changes
+from .task_versions import bump_task_version
+
+tasks_table = Task.__table__
+archive_table = ArchivedTask.__table__
+
+
+def archive_done_tasks(db: Session, older_than: timedelta, batch_size: int) -> int:
+    """Move tasks done for longer than `older_than` to tasks_archive and return how many moved
+
+    Each batch is copied and deleted in its own transaction, so the archiver
+    never holds the write lock for long. A task's last update is when it was
+    marked done; tasks created as done fall back to created_at.
+
+    Archiving leaves the user's counters alone, since stats count both tables,
+    but bumps their list version and records the tasks as deleted for delta
+    sync and the change feed: they leave the default task list.
+    """
+    cutoff = datetime.now(timezone.utc) - older_than
+    archived = last_id = 0
+    while True:
+        # Batches walk the primary key, so rows kept back are read once per run
+        rows = db.execute(
+            select(Task.id, Task.user_id, Task.status, Task.priority)
+            .where(
+                Task.id > last_id,
+                Task.status == TaskStatus.done,
+                or_(Task.updated_at < cutoff, and_(Task.updated_at.is_(None), Task.created_at < cutoff)),
+            )
+            .order_by(Task.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            db.commit()
+            return archived
+
+        task_ids = [row.id for row in rows]
+        last_id = task_ids[-1]
+        db.execute(insert(archive_table).from_select(
+            TASK_FIELDS, select(*TASK_COLUMNS).where(tasks_table.c.id.in_(task_ids))
+        ))
+        db.execute(delete(tasks_table).where(tasks_table.c.id.in_(task_ids)))
+
+        changes_by_user = defaultdict(list)
+        for row in rows:
+            changes_by_user[row.user_id].append((row.id, ((row.status, row.priority), None)))
+        for user_id, changes in changes_by_user.items():
+            record_sync_changes(db, user_id, bump_task_version(db, user_id), changes)
+            publish_task_changes(db, user_id, changes)
+            invalidate_cached_responses(db, user_id)
+        db.commit()
+
+        archived += len(rows)
+        if len(rows) < batch_size:
+            return archived
+
+
+def count_archived_tasks(db: Session) -> int:
+    return db.query(func.count(ArchivedTask.id)).scalar()
+
+
+if __name__ == "__main__":
+    # Archival job, e.g. nightly from cron: python -m app.utils.task_archive
+    from ..database import shard_ids, shard_session
+    from .schema import ensure_schema
+
+    ensure_schema()
+    archived = total = 0
+    for shard in shard_ids():
+        db = shard_session(shard)
+        try:
+            archived += archive_done_tasks(db, timedelta(days=settings.task_archive_after_days), settings.task_archive_batch_size)
+            total += count_archived_tasks(db)
+        finally:
+            db.close()
+    print(f"Archived {archived} tasks done for over {settings.task_archive_after_days} days, {total} in the archive")
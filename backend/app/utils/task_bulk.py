@@ -0,0 +1,141 @@
+from collections import defaultdict
+from typing import List, Sequence
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import Session
+from ..models.task import Task
+from ..schemas.task import TaskCreate, TaskBulkUpdate
+from .shards import allocate_task_ids
+from .task_hooks import record_task_writes
+from .task_writes import write_timestamp
+
+tasks_table = Task.__table__
+
+
+def _supports_returning(db: Session) -> bool:
+    """Whether the bound dialect can use RETURNING on INSERT/UPDATE/DELETE"""
+    return getattr(db.get_bind().dialect, "full_returning", False)
+
+
+def _load_tasks(db: Session, user_id: int, task_ids: Sequence[int]) -> dict:
+    """Fetch the given tasks in one SELECT, keyed by id
+
+    Plain rows rather than ORM instances, so nothing is expired and
+    re-selected one by one when the response is serialized after commit.
+    """
+    if not task_ids:
+        return {}
+    rows = db.execute(select(tasks_table).where(
+        tasks_table.c.user_id == user_id, tasks_table.c.id.in_(task_ids)
+    )).all()
+    return {row.id: row for row in rows}
+
+
+# Each helper applies a whole batch within the caller's transaction and
+# returns per-item result dicts in request order. The caller commits.
+def bulk_create_tasks(db: Session, user_id: int, payloads: List[TaskCreate]) -> List[dict]:
+    """Insert tasks with a single multi-row INSERT"""
+    rows = [{**payload.dict(), "user_id": user_id} for payload in payloads]
+    # Consecutive ids from the shared sequence, where the database's own may be reused
+    first_id = allocate_task_ids(db.connection(), len(rows))
+    if first_id is not None:
+        for offset, row in enumerate(rows):
+            row["id"] = first_id + offset
+
+    if _supports_returning(db):
+        created = db.execute(insert(tasks_table).values(rows).returning(*tasks_table.c)).all()
+        # Ids are assigned in VALUES order
+        created.sort(key=lambda row: row.id)
+    elif db.get_bind().dialect.name == "sqlite":
+        # Ids on SQLite always come from the sequence, so they are known already
+        db.execute(insert(tasks_table), rows)
+        task_ids = [row["id"] for row in rows]
+        loaded = _load_tasks(db, user_id, task_ids)
+        created = [loaded[task_id] for task_id in task_ids]
+    else:
+        # Let the flush assign ids, then read server defaults back in one SELECT
+        tasks = [Task(**row) for row in rows]
+        db.add_all(tasks)
+        db.flush()
+        loaded = _load_tasks(db, user_id, [task.id for task in tasks])
+        created = [loaded[task.id] for task in tasks]
+
+    record_task_writes(
+        db, user_id,
+        [(None, (task.status, task.priority)) for task in created],
+        [(task.id, task.due_date) for task in created],
+        [task.id for task in created]
+    )
+    return [
+        {"index": index, "id": task.id, "result": "created", "task": task}
+        for index, task in enumerate(created)
+    ]
+
+
+def bulk_update_tasks(db: Session, user_id: int, items: List[TaskBulkUpdate]) -> List[dict]:
+    """Update tasks with one executemany per distinct set of changed fields"""
+    existing = {
+        row.id: (row.status, row.priority)
+        for row in db.query(Task.id, Task.status, Task.priority).filter(
+            Task.user_id == user_id, Task.id.in_({item.id for item in items})
+        )
+    }
+
+    # Rows changing the same columns share one UPDATE statement; items with
+    # nothing but an id change nothing and are reported as unchanged
+    groups = defaultdict(list)
+    changed_items = set()
+    for index, item in enumerate(items):
+        data = item.dict(exclude_unset=True, exclude={"id"})
+        if item.id in existing and data:
+            groups[tuple(sorted(data))].append({"b_id": item.id, **{f"b_{k}": v for k, v in data.items()}})
+            changed_items.add(index)
+    changed = {items[index].id: existing[items[index].id] for index in changed_items}
+
+    # Set here rather than by the column's onupdate, so it is stored like single-task writes
+    now = write_timestamp(db)
+    for fields, params in groups.items():
+        stmt = update(tasks_table).where(
+            tasks_table.c.id == bindparam("b_id"),
+            tasks_table.c.user_id == user_id
+        ).values({**{field: bindparam(f"b_{field}") for field in fields}, "updated_at": now})
+        db.execute(stmt, params)
+
+    updated = _load_tasks(db, user_id, list(existing))
+    record_task_writes(db, user_id, [
+        (old_key, (updated[task_id].status, updated[task_id].priority))
+        for task_id, old_key in changed.items()
+    ], [(task_id, updated[task_id].due_date) for task_id in changed], list(changed))
+    results = []
+    for index, item in enumerate(items):
+        if item.id not in updated:
+            results.append({"index": index, "id": item.id, "result": "not_found", "task": None})
+        else:
+            result = "updated" if index in changed_items else "unchanged"
+            results.append({"index": index, "id": item.id, "result": result, "task": updated[item.id]})
+    return results
+
+
+def bulk_delete_tasks(db: Session, user_id: int, task_ids: List[int]) -> List[dict]:
+    """Delete tasks with a single DELETE ... WHERE id IN (...)"""
+    stmt = delete(tasks_table).where(
+        tasks_table.c.user_id == user_id,
+        tasks_table.c.id.in_(set(task_ids))
+    )
+
+    if _supports_returning(db):
+        deleted_rows = db.execute(stmt.returning(tasks_table.c.id, tasks_table.c.status, tasks_table.c.priority)).all()
+    else:
+        deleted_rows = db.query(Task.id, Task.status, Task.priority).filter(
+            Task.user_id == user_id, Task.id.in_(set(task_ids))
+        ).all()
+        db.execute(stmt)
+
+    deleted = {row.id: (row.status, row.priority) for row in deleted_rows}
+    record_task_writes(db, user_id, [(old_key, None) for old_key in deleted.values()], task_ids=list(deleted))
+
+    # A repeated id is reported as deleted only the first time
+    results = []
+    for index, task_id in enumerate(task_ids):
+        result = "deleted" if deleted.pop(task_id, None) else "not_found"
+        results.append({"index": index, "id": task_id, "result": result, "task": None})
+    return results
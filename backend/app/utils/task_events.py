@@ -0,0 +1,319 @@
+import abc
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..config import settings
+from .task_stats import TaskKey
+
+logger = logging.getLogger(__name__)
+
+# Sent in place of a subscriber's backlog once it overflows; the client should
+# refetch the task list (its ETag makes that cheap if nothing changed)
+RESYNC_EVENT = {"type": "resync"}
+
+# How long browsers wait before reconnecting a dropped feed
+SSE_RETRY_MS = 3000
+
+# Events per broker message, which keeps bulk writes under datagram size limits
+BROKER_BATCH_EVENTS = 200
+
+Deliver = Callable[[int, List[dict]], None]
+
+
+class Subscription:
+    """One connected feed client: a bounded queue of events not yet sent
+
+    A client that falls `max_queue` events behind loses its backlog and gets a
+    single resync event instead, so a slow reader never holds up publishers
+    or grows memory.
+    """
+
+    def __init__(self, user_id: int, max_queue: int):
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.closed = False
+        self._events: deque = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, task_event: dict):
+        if len(self._events) >= self.max_queue:
+            self.dropped += len(self._events)
+            self._events.clear()
+            self._events.append(RESYNC_EVENT)
+        self._events.append(task_event)
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: float) -> List[dict]:
+        """Wait up to `timeout` seconds and return every queued event (empty on timeout)"""
+        if not self._events and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+
+class Broker(abc.ABC):
+    """Carries published events to the hub of every worker process
+
+    start() is given the hub's deliver callback; publish() may be called from
+    any thread and must not block on slow subscribers.
+    """
+
+    def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    @abc.abstractmethod
+    def publish(self, user_id: int, events: List[dict]):
+        """Hand the events to every worker's hub"""
+
+    def stop(self):
+        pass
+
+
+class LocalBroker(Broker):
+    """Events reach the subscribers of this process only"""
+
+    deliver: Optional[Deliver] = None
+
+    def publish(self, user_id: int, events: List[dict]):
+        if self.deliver is not None:
+            self.deliver(user_id, events)
+
+
+class UnixSocketBroker(Broker):
+    """Shares events between the worker processes of one host
+
+    Each worker binds a datagram socket in `directory` and publishing sends the
+    events to every socket there. It stands in for a network broker (Redis
+    pub/sub, Postgres NOTIFY) behind the same interface; a worker whose socket
+    buffer is full misses the message rather than blocking the publisher.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.deliver: Optional[Deliver] = None
+        self.dropped = 0
+        self._path: Optional[str] = None
+        self._receiver: Optional[socket.socket] = None
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self, deliver: Deliver):
+        self.deliver = deliver
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"{os.getpid()}.sock")
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._receiver.bind(self._path)
+        self._receiver.settimeout(1.0)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._receive, name="task-events-broker", daemon=True)
+        self._thread.start()
+
+    def _receive(self):
+        while not self._stopped.is_set():
+            try:
+                payload = self._receiver.recv(1 << 20)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            try:
+                message = json.loads(payload)
+                self.deliver(message["u"], message["e"])
+            except Exception:
+                logger.exception("Dropped a malformed task event message")
+
+    def publish(self, user_id: int, events: List[dict]):
+        # This worker's subscribers are served directly, the others by datagram
+        if self.deliver is not None:
+            self.deliver(user_id, events)
+        try:
+            peers = [name for name in os.listdir(self.directory) if name.endswith(".sock")]
+        except FileNotFoundError:
+            return
+        for start in range(0, len(events), BROKER_BATCH_EVENTS):
+            payload = json.dumps({"u": user_id, "e": events[start:start + BROKER_BATCH_EVENTS]}).encode()
+            for name in peers:
+                path = os.path.join(self.directory, name)
+                if path == self._path:
+                    continue
+                try:
+                    self._sender.sendto(payload, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Left behind by a worker that exited without cleaning up
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except OSError:
+                    self.dropped += 1
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._receiver is not None:
+            self._receiver.close()
+            self._receiver = None
+        if self._path is not None and os.path.exists(self._path):
+            os.unlink(self._path)
+        self._path = None
+
+
+class TaskEventHub:
+    """Per-user fan-out of task change events to this worker's feed subscribers"""
+
+    def __init__(self, broker: Broker, max_queue: int, max_subscribers_per_user: int):
+        self.broker = broker
+        self.max_queue = max_queue
+        self.max_subscribers_per_user = max_subscribers_per_user
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        """Bind to the running event loop and start receiving from the broker"""
+        self._loop = asyncio.get_running_loop()
+        self.broker.start(self._receive)
+
+    async def stop(self):
+        self.broker.stop()
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.close()
+        self._loop = None
+
+    def publish(self, user_id: int, events: List[dict]):
+        """Send events to the user's subscribers in every worker (from any thread)"""
+        if events:
+            self.published += len(events)
+            self.broker.publish(user_id, events)
+
+    def _receive(self, user_id: int, events: List[dict]):
+        # Called on broker and request threads; queues are only touched on the loop
+        loop = self._loop
+        if loop is not None and user_id in self._subscribers:
+            loop.call_soon_threadsafe(self._fan_out, user_id, events)
+
+    def _fan_out(self, user_id: int, events: List[dict]):
+        for subscription in self._subscribers.get(user_id, ()):
+            for task_event in events:
+                subscription.push(task_event)
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscriptions = self._subscribers.setdefault(user_id, set())
+        if len(subscriptions) >= self.max_subscribers_per_user:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many open change feeds for this user"
+            )
+        subscription = Subscription(user_id, self.max_queue)
+        subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            self.dropped += subscription.dropped
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+
+    def stats(self) -> dict:
+        subscriptions = [sub for subs in self._subscribers.values() for sub in subs]
+        return {
+            "subscribers": len(subscriptions),
+            "published": self.published,
+            "dropped": self.dropped + sum(sub.dropped for sub in subscriptions),
+            "broker_dropped": getattr(self.broker, "dropped", 0),
+        }
+
+
+def _default_socket_dir(channel: str = "task-events") -> str:
+    # One directory per database and channel, shared by the worker processes on this host
+    database_id = zlib.crc32(settings.database_url.encode())
+    return os.path.join(tempfile.gettempdir(), f"{channel}-{database_id:08x}")
+
+
+def create_broker(channel: str = "task-events") -> Broker:
+    """The TASK_EVENTS_BROKER broker for a channel; each channel has its own sockets"""
+    if settings.task_events_broker == "unix" and hasattr(socket, "AF_UNIX"):
+        return UnixSocketBroker(_default_socket_dir(channel))
+    return LocalBroker()
+
+
+task_feed = TaskEventHub(
+    create_broker(),
+    max_queue=settings.task_events_queue_size,
+    max_subscribers_per_user=settings.task_events_max_subscribers,
+)
+
+
+def publish_task_changes(db: Session, user_id: int, changes: Iterable[Tuple[int, Tuple[TaskKey, TaskKey]]]):
+    """Queue created/updated/deleted events for (task_id, (old_key, new_key)) until commit"""
+    events = [
+        {"type": "created" if old_key is None else "deleted" if new_key is None else "updated", "task_id": task_id}
+        for task_id, (old_key, new_key) in changes
+    ]
+    if events:
+        db.info.setdefault("task_events", {}).setdefault(user_id, []).extend(events)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    pending = session.info.pop("task_events", None)
+    if pending and settings.task_events_enabled:
+        for user_id, events in pending.items():
+            task_feed.publish(user_id, events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("task_events", None)
+
+
+async def stream_task_events(subscription: Subscription):
+    """Server-Sent Events body for a subscription, with periodic keep-alive comments
+
+    Ends after TASK_EVENTS_MAX_STREAM_SECONDS; EventSource then reconnects.
+    """
+    deadline = time.monotonic() + settings.task_events_max_stream_seconds
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while not subscription.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events = await subscription.get(min(settings.task_events_heartbeat_seconds, remaining))
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            yield "".join(f"data: {json.dumps(task_event)}\n\n" for task_event in events)
+    finally:
+        task_feed.unsubscribe(subscription)
@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Iterable, Iterator, List, Sequence
+from .task_queries import TASK_FIELDS, TASK_COLUMNS
+
+# Exported columns, in the same order the Task schema serializes them
+EXPORT_FIELDS: List[str] = TASK_FIELDS
+EXPORT_COLUMNS = TASK_COLUMNS
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Rows fetched from the server-side cursor per chunk written to the response
+EXPORT_CHUNK_ROWS = 1000
+
+
+def _json_value(value):
+    # Mirrors pydantic's JSON encoding of the Task schema fields
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_ndjson(rows: Sequence) -> bytes:
+    return "".join(
+        json.dumps({field: _json_value(value) for field, value in zip(EXPORT_FIELDS, row)}) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _encode_csv(rows: Sequence, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow("" if value is None else _json_value(value) for value in row)
+    return buffer.getvalue().encode()
+
+
+def encode_export(partitions: Iterable[Sequence], export_format: str) -> Iterator[bytes]:
+    """Encode row partitions from a streamed result as NDJSON or CSV chunks"""
+    if export_format == "csv":
+        yield _encode_csv([], header=True)
+    for rows in partitions:
+        yield _encode_csv(rows) if export_format == "csv" else _encode_ndjson(rows)
+
+
+async def encode_export_async(partitions: AsyncIterator[Sequence], export_format: str) -> AsyncIterator[bytes]:
+    """Async counterpart of encode_export for AsyncResult.partitions()"""
+    if export_format == "csv":
+        yield _encode_csv([], header=True)
+    async for rows in partitions:
+        yield _encode_csv(rows) if export_format == "csv" else _encode_ndjson(rows)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from sqlalchemy.orm import Session
+from .reminders import schedule_reminders
+from .response_cache import invalidate_cached_responses
+from .shards import check_shard_writable
+from .task_events import publish_task_changes
+from .task_rollups import record_task_rollups
+from .task_stats import TaskKey, record_task_changes
+from .task_sync import record_sync_changes
+from .task_versions import bump_task_version
+
+
+def record_task_writes(
+    db: Session,
+    user_id: int,
+    changes: Iterable[Tuple[TaskKey, TaskKey]],
+    due_dates: Iterable[Tuple[int, Optional[datetime]]] = (),
+    task_ids: Iterable[int] = ()
+):
+    """Everything that must commit atomically with a batch of task writes
+
+    Call after the writes are flushed and before commit, with the
+    (status, priority) of each task before and after (None for create/delete),
+    the (id, due_date) of created or updated tasks for the reminder scheduler,
+    and the ids of the tasks in `changes`, in order, for delta sync and the
+    change feed. The user's cached list responses are dropped on commit.
+    Raises 503 while the user's tasks are being moved to another shard.
+    """
+    check_shard_writable(db)
+    changes = list(changes)
+    if not changes:
+        return
+    record_task_changes(db, user_id, changes)
+    record_task_rollups(db, changes)
+    version = bump_task_version(db, user_id)
+    task_changes = list(zip(task_ids, changes))
+    record_sync_changes(db, user_id, version, task_changes)
+    schedule_reminders(db, due_dates)
+    publish_task_changes(db, user_id, task_changes)
+    invalidate_cached_responses(db, user_id)
@@ -0,0 +1,179 @@
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+from fastapi import HTTPException, status as http_status
+from sqlalchemy import func, or_, select, union_all
+from sqlalchemy.orm import aliased
+from ..models.task import Task, TaskStatus, TaskPriority, task_priority_rank
+from ..models.task_archive import ArchivedTask
+from ..schemas.task import Task as TaskSchema
+from .pagination import encode_cursor, decode_cursor
+
+# Task columns in the order the Task schema serializes them, for reads that
+# skip ORM instances and pydantic validation
+TASK_FIELDS: List[str] = list(TaskSchema.__fields__)
+TASK_COLUMNS = [Task.__table__.c[field] for field in TASK_FIELDS]
+
+# Longest look-ahead accepted by /api/tasks/due
+MAX_DUE_WINDOW = timedelta(days=366)
+DUE_WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def priority_rank(model=Task):
+    """Higher for more important priorities, for sorting by priority (see the Task model's rank index)"""
+    return task_priority_rank(model.priority)
+
+
+# ORDER BY for each `sort` option of the task list; id breaks ties so pages are
+# stable. Each leading key after user_id is an index on the tasks table.
+# Built per entity, so the same orders apply to tasks_with_archive().
+TASK_SORTS = {
+    "created_at": lambda t: (t.created_at.desc(), t.id.desc()),
+    "updated_at": lambda t: (t.updated_at.desc().nulls_last(), t.id.desc()),
+    "due_date": lambda t: (t.due_date.asc().nulls_last(), t.id.asc()),
+    # Descending throughout, so the rank index is read backwards
+    "priority": lambda t: (priority_rank(t).desc(), t.created_at.desc(), t.id.desc()),
+}
+
+
+def tasks_with_archive(user_id: int):
+    """Task entity over a UNION ALL of the user's active and archived tasks
+
+    Use it in place of Task, passing it as `model` to the helpers below, when a
+    request asks for include_archived. Each side is restricted to the user, so
+    both are range scans of their (user_id, created_at, id) index.
+    """
+    archive = ArchivedTask.__table__
+    union = union_all(
+        select(*TASK_COLUMNS).where(Task.user_id == user_id),
+        select(*[archive.c[field] for field in TASK_FIELDS]).where(archive.c.user_id == user_id),
+    ).subquery("all_tasks")
+    return aliased(Task, union, adapt_on_names=True)
+
+
+def task_columns(model=Task) -> list:
+    """TASK_COLUMNS of Task or of an entity from tasks_with_archive()"""
+    if model is Task:
+        return TASK_COLUMNS
+    return [getattr(model, field) for field in TASK_FIELDS]
+
+
+# These helpers take either an ORM Query or a Core/2.0-style select(), so the
+# sync and async routers build identical SQL. `model` is Task or an entity
+# from tasks_with_archive().
+def parse_enum_list(value: Optional[str], enum, name: str) -> list:
+    """Parse a comma-separated filter such as todo,in_progress into enum members"""
+    if not value or not value.strip():
+        return []
+    try:
+        return list(dict.fromkeys(enum(item.strip()) for item in value.split(",") if item.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {name}, expected a comma-separated list of: {', '.join(member.value for member in enum)}"
+        )
+
+
+def filter_task_list(
+    query,
+    status: Optional[str],
+    priority: Optional[str],
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    model=Task,
+    sort: str = "due_date",
+):
+    """Apply the optional status/priority/due date filters of the task list
+
+    status and priority take one value or a comma-separated list; a single
+    value is an equality match so the (user_id, status|priority, created_at, id)
+    indexes serve it together with the default ordering.
+
+    Unless the list is sorted by due date, the due range is kept from being
+    searched in the due date index, which would leave the matches to sort;
+    like a status list, it is checked on each row of the sort's index instead.
+    """
+    for column, values in (
+        (model.status, parse_enum_list(status, TaskStatus, "status")),
+        (model.priority, parse_enum_list(priority, TaskPriority, "priority")),
+    ):
+        if len(values) == 1:
+            query = query.filter(column == values[0])
+        elif values:
+            query = query.filter(column.in_(values))
+    
+    due_date = model.due_date if sort == "due_date" else func.coalesce(model.due_date, None)
+    if due_after is not None:
+        query = query.filter(due_date >= due_after)
+    if due_before is not None:
+        query = query.filter(due_date < due_before)
+    
+    return query
+
+
+def paginate_task_list(query, skip: int, limit: int, cursor: Optional[str], sort: str = "created_at", model=Task):
+    """Order the task list by `sort` and apply offset or keyset pagination
+
+    Keyset cursors follow the default newest-first order only; the other sort
+    orders page with skip/limit.
+    """
+    
+    query = query.order_by(*TASK_SORTS[sort](model))
+    
+    # Apply pagination - keyset when a cursor is given, offset otherwise
+    if cursor:
+        if sort != "created_at":
+            raise HTTPException(
+                status_code=http_status.HTTP_400_BAD_REQUEST,
+                detail="Cursors can only be used with sort=created_at, use skip/limit for other orders"
+            )
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        # The leading <= bound lets the planner seek the index instead of scanning it
+        query = query.filter(
+            model.created_at <= cursor_created_at,
+            or_(model.created_at < cursor_created_at, model.id < cursor_id)
+        )
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def parse_due_window(window: str) -> timedelta:
+    """Parse a look-ahead such as 30m, 24h or 7d"""
+    match = re.fullmatch(r"(\d+)([mhd])", window.strip())
+    delta = timedelta(**{DUE_WINDOW_UNITS[match.group(2)]: int(match.group(1))}) if match else None
+    if not delta or delta > MAX_DUE_WINDOW:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="Invalid window, use minutes, hours or days such as 30m, 24h or 7d (at most 366d)"
+        )
+    return delta
+
+
+def due_task_list(query, due_from: Optional[datetime], due_before: datetime):
+    """Restrict to unfinished tasks due in [due_from, due_before), soonest first
+
+    Together with the user_id filter this is a range scan of the
+    (user_id, due_date, id) index.
+    """
+    query = query.filter(Task.due_date < due_before, Task.status != TaskStatus.done)
+    if due_from is not None:
+        query = query.filter(Task.due_date >= due_from)
+    return query.order_by(Task.due_date, Task.id)
+
+
+def next_page_cursor(tasks: Sequence[Task], limit: int, sort: str = "created_at") -> Optional[str]:
+    """Cursor for the page after `tasks`; a full page means there may be more rows"""
+    if len(tasks) < limit or sort != "created_at":
+        return None
+    last = tasks[-1]
+    return encode_cursor(last.created_at, last.id)
+
+
+def task_rows_to_dicts(rows: Sequence) -> List[dict]:
+    """Turn TASK_COLUMNS rows into dicts shaped like the Task schema
+
+    Rows come straight from the tasks table, so they are trusted and not
+    re-validated; enums and datetimes are left for the JSON encoder.
+    """
+    return [dict(zip(TASK_FIELDS, row)) for row in rows]
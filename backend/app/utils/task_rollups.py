@@ -0,0 +1,373 @@
+import contextlib
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+from fastapi import HTTPException, status as http_status
+from sqlalchemy import bindparam, event, func, select, text, update
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import shard_ids, shard_session
+from ..models.task import Task, TaskStatus, TaskPriority
+from ..models.task_archive import ArchivedTask
+from ..models.task_rollup import TaskRollupHourly, TaskRollupDaily
+from .task_stats import TaskKey
+
+logger = logging.getLogger(__name__)
+
+# Backends with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = ("sqlite", "postgresql")
+
+_upsert_statements = {}
+
+ROLLUP_MODELS = {"hour": TaskRollupHourly, "day": TaskRollupDaily}
+COUNT_COLUMNS = ("created", "updated", "completed", "deleted")
+
+# Range served when the caller gives no start, and the longest hourly range
+DEFAULT_RANGES = {"hour": timedelta(days=1), "day": timedelta(days=30)}
+MAX_HOURLY_RANGE = timedelta(days=31)
+
+
+def _as_utc(moment: datetime) -> datetime:
+    """Aware UTC datetime; naive values are taken to be UTC already"""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def bucket_start(moment: datetime, interval: str) -> datetime:
+    """Start of the hour or day bucket holding `moment`, UTC"""
+    moment = _as_utc(moment).replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if interval == "day" else moment
+
+
+def _upsert_statement(model):
+    """INSERT ... ON CONFLICT adding to a bucket's counts, in the syntax SQLite and Postgres share
+
+    Built as text() with typed parameters because SQLAlchemy 1.4 recompiles
+    its on_conflict_do_update() constructs on every execution, which cost
+    more than the write itself.
+    """
+    statement = _upsert_statements.get(model)
+    if statement is None:
+        table = model.__table__
+        columns = ["bucket", "status", "priority", *COUNT_COLUMNS]
+        statement = text(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + column for column in columns)}) "
+            "ON CONFLICT (bucket, status, priority) DO UPDATE SET "
+            + ", ".join(f"{column} = {table.name}.{column} + excluded.{column}" for column in COUNT_COLUMNS)
+        ).bindparams(*[bindparam(column, type_=table.c[column].type) for column in columns])
+        _upsert_statements[model] = statement
+    return statement
+
+
+def _upsert_rollups(db: Session, model, rows: list):
+    """Add the counts of `rows` to their buckets
+
+    Rows are written in key order, so concurrent writers lock shared
+    buckets in the same order.
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: (row["bucket"], row["status"].value, row["priority"].value))
+    if db.bind.dialect.name in UPSERT_DIALECTS:
+        db.execute(_upsert_statement(model), rows)
+        return
+
+    table = model.__table__
+    for row in rows:
+        updated = db.execute(
+            update(table).where(
+                table.c.bucket == row["bucket"], table.c.status == row["status"], table.c.priority == row["priority"]
+            ).values({column: table.c[column] + row[column] for column in COUNT_COLUMNS})
+        ).rowcount
+        if not updated:
+            db.execute(table.insert().values(row))
+
+
+def _rollup_rows(counts: Dict[Tuple[datetime, TaskStatus, TaskPriority], Dict[str, int]]) -> list:
+    return [
+        {"bucket": bucket, "status": task_status, "priority": task_priority,
+         **{column: values.get(column, 0) for column in COUNT_COLUMNS}}
+        for (bucket, task_status, task_priority), values in counts.items()
+    ]
+
+
+def _add_counts(into: dict, counts: dict):
+    for key, values in counts.items():
+        totals = into.setdefault(key, {})
+        for column, count in values.items():
+            totals[column] = totals.get(column, 0) + count
+
+
+class TaskRollupBuffer:
+    """Committed task write counts waiting to be added to the rollup tables
+
+    Counts are keyed by (shard, hour, status, priority). A thread, started
+    with the first counts, adds them to the hourly and daily rows every
+    `flush_seconds` in a transaction of its own, so task writes never wait on
+    the bucket rows every user shares. Counts not flushed when a worker is
+    killed are lost; the backfill rebuilds created and completed.
+    """
+
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self.flushes = 0
+        self._counts: Dict[tuple, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, counts: Dict[tuple, Dict[str, int]]):
+        with self._lock:
+            _add_counts(self._counts, counts)
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="task-rollups", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_seconds):
+            self.flush()
+
+    def flush(self):
+        """Add the buffered counts to the rollup tables, one transaction per shard"""
+        with self._lock:
+            pending, self._counts = self._counts, {}
+        by_shard = {}
+        for (shard, hour, task_status, task_priority), values in pending.items():
+            by_shard.setdefault(shard, {})[hour, task_status, task_priority] = values
+
+        for shard, counts in by_shard.items():
+            db = shard_session(shard)
+            try:
+                for interval, model in ROLLUP_MODELS.items():
+                    buckets = {}
+                    for (hour, task_status, task_priority), values in counts.items():
+                        _add_counts(buckets, {(bucket_start(hour, interval), task_status, task_priority): values})
+                    _upsert_rollups(db, model, _rollup_rows(buckets))
+                db.commit()
+            except Exception:
+                logger.exception("Task rollup flush for shard %s failed, retrying on the next one", shard)
+                db.rollback()
+                self.add({(shard, *key): values for key, values in counts.items()})
+            finally:
+                db.close()
+        with self._lock:
+            self.flushes += 1
+
+    def stop(self, timeout: float = 5.0):
+        """Flush what is buffered and end the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def reset(self):
+        # The thread doesn't survive a fork, and the parent flushes its own counts
+        with self._lock:
+            self._counts.clear()
+            self._thread = None
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._counts)
+
+
+task_rollup_buffer = TaskRollupBuffer(settings.task_rollups_flush_seconds)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=task_rollup_buffer.reset)
+
+
+def record_task_rollups(db: Session, changes: Iterable[Tuple[TaskKey, TaskKey]], now: Optional[datetime] = None):
+    """Count a batch of task writes into the current hour, buffered once the caller commits"""
+    if not settings.task_rollups_enabled:
+        return
+
+    hour = bucket_start(now or datetime.now(timezone.utc), "hour")
+    shard = db.info.get("shard")
+    counts = db.info.setdefault("task_rollups", {})
+    for old, new in changes:
+        if new is None:
+            key, columns = old, ["deleted"]
+        else:
+            key, columns = new, ["created" if old is None else "updated"]
+            done = TaskStatus(new[0]) == TaskStatus.done
+            if done and (old is None or TaskStatus(old[0]) != TaskStatus.done):
+                columns.append("completed")
+        if key is None:
+            continue
+        values = counts.setdefault((shard, hour, TaskStatus(key[0]), TaskPriority(key[1])), {})
+        for column in columns:
+            values[column] = values.get(column, 0) + 1
+
+
+@event.listens_for(Session, "after_commit")
+def _buffer_committed_rollups(session):
+    counts = session.info.pop("task_rollups", None)
+    if counts:
+        task_rollup_buffer.add(counts)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_rollups(session):
+    session.info.pop("task_rollups", None)
+
+
+@contextlib.contextmanager
+def _on_shard(db: Session, shard):
+    """Point the session's task queries at one shard for the duration of the block"""
+    previous = db.info.get("shard")
+    db.info["shard"] = shard
+    try:
+        yield
+    finally:
+        db.info["shard"] = previous
+
+
+def parse_rollup_range(interval: str, start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """Validate an analytics range; start is moved back to the start of its bucket"""
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = bucket_start(start if start else end - DEFAULT_RANGES[interval], interval)
+    if start >= end:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    if interval == "hour" and end - start > MAX_HOURLY_RANGE:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=f"Hourly ranges are limited to {MAX_HOURLY_RANGE.days} days, use interval=day"
+        )
+    return start, end
+
+
+def _sum_rollups(db: Session, model, start: datetime, end: datetime, group_columns: list) -> Dict[tuple, Dict[str, int]]:
+    """Counts per group for buckets starting in [start, end), summed over every shard"""
+    query = select(*group_columns, *[func.sum(model.__table__.c[column]) for column in COUNT_COLUMNS]).where(
+        model.bucket >= start, model.bucket < end
+    ).group_by(*group_columns)
+
+    totals = {}
+    for shard in shard_ids():
+        with _on_shard(db, shard):
+            rows = db.execute(query).all()
+        for row in rows:
+            row = tuple(row)
+            values = totals.setdefault(row[:len(group_columns)], dict.fromkeys(COUNT_COLUMNS, 0))
+            for column, count in zip(COUNT_COLUMNS, row[len(group_columns):]):
+                values[column] += count or 0
+    return totals
+
+
+def query_task_rollups(db: Session, interval: str, start: datetime, end: datetime, group_by: Optional[str] = None) -> dict:
+    """Task write counts per bucket, optionally split by status or priority
+
+    Reads only the rollup table of the interval: at most 12 rows per bucket
+    and shard, however many tasks were written. Buckets without writes are
+    left out.
+    """
+    model = ROLLUP_MODELS[interval]
+    group_columns = [model.bucket] + ([getattr(model, group_by)] if group_by else [])
+    totals = _sum_rollups(db, model, start, end, group_columns)
+
+    buckets = []
+    for key in sorted(totals, key=lambda key: (key[0], *(value.value for value in key[1:]))):
+        bucket = {"bucket": _as_utc(key[0]), **totals[key]}
+        if group_by:
+            bucket[group_by] = key[1].value
+        buckets.append(bucket)
+    return {"interval": interval, "start": start, "end": end, "buckets": buckets}
+
+
+def query_task_rollup_totals(db: Session, start: datetime, end: datetime) -> dict:
+    """Task write counts over whole UTC days, in total and by status and by priority"""
+    rows = _sum_rollups(db, TaskRollupDaily, start, end, [TaskRollupDaily.status, TaskRollupDaily.priority])
+
+    totals = dict.fromkeys(COUNT_COLUMNS, 0)
+    by_status = {s.value: dict.fromkeys(COUNT_COLUMNS, 0) for s in TaskStatus}
+    by_priority = {p.value: dict.fromkeys(COUNT_COLUMNS, 0) for p in TaskPriority}
+    for (task_status, task_priority), values in rows.items():
+        for column, count in values.items():
+            totals[column] += count
+            by_status[task_status.value][column] += count
+            by_priority[task_priority.value][column] += count
+    return {"start": start, "end": end, **totals, "by_status": by_status, "by_priority": by_priority}
+
+
+def _hour_of(db: Session, column):
+    """SQL expression truncating a timestamp column to its UTC hour"""
+    if db.bind.dialect.name == "postgresql":
+        return func.date_trunc("hour", func.timezone("UTC", column))
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def _parse_hour(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    return _as_utc(value)
+
+
+def backfill_task_rollups(db: Session, since: Optional[datetime] = None) -> int:
+    """Rebuild created and completed counts from tasks and tasks_archive on the session's shard
+
+    For rollups first enabled on existing data, or to repair them. Tasks only
+    keep their current state, so a task counts as created with the status and
+    priority it has now, and as completed at its last update if it is done.
+    updated and deleted counts are left as they are. With `since`, only days
+    from then on are rebuilt. Returns the number of hourly buckets written;
+    the caller commits.
+    """
+    since = bucket_start(since, "day") if since else None
+    counts = {}
+    for model in (Task, ArchivedTask):
+        completed_at = func.coalesce(model.updated_at, model.created_at)
+        for column, moment, done_only in (("created", model.created_at, False), ("completed", completed_at, True)):
+            hour = _hour_of(db, moment)
+            query = select(hour, model.status, model.priority, func.count(model.id)).where(moment.isnot(None))
+            if done_only:
+                query = query.where(model.status == TaskStatus.done)
+            if since is not None:
+                query = query.where(moment >= since)
+            for hour_value, task_status, task_priority, count in db.execute(query.group_by(hour, model.status, model.priority)):
+                values = counts.setdefault((_parse_hour(hour_value), TaskStatus(task_status), TaskPriority(task_priority)), {})
+                values[column] = values.get(column, 0) + count
+
+    daily = {}
+    for (hour, task_status, task_priority), values in counts.items():
+        day_values = daily.setdefault((bucket_start(hour, "day"), task_status, task_priority), {})
+        for column, count in values.items():
+            day_values[column] = day_values.get(column, 0) + count
+
+    for model, model_counts in ((TaskRollupHourly, counts), (TaskRollupDaily, daily)):
+        clear = update(model).values(created=0, completed=0)
+        if since is not None:
+            clear = clear.where(model.bucket >= since)
+        db.execute(clear)
+        # Adding to the cleared counts keeps the updated and deleted ones already recorded
+        _upsert_rollups(db, model, _rollup_rows(model_counts))
+    return len(counts)
+
+
+if __name__ == "__main__":
+    # Backfill: python -m app.utils.task_rollups [DAYS], all history by default
+    import sys
+    from ..database import shard_session
+    from .schema import ensure_schema
+
+    ensure_schema()
+    since = datetime.now(timezone.utc) - timedelta(days=int(sys.argv[1])) if len(sys.argv) > 1 else None
+    buckets = 0
+    for shard in shard_ids():
+        db = shard_session(shard)
+        try:
+            buckets += backfill_task_rollups(db, since)
+            db.commit()
+        finally:
+            db.close()
+    print(f"Task rollups rebuilt, {buckets} hourly rollup rows")
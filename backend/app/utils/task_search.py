@@ -0,0 +1,99 @@
+import re
+from sqlalchemy import column, func, literal_column, or_, table, text
+from sqlalchemy.engine import Engine
+from ..models.task import Task
+
+# SQLite: external-content FTS5 table over tasks(title, description), kept in
+# step with tasks by triggers so every write path (ORM, bulk Core) is covered.
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, description, content='tasks', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+# PostgreSQL: a generated tsvector column maintained by the database, with a GIN index
+POSTGRES_SEARCH_DDL = [
+    """ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+]
+
+tasks_fts = table("tasks_fts", column("rowid"))
+_fts_match_target = literal_column("tasks_fts")
+_search_vector = literal_column("tasks.search_vector")
+
+
+def create_search_index(engine: Engine):
+    """Create the full-text index for the engine's backend if it is missing"""
+    statements = {
+        "sqlite": SQLITE_SEARCH_DDL,
+        "postgresql": POSTGRES_SEARCH_DDL,
+    }.get(engine.dialect.name, [])
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+
+
+def rebuild_search_index(engine: Engine):
+    """Recreate the full-text index contents from the tasks table"""
+    create_search_index(engine)
+    with engine.begin() as connection:
+        if engine.dialect.name == "sqlite":
+            connection.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"))
+        elif engine.dialect.name == "postgresql":
+            connection.execute(text("REINDEX INDEX ix_tasks_search_vector"))
+
+
+def _fts5_query(q: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r"\w+", q)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_task_list(query, dialect_name: str, q: str):
+    """Restrict a Task query/select() to matches for `q`, best match first
+
+    Uses FTS5 bm25 on SQLite and ts_rank on PostgreSQL; other backends fall
+    back to an unranked ILIKE scan.
+    """
+    if dialect_name == "sqlite":
+        match = _fts5_query(q)
+        if not match:
+            return query.filter(text("0"))
+        return query.join(tasks_fts, tasks_fts.c.rowid == Task.id).filter(
+            _fts_match_target.op("MATCH")(match)
+        ).order_by(func.bm25(_fts_match_target), Task.id.desc())
+
+    if dialect_name == "postgresql":
+        ts_query = func.websearch_to_tsquery("english", q)
+        return query.filter(_search_vector.op("@@")(ts_query)).order_by(
+            func.ts_rank(_search_vector, ts_query).desc(), Task.id.desc()
+        )
+
+    pattern = f"%{q}%"
+    return query.filter(
+        or_(Task.title.ilike(pattern), Task.description.ilike(pattern))
+    ).order_by(Task.created_at.desc(), Task.id.desc())
+
+
+if __name__ == "__main__":
+    # Reindex: python -m app.utils.task_search
+    from ..database import engine, shard_engines
+    from .schema import ensure_schema
+
+    ensure_schema()
+    for shard_engine in set(shard_engines) or {engine}:
+        rebuild_search_index(shard_engine)
+    print("Search index rebuilt successfully!")
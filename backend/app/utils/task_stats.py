@@ -0,0 +1,171 @@
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.task import Task, TaskStatus, TaskPriority
+from ..models.task_archive import ArchivedTask
+from ..models.task_counter import UserTaskCounter
+from .shards import users_on_shard
+
+# (status, priority) of a task before or after a write; None when it doesn't exist
+TaskKey = Optional[Tuple[TaskStatus, TaskPriority]]
+
+_upsert_dialects = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def _format_stats(status_counts: Dict[str, int], priority_counts: Dict[str, int]) -> dict:
+    """Shape counts the way /api/tasks/stats/summary returns them"""
+    return {
+        "status_stats": status_counts,
+        "priority_stats": priority_counts,
+        "total_tasks": sum(status_counts.values())
+    }
+
+
+def _empty_stats() -> dict:
+    return _format_stats({s.value: 0 for s in TaskStatus}, {p.value: 0 for p in TaskPriority})
+
+
+def _count_tasks(db: Session, user_id: Optional[int] = None) -> Dict[int, dict]:
+    """Count tasks per user by status and priority, archived ones included
+
+    One GROUP BY pass over each of tasks and tasks_archive.
+    """
+    rows = []
+    for model in (Task, ArchivedTask):
+        query = db.query(model.user_id, model.status, model.priority, func.count(model.id))
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        rows += query.group_by(model.user_id, model.status, model.priority).all()
+
+    counts = {}
+    for row_user_id, task_status, task_priority, count in rows:
+        stats = counts.setdefault(row_user_id, _empty_stats())
+        stats["status_stats"][TaskStatus(task_status).value] += count
+        stats["priority_stats"][TaskPriority(task_priority).value] += count
+        stats["total_tasks"] += count
+    return counts
+
+
+def _counter_values(user_id: int, stats: dict) -> dict:
+    return {
+        "user_id": user_id,
+        "total": stats["total_tasks"],
+        **{f"status_{value}": count for value, count in stats["status_stats"].items()},
+        **{f"priority_{value}": count for value, count in stats["priority_stats"].items()},
+    }
+
+
+def _counter_from_stats(user_id: int, stats: dict) -> UserTaskCounter:
+    return UserTaskCounter(**_counter_values(user_id, stats))
+
+
+def _seed_task_counter(db: Session, user_id: int) -> bool:
+    """Insert the user's counter row, counted from tasks, unless it exists; whether it was inserted"""
+    dialect_insert = _upsert_dialects.get(db.bind.dialect.name)
+    if dialect_insert is None:
+        rebuild_task_counters(db, user_id)
+        return True
+    stats = _count_tasks(db, user_id).get(user_id) or _empty_stats()
+    stmt = dialect_insert(UserTaskCounter.__table__).values(_counter_values(user_id, stats))
+    return db.execute(stmt.on_conflict_do_nothing(index_elements=[UserTaskCounter.user_id])).rowcount == 1
+
+
+def _stats_from_counter(counter: UserTaskCounter) -> dict:
+    return _format_stats(
+        {s.value: getattr(counter, f"status_{s.value}") for s in TaskStatus},
+        {p.value: getattr(counter, f"priority_{p.value}") for p in TaskPriority}
+    )
+
+
+def get_user_task_stats(db: Session, user_id: int) -> dict:
+    """Get task statistics for a user, from the counters table when enabled"""
+    if not settings.task_counters_enabled:
+        return _count_tasks(db, user_id).get(user_id) or _empty_stats()
+
+    counter = db.get(UserTaskCounter, user_id)
+    if counter is None:
+        # Reads never write: the row is seeded by the user's next task write, so
+        # concurrent first reads can't race each other to insert it
+        return _count_tasks(db, user_id).get(user_id) or _empty_stats()
+    return _stats_from_counter(counter)
+
+
+def record_task_change(db: Session, user_id: int, old: TaskKey = None, new: TaskKey = None):
+    """Apply a task write to the user's counters within the caller's transaction
+
+    Call after the write has been flushed and before commit, passing the
+    task's (status, priority) before and after the change.
+    """
+    record_task_changes(db, user_id, [(old, new)])
+
+
+def record_task_changes(db: Session, user_id: int, changes: Iterable[Tuple[TaskKey, TaskKey]]):
+    """Apply many (old, new) task writes to the user's counters in one UPDATE"""
+    if not settings.task_counters_enabled:
+        return
+
+    deltas = {}
+    for old, new in changes:
+        for key, step in ((old, -1), (new, 1)):
+            if key is None:
+                continue
+            task_status, task_priority = key
+            for column in (f"status_{TaskStatus(task_status).value}", f"priority_{TaskPriority(task_priority).value}", "total"):
+                deltas[column] = deltas.get(column, 0) + step
+
+    values = {
+        getattr(UserTaskCounter, column): getattr(UserTaskCounter, column) + delta
+        for column, delta in deltas.items() if delta
+    }
+    if not values:
+        return
+
+    counter = db.query(UserTaskCounter).filter(UserTaskCounter.user_id == user_id)
+    updated = counter.update(values, synchronize_session=False)
+
+    # No counter row yet - seed it from tasks, which already include these writes.
+    # A concurrent first write may seed it first without them; add them to its row then
+    if not updated:
+        db.flush()
+        if not _seed_task_counter(db, user_id):
+            counter.update(values, synchronize_session=False)
+
+
+def rebuild_task_counters(db: Session, user_id: Optional[int] = None):
+    """Recompute counters from the tasks table for one user, or for everyone on the session's shard
+
+    Returns the rebuilt counter when a single user is given. The caller commits.
+    """
+    counts = _count_tasks(db, user_id)
+
+    if user_id is not None:
+        counter = db.merge(_counter_from_stats(user_id, counts.get(user_id) or _empty_stats()))
+        db.flush()
+        return counter
+
+    db.query(UserTaskCounter).delete(synchronize_session=False)
+    for (row_user_id,) in db.execute(users_on_shard(db)).all():
+        db.add(_counter_from_stats(row_user_id, counts.get(row_user_id) or _empty_stats()))
+    db.flush()
+    return None
+
+
+if __name__ == "__main__":
+    # Consistency repair: python -m app.utils.task_stats
+    from ..database import shard_ids, shard_session
+    from .schema import ensure_schema
+
+    ensure_schema()
+    for shard in shard_ids():
+        db = shard_session(shard)
+        try:
+            rebuild_task_counters(db)
+            db.commit()
+        finally:
+            db.close()
+    print("Task counters rebuilt successfully!")
@@ -0,0 +1,188 @@
+import base64
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.task import Task
+from ..models.task_sync import TaskSyncLog
+from .task_stats import TaskKey
+from .task_versions import get_task_version
+
+sync_log_table = TaskSyncLog.__table__
+
+_upsert_dialects = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+# Tombstones removed per DELETE statement by the purge job
+PURGE_BATCH_ROWS = 5000
+
+# Tombstones are kept this long past the token lifetime, covering writes that
+# were still in flight when a token was issued
+PURGE_GRACE = timedelta(days=1)
+
+
+# Sync tokens: base64url-encoded JSON. "s" is the change sequence the client is
+# current to and "t" when the sync it continues began; a full sync in progress
+# also carries the keyset position "c"/"i" of its last row, a delta page the
+# task id "i" of its last row at sequence "s".
+def encode_sync_token(payload: dict) -> str:
+    data = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        int(payload["s"]), float(payload["t"])
+        return payload
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token"
+        )
+
+
+def record_sync_changes(db: Session, user_id: int, change_seq: int, changes: Iterable[Tuple[int, Tuple[TaskKey, TaskKey]]]):
+    """Stamp written tasks with the user's new version; deleted ones become tombstones"""
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"task_id": task_id, "user_id": user_id, "change_seq": change_seq, "deleted_at": now if new_key is None else None}
+        for task_id, (old_key, new_key) in changes
+    ]
+    if not rows:
+        return
+
+    dialect_insert = _upsert_dialects.get(db.bind.dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(sync_log_table)
+        # user_id too: a reused task id belongs to its new owner from now on
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[TaskSyncLog.task_id],
+            set_={"user_id": stmt.excluded.user_id, "change_seq": stmt.excluded.change_seq, "deleted_at": stmt.excluded.deleted_at}
+        ), rows)
+        return
+
+    for row in rows:
+        db.merge(TaskSyncLog(**row))
+    db.flush()
+
+
+def get_task_changes(db: Session, user_id: int, since: Optional[str], limit: int) -> dict:
+    """Tasks changed and deleted since a sync token, at most `limit` per call
+
+    Without a token this is a full sync of every task, paged by
+    (created_at, id). With one it is a range scan of the sync log past the
+    token's sequence. The user's version is read before any rows, so a write
+    committing meanwhile is at worst sent again on the next call, never missed.
+    """
+    now = time.time()
+    version = get_task_version(db, user_id)
+
+    if since is None:
+        token = {"s": version, "t": now}
+    else:
+        token = decode_sync_token(since)
+        # Tombstones are purged after the retention period, so an older token may
+        # have missed deletions
+        if now - token["t"] > settings.task_sync_retention_days * 86400:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Sync token has expired, start a full sync without `since`"
+            )
+
+    if since is None or "c" in token:
+        return _full_sync_page(db, user_id, token, limit)
+    return _delta_page(db, user_id, token, version, now, limit)
+
+
+def _full_sync_page(db: Session, user_id: int, token: dict, limit: int) -> dict:
+    query = db.query(Task).filter(Task.user_id == user_id)
+    if "c" in token:
+        created_at, task_id = datetime.fromisoformat(token["c"]), token["i"]
+        query = query.filter(
+            Task.created_at >= created_at,
+            or_(Task.created_at > created_at, Task.id > task_id)
+        )
+    tasks = query.order_by(Task.created_at, Task.id).limit(limit + 1).all()
+
+    has_more = len(tasks) > limit
+    tasks = tasks[:limit]
+    # Changes made during a full sync are picked up by the first delta after it
+    next_token = {"s": token["s"], "t": token["t"]}
+    if has_more:
+        next_token.update(c=tasks[-1].created_at.isoformat(), i=tasks[-1].id)
+    return {"tasks": tasks, "deleted": [], "next": encode_sync_token(next_token), "has_more": has_more}
+
+
+def _delta_page(db: Session, user_id: int, token: dict, version: int, now: float, limit: int) -> dict:
+    seq = token["s"]
+    query = (
+        select(TaskSyncLog.task_id, TaskSyncLog.change_seq, TaskSyncLog.deleted_at, Task)
+        .outerjoin(Task, and_(Task.id == TaskSyncLog.task_id, Task.user_id == user_id))
+        .where(TaskSyncLog.user_id == user_id)
+    )
+    if "i" in token:
+        # Part way through the tasks written at sequence `seq`
+        query = query.where(
+            TaskSyncLog.change_seq >= seq,
+            or_(TaskSyncLog.change_seq > seq, TaskSyncLog.task_id > token["i"])
+        )
+    else:
+        query = query.where(TaskSyncLog.change_seq > seq)
+    rows = db.execute(
+        query.order_by(TaskSyncLog.change_seq, TaskSyncLog.task_id).limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    tasks = [row.Task for row in rows if row.deleted_at is None and row.Task is not None]
+    deleted = [row.task_id for row in rows if row.deleted_at is not None]
+    if has_more:
+        next_token = {"s": rows[-1].change_seq, "i": rows[-1].task_id, "t": token["t"]}
+    else:
+        next_token = {"s": max(version, seq), "t": now}
+    return {"tasks": tasks, "deleted": deleted, "next": encode_sync_token(next_token), "has_more": has_more}
+
+
+def purge_tombstones(db: Session, older_than: timedelta) -> int:
+    """Delete tombstones older than `older_than` in batches and return how many went"""
+    cutoff = datetime.now(timezone.utc) - older_than
+    purged = 0
+    while True:
+        batch = select(TaskSyncLog.task_id).where(
+            TaskSyncLog.deleted_at.isnot(None), TaskSyncLog.deleted_at < cutoff
+        ).limit(PURGE_BATCH_ROWS)
+        result = db.execute(delete(sync_log_table).where(sync_log_table.c.task_id.in_(batch.scalar_subquery())))
+        db.commit()
+        purged += result.rowcount
+        if result.rowcount < PURGE_BATCH_ROWS:
+            return purged
+
+
+def count_tombstones(db: Session) -> int:
+    return db.query(func.count(TaskSyncLog.task_id)).filter(TaskSyncLog.deleted_at.isnot(None)).scalar()
+
+
+if __name__ == "__main__":
+    # Compaction job, e.g. daily from cron: python -m app.utils.task_sync
+    from ..database import shard_ids, shard_session
+    from .schema import ensure_schema
+
+    ensure_schema()
+    purged = remaining = 0
+    for shard in shard_ids():
+        db = shard_session(shard)
+        try:
+            purged += purge_tombstones(db, timedelta(days=settings.task_sync_retention_days) + PURGE_GRACE)
+            remaining += count_tombstones(db)
+        finally:
+            db.close()
+    print(f"Purged {purged} expired tombstones, {remaining} remain")
@@ -0,0 +1,91 @@
+import zlib
+from typing import Optional
+from fastapi import HTTPException, Response, status
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..models.task import Task
+from ..models.task_version import UserTaskVersion
+
+_upsert_dialects = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def get_task_version(db: Session, user_id: int) -> int:
+    """Current task list version for a user (a primary-key lookup)"""
+    return db.query(UserTaskVersion.version).filter(
+        UserTaskVersion.user_id == user_id
+    ).scalar() or 0
+
+
+def bump_task_version(db: Session, user_id: int) -> int:
+    """Increment the user's task list version within the caller's transaction
+
+    Returns the new version. The version row stays locked until commit, so
+    concurrent writers for one user commit in version order.
+    """
+    dialect_insert = _upsert_dialects.get(db.bind.dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(UserTaskVersion.__table__).values(user_id=user_id, version=1)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[UserTaskVersion.user_id],
+            set_={"version": UserTaskVersion.__table__.c.version + 1}
+        ))
+        return get_task_version(db, user_id)
+
+    updated = db.query(UserTaskVersion).filter(UserTaskVersion.user_id == user_id).update(
+        {UserTaskVersion.version: UserTaskVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.add(UserTaskVersion(user_id=user_id, version=1))
+        db.flush()
+    return get_task_version(db, user_id)
+
+
+def task_list_etag(user_id: int, version: int) -> str:
+    """Weak ETag shared by every task list view of a user at a given version"""
+    return f'W/"tasks-{user_id}-{version}"'
+
+
+def task_etag(task: Task) -> str:
+    """Weak ETag for a single task
+
+    Built from updated_at plus a checksum of the editable fields, since
+    SQLite timestamps only have one-second resolution.
+    """
+    changed_at = task.updated_at or task.created_at
+    fingerprint = zlib.crc32(repr((
+        task.title, task.description, task.status, task.priority, task.due_date
+    )).encode())
+    return f'W/"task-{task.id}-{changed_at:%Y%m%d%H%M%S}-{fingerprint:08x}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match / If-Match header against an ETag"""
+    if not header:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def check_if_match(if_match: Optional[str], task: Task):
+    """Reject a write whose If-Match header no longer matches the task"""
+    if if_match and not etag_matches(if_match, task_etag(task)):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Task has been modified"
+        )
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response for a matching If-None-Match"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from ..models.task import Task
+from .task_hooks import record_task_writes
+from .task_versions import check_if_match
+
+
+# Single-task writes shared by the task routes and the group-commit writer.
+# Each runs within the caller's transaction; the caller commits.
+def write_timestamp(db: Session) -> datetime:
+    """Now, in the form the database stores it
+
+    Timestamps set by the app rather than by the database need no SELECT to
+    read them back after the write.
+    """
+    now = datetime.now(timezone.utc)
+    if db.bind.dialect.name == "sqlite":
+        # CURRENT_TIMESTAMP: naive UTC, whole seconds
+        return now.replace(tzinfo=None, microsecond=0)
+    return now
+
+
+def get_task_for_write(db: Session, user_id: int, task_id: int) -> Task:
+    task = db.query(Task).filter(
+        and_(Task.id == task_id, Task.user_id == user_id)
+    ).first()
+
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+
+    return task
+
+
+def create_user_task(db: Session, user_id: int, data: dict) -> Task:
+    """Insert a task from TaskCreate fields"""
+    task = Task(**data, user_id=user_id, created_at=write_timestamp(db))
+    db.add(task)
+    db.flush()
+    record_task_writes(db, user_id, [(None, (task.status, task.priority))], [(task.id, task.due_date)], [task.id])
+    return task
+
+
+def update_user_task(db: Session, user_id: int, task_id: int, data: dict, if_match: Optional[str] = None) -> Task:
+    """Apply TaskUpdate fields to a task, checking If-Match first"""
+    task = get_task_for_write(db, user_id, task_id)
+    check_if_match(if_match, task)
+
+    old_key = (task.status, task.priority)
+    for field, value in data.items():
+        setattr(task, field, value)
+    task.updated_at = write_timestamp(db)
+
+    db.flush()
+    record_task_writes(db, user_id, [(old_key, (task.status, task.priority))], [(task.id, task.due_date)], [task.id])
+    return task
+
+
+def delete_user_task(db: Session, user_id: int, task_id: int, if_match: Optional[str] = None):
+    """Delete a task, checking If-Match first"""
+    task = get_task_for_write(db, user_id, task_id)
+    check_if_match(if_match, task)
+
+    old_key = (task.status, task.priority)
+    db.delete(task)
+    db.flush()
+    record_task_writes(db, user_id, [(old_key, None)], task_ids=[task_id])
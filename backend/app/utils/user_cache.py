@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.user import User, UserRole
+from .task_events import create_broker
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Detached, read-only copy of the User columns request handlers rely on"""
+    id: int
+    email: str
+    username: str
+    role: UserRole
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            role=user.role,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+        )
+
+
+class UserCache:
+    """Bounded LRU of verified bearer tokens to user snapshots with a TTL"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[UserSnapshot]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                expires_at, snapshot = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return snapshot
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def peek(self, token: str) -> Optional[UserSnapshot]:
+        """Cached snapshot for a token without counting a hit or refreshing its LRU position"""
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, token: str, snapshot: UserSnapshot, token_expires_at: Optional[float] = None):
+        """Cache a snapshot, never past the token's own expiry (a Unix timestamp)"""
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, snapshot)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached token that resolves to the given user"""
+        with self._lock:
+            stale = [token for token, (_, snapshot) in self._entries.items() if snapshot.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
+
+# Each worker caches on its own, so a committed change to a user is announced to
+# the others through the task events broker on a channel of its own
+user_invalidations = create_broker("user-invalidations")
+
+USER_CHANGED_EVENT = {"type": "user_changed"}
+
+
+def _invalidate_announced_user(user_id: int, events: List[dict]):
+    user_cache.invalidate_user(user_id)
+
+
+def start_user_invalidations():
+    """Start dropping users that other workers announce as changed"""
+    if user_cache.max_size > 0:
+        user_invalidations.start(_invalidate_announced_user)
+
+
+# Write-through invalidation: any flushed change to a user (role, email, deletion)
+# evicts it now and again once the transaction commits, so a request racing the
+# commit cannot leave a stale snapshot behind. The commit is also announced to
+# the other workers, which evict it as soon as the message arrives.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    user_cache.invalidate_user(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("invalidated_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop("invalidated_user_ids", ()):
+        user_cache.invalidate_user(user_id)
+        if user_cache.max_size > 0:
+            user_invalidations.publish(user_id, [USER_CHANGED_EVENT])
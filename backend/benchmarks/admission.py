@@ -0,0 +1,116 @@
+"""Cost of admission control, and a well-behaved user's latency next to an abusive one.
+
+First times the middleware's checks in-process (rate limit lookup, user
+cache peek, slot acquire/release) and exits non-zero if a request costs more
+than --budget-us. Then starts uvicorn with admission control off and on and,
+for a fixed period, runs one user's script hammering GET /api/tasks from many
+connections alongside other users polling at a normal pace. All clients share
+127.0.0.1, so the run limits per user only (RATE_LIMITS=/api/tasks=user:20/s).
+
+    cd backend && python -m benchmarks.admission
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+from .common import free_port, percentile, seed, start_server, use_scratch_database
+
+RATE_LIMITS = "/api/tasks=user:20/s"
+
+
+def check_cost(iterations: int) -> float:
+    """Microseconds the middleware spends admitting one request"""
+    from app.utils.admission import AdmissionController, _user_id, parse_rate_limits
+    from app.utils.user_cache import UserSnapshot, user_cache
+    from app.models import UserRole
+    from app.config import settings
+
+    controller = AdmissionController(parse_rate_limits(settings.rate_limits), 64, 256, 2.0)
+    user_cache.set("bench-token", UserSnapshot(1, "bench@example.com", "bench", UserRole.user, None, None))
+    scope = {
+        "type": "http", "method": "GET", "path": "/api/tasks", "client": ("10.0.0.1", 5000),
+        "headers": [(b"host", b"localhost"), (b"accept", b"*/*"), (b"authorization", b"Bearer bench-token")],
+    }
+
+    async def run():
+        # Spread the requests over enough users and addresses that no bucket runs dry
+        t0 = time.perf_counter()
+        for n in range(iterations):
+            controller.check_rate(scope["method"], scope["path"], f"10.0.{n % 250}.1", _user_id(scope) + n % 1000)
+            await controller.acquire()
+            controller.release()
+        return (time.perf_counter() - t0) / iterations * 1e6
+
+    return asyncio.run(run())
+
+
+async def run_phase(base_url: str, abuser: dict, users: list, abusive_clients: int, seconds: float):
+    import httpx
+
+    latencies = []
+    polite = Counter()
+    abusive = Counter()
+    stop_at = time.monotonic() + seconds
+
+    async def polite_client(client, user):
+        headers = {"Authorization": f"Bearer {user['token']}"}
+        while time.monotonic() < stop_at:
+            t0 = time.perf_counter()
+            response = await client.get("/api/tasks", params={"limit": 20}, headers=headers)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            polite[response.status_code] += 1
+            await asyncio.sleep(0.1)
+
+    async def abusive_client(client):
+        # Ignores Retry-After, as a runaway script would
+        headers = {"Authorization": f"Bearer {abuser['token']}"}
+        while time.monotonic() < stop_at:
+            response = await client.get("/api/tasks", params={"limit": 100}, headers=headers)
+            abusive[response.status_code] += 1
+
+    limits = httpx.Limits(max_connections=len(users) + abusive_clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await asyncio.gather(
+            *(polite_client(client, user) for user in users),
+            *(abusive_client(client) for _ in range(abusive_clients)),
+        )
+    return latencies, polite, abusive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--budget-us", type=float, default=20.0)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--abusive-clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    database_url = use_scratch_database()
+    cost = check_cost(args.iterations)
+    print(f"admission check: {cost:.2f} us per request (budget {args.budget_us} us)")
+
+    abuser, *users = seed(args.users + 1, 2000)
+    print(f"{'admission':>9} {'p50 ms':>8} {'p99 ms':>8} {'polite 429s':>12} {'abusive ok/s':>13} {'abusive 429/s':>14}")
+    for enabled in ("false", "true"):
+        port = free_port()
+        server = start_server({"DATABASE_URL": database_url, "ADMISSION_ENABLED": enabled, "RATE_LIMITS": RATE_LIMITS}, port)
+        try:
+            latencies, polite, abusive = asyncio.run(run_phase(
+                f"http://127.0.0.1:{port}", abuser, users, args.abusive_clients, args.seconds
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{'on' if enabled == 'true' else 'off':>9} {percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>8.1f} "
+              f"{polite[429]:>12} {abusive[200] / args.seconds:>13.1f} {abusive[429] / args.seconds:>14.1f}")
+
+    if cost > args.budget_us:
+        print(f"FAIL: the admission check costs {cost:.2f} us, over the {args.budget_us} us budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Admin task analytics from the rollup tables against scanning tasks.
+
+Seeds --users x --tasks-per-user tasks spread over one year, backfills the
+rollups, then times a year of daily created/completed counts and the totals
+both ways: from the rollups through the admin endpoints, and with the GROUP BY
+over tasks they replace. Also times single task creates with rollup
+maintenance on and off. Exits non-zero if the two answers differ.
+
+    cd backend && python -m benchmarks.analytics
+"""
+import argparse
+import logging
+import statistics
+import sys
+import time
+
+from .common import seed, use_scratch_database
+
+YEAR_START = "2024-01-01T00:00:00"
+YEAR_END = "2025-01-01T00:00:00"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--tasks-per-user", type=int, default=25_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--writes", type=int, default=300)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    from app.config import settings
+    from app.database import SessionLocal, engine
+    from app.main import app
+    from app.utils.task_rollups import backfill_task_rollups
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    t0 = time.perf_counter()
+    admin = seed(args.users, args.tasks_per_user)[0]
+    total = args.users * args.tasks_per_user
+    with engine.begin() as connection:
+        # Spread the tasks evenly over the year; done ones were finished a day after creation
+        connection.execute(text(
+            "UPDATE tasks SET created_at = datetime('2024-01-01', '+' || ((id - 1) * 31535999 / :total) || ' seconds')"
+        ), {"total": total})
+        connection.execute(text(
+            "UPDATE tasks SET updated_at = datetime(created_at, '+1 day') WHERE status = 'done'"
+        ))
+        connection.execute(text("UPDATE users SET role = 'admin' WHERE id = :id"), {"id": admin["id"]})
+    print(f"seeded {total} tasks in {time.perf_counter() - t0:.1f}s")
+
+    with SessionLocal() as db:
+        t0 = time.perf_counter()
+        rows = backfill_task_rollups(db)
+        db.commit()
+        print(f"backfill: {rows} hourly rollup rows in {time.perf_counter() - t0:.1f}s")
+
+    def median_ms(run):
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            result = run()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples), result
+
+    def scan_daily():
+        with engine.connect() as connection:
+            created = dict(connection.execute(text(
+                "SELECT strftime('%Y-%m-%d', created_at) AS day, count(*) FROM tasks "
+                "WHERE created_at >= '2024-01-01' AND created_at < '2025-01-01' GROUP BY day"
+            )).all())
+            completed = dict(connection.execute(text(
+                "SELECT strftime('%Y-%m-%d', updated_at) AS day, count(*) FROM tasks "
+                "WHERE status = 'done' AND updated_at >= '2024-01-01' AND updated_at < '2025-01-01' GROUP BY day"
+            )).all())
+        return {day: (created.get(day, 0), completed.get(day, 0)) for day in created.keys() | completed.keys()}
+
+    def scan_totals():
+        with engine.connect() as connection:
+            return connection.execute(text(
+                "SELECT count(*), sum(status = 'done') FROM tasks WHERE created_at >= '2024-01-01' AND created_at < '2025-01-01'"
+            )).one()
+
+    headers = {"Authorization": f"Bearer {admin['token']}"}
+    year = {"start": YEAR_START, "end": YEAR_END}
+    failed = False
+    with TestClient(app) as client:
+        def rollup_daily():
+            response = client.get("/api/admin/analytics/tasks", params=year, headers=headers)
+            assert response.status_code == 200, response.text
+            return {
+                bucket["bucket"][:10]: (bucket["created"], bucket["completed"]) for bucket in response.json()["buckets"]
+                if bucket["created"] or bucket["completed"]
+            }
+
+        def rollup_totals():
+            response = client.get("/api/admin/analytics/tasks/totals", params=year, headers=headers)
+            assert response.status_code == 200, response.text
+            return response.json()
+
+        results = {}
+        results["scan daily"], scanned = median_ms(scan_daily)
+        results["rollup daily"], rolled = median_ms(rollup_daily)
+        results["scan totals"], scanned_totals = median_ms(scan_totals)
+        results["rollup totals"], rolled_totals = median_ms(rollup_totals)
+        if scanned != rolled:
+            print(f"FAIL: daily counts differ on {len(set(scanned.items()) ^ set(rolled.items()))} days")
+            failed = True
+        if scanned_totals[0] != rolled_totals["created"]:
+            print(f"FAIL: {scanned_totals[0]} tasks created by the scan, {rolled_totals['created']} by the rollups")
+            failed = True
+
+        writer = {"Authorization": f"Bearer {seed_writer(client)}"}
+        for enabled in (False, True):
+            settings.task_rollups_enabled = enabled
+            samples = []
+            for n in range(args.writes):
+                t0 = time.perf_counter()
+                response = client.post("/api/tasks", json={"title": f"write {n}"}, headers=writer)
+                samples.append((time.perf_counter() - t0) * 1000)
+                assert response.status_code == 201, response.text
+            results[f"create, rollups {'on' if enabled else 'off'}"] = statistics.median(samples)
+
+    print(f"{len(rolled)} days, median of {args.repeat} (creates: of {args.writes})")
+    for name, ms in results.items():
+        print(f"{name:<22} {ms:>9.2f} ms")
+    print(f"rollups answer the daily series {results['scan daily'] / results['rollup daily']:.0f}x "
+          f"and the totals {results['scan totals'] / results['rollup totals']:.0f}x faster than scanning")
+    if failed:
+        sys.exit(1)
+
+
+def seed_writer(client) -> str:
+    """Register a user with no tasks and return its token"""
+    credentials = {"email": "writer@example.com", "username": "writer", "password": "benchpass"}
+    assert client.post("/api/auth/register", json=credentials).status_code == 200
+    return client.post("/api/auth/login", json=credentials).json()["access_token"]
+
+
+if __name__ == "__main__":
+    main()
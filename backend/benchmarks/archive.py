@@ -0,0 +1,103 @@
+"""Measure the hot table before and after archiving completed tasks.
+
+Seeds users whose tasks are one third done (all done long ago), times the
+task list, a deep list page and the stats summary, runs the archiver, then
+times them again along with include_archived=true. Exits non-zero if the
+stats or the include_archived list differ from before archiving.
+
+    cd backend && python -m benchmarks.archive
+"""
+import argparse
+import logging
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from .common import seed, use_scratch_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    from fastapi.testclient import TestClient
+    from app.database import SessionLocal, engine
+    from app.main import app
+    from app.utils.task_archive import archive_done_tasks, count_archived_tasks
+    from app.utils.task_search import rebuild_search_index
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    user = seed(args.users, args.tasks_per_user)[0]
+    # Seeded rows bypass the search triggers; index them so deletes stay consistent
+    rebuild_search_index(engine)
+    headers = {"Authorization": f"Bearer {user['token']}"}
+
+    requests = {
+        "list": ("/api/tasks", {}),
+        "list todo,in_progress": ("/api/tasks", {"status": "todo,in_progress"}),
+        "list skip=5000": ("/api/tasks", {"skip": 5000}),
+        "stats": ("/api/tasks/stats/summary", {}),
+    }
+
+    def timed(client, path, params):
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            response = client.get(path, params=params, headers=headers)
+            samples.append((time.perf_counter() - t0) * 1000)
+            assert response.status_code == 200, response.text
+        return statistics.median(samples)
+
+    def everything(client):
+        """Every task with include_archived=true, following the cursor"""
+        titles, params = [], {"include_archived": "true"}
+        while True:
+            response = client.get("/api/tasks", params=params, headers=headers)
+            titles += [task["title"] for task in response.json()]
+            if "x-next-cursor" not in response.headers:
+                return titles
+            params["cursor"] = response.headers["x-next-cursor"]
+
+    with TestClient(app) as client:
+        before = {name: timed(client, *request) for name, request in requests.items()}
+        stats_before = client.get("/api/tasks/stats/summary", headers=headers).json()
+        all_before = everything(client)
+
+        with SessionLocal() as db:
+            t0 = time.perf_counter()
+            archived = archive_done_tasks(db, timedelta(days=1), args.batch_size)
+            elapsed = time.perf_counter() - t0
+            total = count_archived_tasks(db)
+
+        after = {name: timed(client, *request) for name, request in requests.items()}
+        after["list include_archived"] = timed(client, "/api/tasks", {"include_archived": "true"})
+        stats_after = client.get("/api/tasks/stats/summary", headers=headers).json()
+        all_after = everything(client)
+
+    print(f"{args.users} users x {args.tasks_per_user} tasks, median of {args.repeat}")
+    print(f"archived {archived} tasks ({total} in the archive) in {elapsed:.1f}s, {archived / elapsed:,.0f} tasks/s")
+    print(f"{'':<24} {'before ms':>10} {'after ms':>10}")
+    for name, ms in after.items():
+        print(f"{name:<24} {before.get(name, float('nan')):>10.2f} {ms:>10.2f}")
+
+    failures = []
+    if stats_after != stats_before:
+        failures.append(f"stats changed: {stats_before} -> {stats_after}")
+    if all_after != all_before:
+        failures.append(f"include_archived list changed: {len(all_before)} -> {len(all_after)} tasks")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: stats and the include_archived list are unchanged by archiving")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compare the sync (threadpool) and async (AsyncSession) request paths.
+
+Starts uvicorn once per mode against the same seeded SQLite database and
+fires bursts of concurrent GET /api/tasks and GET /api/tasks/stats/summary
+requests at increasing concurrency.
+
+    cd backend && python -m benchmarks.async_concurrency
+"""
+import argparse
+import asyncio
+import time
+
+from .common import free_port, percentile, seed, start_server, use_scratch_database
+
+
+async def burst(base_url: str, users: list, concurrency: int, requests: int):
+    import httpx
+
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for n in range(requests):
+        user = users[n % len(users)]
+        path = "/api/tasks/stats/summary" if n % 4 == 0 else "/api/tasks?limit=50"
+        queue.put_nowait((path, {"Authorization": f"Bearer {user['token']}"}))
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            path, headers = queue.get_nowait()
+            t0 = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return requests / elapsed, percentile(latencies, 50), percentile(latencies, 99), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    database_url = use_scratch_database()
+    users = seed(args.users, args.tasks_per_user)
+
+    print(f"{'mode':>6} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, enabled in (("sync", "false"), ("async", "true")):
+        port = free_port()
+        server = start_server({"DATABASE_URL": database_url, "ASYNC_DB_ENABLED": enabled}, port)
+        try:
+            for concurrency in args.concurrency:
+                rps, p50, p99, errors = asyncio.run(
+                    burst(f"http://127.0.0.1:{port}", users, concurrency, args.requests)
+                )
+                print(f"{mode:>6} {concurrency:>5} {rps:>9.1f} {p50:>8.2f} {p99:>8.2f} {errors:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
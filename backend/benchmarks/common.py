@@ -0,0 +1,130 @@
+"""Shared helpers for the benchmark scripts.
+
+The app reads its settings at import time, so scripts call
+use_scratch_database() before importing anything from `app`.
+"""
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Words seeded task titles and descriptions are drawn from
+VOCABULARY = (
+    "login signup billing invoice report dashboard export import search filter "
+    "deploy release rollback migration database index cache queue worker email "
+    "notification payment refund customer onboarding bug crash timeout latency "
+    "mobile android ios browser layout design review docs backlog sprint"
+).split()
+
+
+def use_scratch_database(name: str = "bench.db") -> str:
+    """Point DATABASE_URL at a fresh SQLite file and return its URL
+
+    Also turns admission control off unless ADMISSION_ENABLED is set, since a
+    benchmark's single client would otherwise be rate limited.
+    """
+    os.environ.setdefault("ADMISSION_ENABLED", "false")
+    db_file = os.path.join(tempfile.mkdtemp(), name)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+    return os.environ["DATABASE_URL"]
+
+
+def seed(users: int, tasks_per_user: int, batch_size: int = 5000) -> List[dict]:
+    """Create users with tasks directly through the models
+
+    Returns one {"id", "email", "password", "token"} dict per user.
+    """
+    from app.database import SessionLocal, create_tables
+    from app.models import Task, TaskPriority, TaskStatus, User
+    from app.utils.auth import create_access_token, get_password_hash
+    from app.utils.shards import allocate_task_ids
+
+    def insert_tasks(rows):
+        # Bulk inserts skip the ORM hook that takes ids from the task id sequence
+        first_id = allocate_task_ids(db.connection(), len(rows))
+        if first_id is not None:
+            for offset, row in enumerate(rows):
+                row["id"] = first_id + offset
+        db.bulk_insert_mappings(Task, rows)
+
+    create_tables()
+    words = random.Random(0)
+    statuses = list(TaskStatus)
+    priorities = list(TaskPriority)
+    start = datetime(2024, 1, 1)
+    seeded = []
+    db = SessionLocal()
+    try:
+        for n in range(users):
+            email = f"bench{n}@example.com"
+            user = User(email=email, username=f"bench{n}", hashed_password=get_password_hash("benchpass"))
+            db.add(user)
+            db.flush()
+            seeded.append({
+                "id": user.id,
+                "email": email,
+                "password": "benchpass",
+                "token": create_access_token({"sub": email}, timedelta(days=1)),
+            })
+            rows = []
+            for i in range(tasks_per_user):
+                rows.append({
+                    "title": f"Task {i} {words.choice(VOCABULARY)}",
+                    "description": " ".join(words.choices(VOCABULARY, k=12)) + f" ref{words.randrange(100_000)}",
+                    "status": statuses[i % len(statuses)],
+                    "priority": priorities[i % len(priorities)],
+                    "user_id": user.id,
+                    "created_at": start + timedelta(seconds=i),
+                    "due_date": start + timedelta(days=i % 365),
+                })
+                if len(rows) >= batch_size:
+                    insert_tasks(rows)
+                    rows = []
+            if rows:
+                insert_tasks(rows)
+        db.commit()
+    finally:
+        db.close()
+    return seeded
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env: dict, port: int, workers: int = 1) -> subprocess.Popen:
+    """Run uvicorn on localhost with extra environment and wait until it answers"""
+    import httpx
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("server did not start")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,89 @@
+"""Concurrent writers against a multi-worker server on one SQLite file.
+
+Runs uvicorn with several worker processes (like gunicorn.conf.py) and has
+many clients create, update and list tasks at once. Exits non-zero if any
+request fails, e.g. with "database is locked".
+
+    cd backend && python -m benchmarks.concurrent_writers
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from .common import free_port, percentile, seed, start_server, use_scratch_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra server environment, e.g. SQLITE_JOURNAL_MODE=delete")
+    args = parser.parse_args()
+
+    import httpx
+
+    # Seeding opens the database too, so it runs under the same settings as the server
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    os.environ.update(extra_env)
+    database_url = use_scratch_database()
+    users = seed(args.clients, 50)
+    port = free_port()
+    env = {"DATABASE_URL": database_url, **extra_env}
+    server = start_server(env, port, workers=args.workers)
+
+    outcomes = Counter()
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def client(user):
+        headers = {"Authorization": f"Bearer {user['token']}"}
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", headers=headers, timeout=60) as http:
+            n = 0
+            while time.monotonic() < deadline:
+                n += 1
+                t0 = time.perf_counter()
+                try:
+                    created = http.post("/api/tasks", json={"title": f"stress {n}", "priority": "high"})
+                    responses = [created]
+                    if created.status_code == 201:
+                        task_id = created.json()["id"]
+                        responses.append(http.put(f"/api/tasks/{task_id}", json={"status": "done"}))
+                    responses.append(http.get("/api/tasks", params={"limit": 20}))
+                    outcome = Counter(str(r.status_code) for r in responses)
+                except httpx.HTTPError as e:
+                    outcome = Counter({type(e).__name__: 1})
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    outcomes.update(outcome)
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(user,)) for user in users]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    total = sum(outcomes.values())
+    failures = total - outcomes["200"] - outcomes["201"]
+    print(f"{args.workers} workers, {args.clients} clients, {args.seconds:.0f}s")
+    print(f"requests: {total} ({total / args.seconds:.0f}/s), outcomes: {dict(outcomes)}")
+    print(f"create+update+list p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.0f} ms")
+    if failures:
+        print(f"FAIL: {failures} failed requests")
+        sys.exit(1)
+    print("OK: no failed requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compare a full resync with a delta sync after a few changes.
+
+Seeds one user with many tasks, takes a full sync through
+GET /api/tasks/changes, then makes a handful of writes (the changes an
+idle client would miss over a minute) and times fetching them with the
+token versus downloading the whole list again.
+
+    cd backend && python -m benchmarks.delta_sync
+"""
+import argparse
+import logging
+import statistics
+import time
+
+from .common import seed, use_scratch_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=50_000)
+    parser.add_argument("--changes", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    from fastapi.testclient import TestClient
+    from app.database import engine
+    from app.main import app
+    from app.utils.task_search import rebuild_search_index
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    user = seed(1, args.tasks)[0]
+    # Seeded rows bypass the search triggers; index them so deletes stay consistent
+    rebuild_search_index(engine)
+    headers = {"Authorization": f"Bearer {user['token']}"}
+
+    def sync(client, since=None):
+        """Follow has_more to the end; returns (token, rows, bytes, requests)"""
+        rows = size = requests = 0
+        while True:
+            params = {"limit": args.page_size}
+            if since:
+                params["since"] = since
+            response = client.get("/api/tasks/changes", params=params, headers=headers)
+            assert response.status_code == 200, response.text
+            body = response.json()
+            rows += len(body["tasks"]) + len(body["deleted"])
+            size += len(response.content)
+            requests += 1
+            since = body["next"]
+            if not body["has_more"]:
+                return since, rows, size, requests
+
+    def timed(client, since=None):
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            result = sync(client, since)
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples), result
+
+    with TestClient(app) as client:
+        token = sync(client)[0]
+        task_ids = [task["id"] for task in client.get("/api/tasks", params={"limit": args.changes}, headers=headers).json()]
+        for n, task_id in enumerate(task_ids):
+            if n % 5 == 4:
+                client.delete(f"/api/tasks/{task_id}", headers=headers)
+            else:
+                client.put(f"/api/tasks/{task_id}", json={"status": "done"}, headers=headers)
+
+        full_ms, (_, full_rows, full_bytes, full_requests) = timed(client)
+        delta_ms, (_, delta_rows, delta_bytes, delta_requests) = timed(client, token)
+
+    print(f"{args.tasks} tasks, {args.changes} changed since the last sync, median of {args.repeat}")
+    print(f"{'':>6} {'ms':>10} {'rows':>8} {'bytes':>12} {'requests':>9}")
+    print(f"{'full':>6} {full_ms:>10.1f} {full_rows:>8} {full_bytes:>12} {full_requests:>9}")
+    print(f"{'delta':>6} {delta_ms:>10.1f} {delta_rows:>8} {delta_bytes:>12} {delta_requests:>9}")
+    print(f"delta sync is {full_ms / delta_ms:.0f}x faster and {full_bytes / delta_bytes:.0f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
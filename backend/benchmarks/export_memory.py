@@ -0,0 +1,70 @@
+"""Check that GET /api/tasks/export streams in constant memory.
+
+Seeds one user with --rows tasks (1M by default), starts uvicorn, downloads
+the export and compares the server's peak RSS against its RSS before the
+download. Exits non-zero if the growth exceeds --max-rss-mb.
+
+    cd backend && python -m benchmarks.export_memory
+"""
+import argparse
+import sys
+import time
+
+from .common import free_port, seed, start_server, use_scratch_database
+
+
+def read_status_kb(pid: int, field: str) -> int:
+    """Read a memory field (VmRSS, VmHWM) from /proc in kB"""
+    with open(f"/proc/{pid}/status") as status_file:
+        for line in status_file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--max-rss-mb", type=float, default=64)
+    args = parser.parse_args()
+
+    import httpx
+
+    database_url = use_scratch_database()
+    user = seed(1, args.rows)[0]
+
+    port = free_port()
+    server = start_server({"DATABASE_URL": database_url}, port)
+    try:
+        headers = {"Authorization": f"Bearer {user['token']}"}
+        url = f"http://127.0.0.1:{port}/api/tasks/export"
+        # Warm up imports and caches so they don't count as export growth
+        httpx.get(f"http://127.0.0.1:{port}/api/tasks?limit=1", headers=headers)
+        baseline_kb = read_status_kb(server.pid, "VmRSS")
+
+        lines = 0
+        t0 = time.perf_counter()
+        with httpx.stream("GET", url, params={"format": args.format}, headers=headers, timeout=None) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                lines += chunk.count(b"\n")
+        elapsed = time.perf_counter() - t0
+        peak_kb = read_status_kb(server.pid, "VmHWM")
+    finally:
+        server.terminate()
+        server.wait()
+
+    growth_mb = (peak_kb - baseline_kb) / 1024
+    expected = args.rows + (1 if args.format == "csv" else 0)
+    print(f"exported {lines} lines in {elapsed:.1f}s ({lines / elapsed:,.0f} rows/s)")
+    print(f"server RSS before {baseline_kb / 1024:.1f} MB, peak {peak_kb / 1024:.1f} MB, growth {growth_mb:.1f} MB")
+    if lines != expected:
+        sys.exit(f"FAIL: expected {expected} lines")
+    if growth_mb > args.max_rss_mb:
+        sys.exit(f"FAIL: RSS grew by more than {args.max_rss_mb} MB")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
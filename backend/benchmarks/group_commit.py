@@ -0,0 +1,163 @@
+"""Task create throughput with group commit off and at several batch windows.
+
+For each setting a server is started on the same database and --clients
+clients create tasks as fast as they can for --seconds. With group commit on,
+one writer per worker commits the creates queued within the window together,
+so the writes share a commit (and, with SQLITE_SYNCHRONOUS=full, an fsync).
+Reports writes/s, latency and the average batch from /metrics. First checks
+in-process that a batch's writes run in one transaction and share one commit.
+Exits non-zero if they don't, or if any create fails.
+
+    cd backend && python -m benchmarks.group_commit
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from .common import free_port, percentile, seed, start_server, use_scratch_database
+
+
+def _metric(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    return 0.0
+
+
+def check_grouping(user_id: int, writes: int = 8) -> bool:
+    """Commit one batch in-process and check its savepoints ran inside one transaction"""
+    from sqlalchemy import event
+    from app.database import engine
+    from app.utils.group_commit import GroupCommitWriter
+    from app.utils.task_writes import create_user_task
+
+    savepoints = []
+    commits = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SAVEPOINT"):
+            savepoints.append(conn.connection.dbapi_connection.in_transaction)
+
+    def commit(conn):
+        commits.append(conn)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "commit", commit)
+    # A long window, so every write lands in the same batch
+    writer = GroupCommitWriter(window_ms=500, max_batch=writes)
+    try:
+        futures = [writer.submit(None, False, create_user_task, user_id, {"title": f"grouped {n}"}) for n in range(writes)]
+        for future in futures:
+            future.result()
+    finally:
+        writer.stop()
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        event.remove(engine, "commit", commit)
+    grouped = len(savepoints) == writes and all(savepoints) and len(commits) == 1
+    print(f"one batch of {writes}: {len(commits)} commit(s), "
+          f"{sum(savepoints)}/{len(savepoints)} savepoints inside the transaction")
+    return grouped
+
+
+def run(window, database_url: str, users: list, args) -> dict:
+    """Drive one server; window None means group commit off"""
+    import httpx
+
+    env = {
+        "DATABASE_URL": database_url,
+        "GROUP_COMMIT_ENABLED": "false" if window is None else "true",
+        "GROUP_COMMIT_WINDOW_MS": str(window or 0),
+    }
+    port = free_port()
+    server = start_server(env, port, workers=args.workers)
+
+    outcomes = Counter()
+    latencies = []
+    lock = threading.Lock()
+    start_at = time.monotonic() + 1
+    deadline = start_at + args.seconds
+
+    def client(user):
+        headers = {"Authorization": f"Bearer {user['token']}"}
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", headers=headers, timeout=60) as http:
+            time.sleep(max(0.0, start_at - time.monotonic()))
+            n = 0
+            while time.monotonic() < deadline:
+                n += 1
+                t0 = time.perf_counter()
+                try:
+                    outcome = str(http.post("/api/tasks", json={"title": f"write {n}"}).status_code)
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    outcomes[outcome] += 1
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(user,)) for user in users]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics = httpx.get(f"http://127.0.0.1:{port}/metrics").text
+    finally:
+        server.terminate()
+        server.wait()
+
+    batches = _metric(metrics, "group_commit_batches_total")
+    return {
+        "writes": outcomes["201"] / args.seconds,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        # /metrics answers from one worker, so with several workers this is that worker's average
+        "batch": _metric(metrics, "group_commit_writes_total") / batches if batches else 1.0,
+        "failures": sum(outcomes.values()) - outcomes["201"],
+        "outcomes": dict(outcomes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5, 10],
+                        help="GROUP_COMMIT_WINDOW_MS values to run after the group-commit-off baseline")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--synchronous", default="full",
+                        help="SQLITE_SYNCHRONOUS for the run; full makes every commit wait for its fsync")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "SQLITE_SYNCHRONOUS": args.synchronous,
+        "TASK_EVENTS_ENABLED": "false",
+        "REMINDERS_ENABLED": "false",
+    })
+    database_url = use_scratch_database()
+    users = seed(args.clients, 0)
+
+    print(f"{args.workers} workers, {args.clients} clients, {args.seconds:.0f}s each, "
+          f"synchronous={args.synchronous}, {os.cpu_count()} CPUs")
+    print(f"{'window':>8} {'writes/s':>9} {'speedup':>8} {'p50 ms':>7} {'p99 ms':>7} {'batch':>6}")
+    failed = not check_grouping(users[0]["id"])
+    if failed:
+        print("FAIL: the batch's writes did not share one transaction")
+    baseline = None
+    for window in [None, *args.windows]:
+        result = run(window, database_url, users, args)
+        baseline = baseline or result["writes"]
+        label = "off" if window is None else f"{window:g} ms"
+        print(f"{label:>8} {result['writes']:>9.0f} {result['writes'] / baseline:>7.2f}x "
+              f"{result['p50']:>7.1f} {result['p99']:>7.1f} {result['batch']:>6.1f}")
+        if result["failures"]:
+            print(f"FAIL: {result['failures']} failed creates with window {label}: {result['outcomes']}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compare offset and keyset pagination latency on GET /api/tasks.
+
+Seeds a throwaway SQLite database with one user owning enough tasks to reach
+page 1000, then times the same page fetched both ways.
+
+    cd backend && python -m benchmarks.keyset_pagination
+"""
+import argparse
+import logging
+import statistics
+import time
+
+from .common import seed, use_scratch_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=25)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.database import SessionLocal
+    from app.models import Task
+    from app.utils.pagination import encode_cursor
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    total = args.page_size * max(args.pages)
+    user = seed(1, total)[0]
+
+    # Cursor for page N is the sort key of the last row on page N - 1
+    db = SessionLocal()
+    ordered = db.query(Task.created_at, Task.id).filter(Task.user_id == user["id"]) \
+        .order_by(Task.created_at.desc(), Task.id.desc())
+    cursors = {}
+    for page in args.pages:
+        if page > 1:
+            row = ordered.offset((page - 1) * args.page_size - 1).first()
+            cursors[page] = encode_cursor(row.created_at, row.id)
+    db.close()
+
+    headers = {"Authorization": f"Bearer {user['token']}"}
+
+    def timed(client, params):
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            response = client.get("/api/tasks", params=params, headers=headers)
+            samples.append((time.perf_counter() - t0) * 1000)
+            assert response.status_code == 200, response.text
+        return statistics.median(samples)
+
+    print(f"{total} tasks, page size {args.page_size}, median of {args.repeat} requests")
+    print(f"{'page':>6} {'offset ms':>10} {'keyset ms':>10}")
+    with TestClient(app) as client:
+        for page in args.pages:
+            offset_ms = timed(client, {"limit": args.page_size, "skip": (page - 1) * args.page_size})
+            keyset_params = {"limit": args.page_size}
+            if page in cursors:
+                keyset_params["cursor"] = cursors[page]
+            keyset_ms = timed(client, keyset_params)
+            print(f"{page:>6} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
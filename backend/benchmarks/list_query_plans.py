@@ -0,0 +1,87 @@
+"""Check that every task list filter/sort combination is served by an index.
+
+Seeds a SQLite database, runs ANALYZE, then builds each combination of the
+list filters and sort orders through filter_task_list()/paginate_task_list()
+exactly as the routers do and prints its EXPLAIN QUERY PLAN. Exits non-zero
+if any plan scans the tasks table or a whole index instead of searching it,
+or sorts the matching rows in a temp B-tree instead of reading them in order.
+
+    cd backend && python -m benchmarks.list_query_plans
+"""
+import argparse
+import itertools
+import sys
+from datetime import datetime
+
+from .common import seed, use_scratch_database
+
+FILTERS = {
+    "none": {},
+    "status": {"status": "todo"},
+    "status list": {"status": "todo,in_progress"},
+    "priority": {"priority": "high"},
+    "priority list": {"priority": "high,critical"},
+    "status + priority": {"status": "todo", "priority": "high"},
+    "due range": {"due_after": datetime(2024, 3, 1), "due_before": datetime(2024, 4, 1)},
+    "status list + due range": {"status": "todo,in_progress", "due_after": datetime(2024, 3, 1), "due_before": datetime(2024, 4, 1)},
+}
+
+SORTS = ("created_at", "updated_at", "due_date", "priority")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=5_000)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    from sqlalchemy import event, select, text
+    from app.database import SessionLocal, engine
+    from app.models import Task
+    from app.utils.pagination import encode_cursor
+    from app.utils.task_queries import TASK_COLUMNS, due_task_list, filter_task_list, paginate_task_list
+
+    user = seed(args.users, args.tasks_per_user)[0]
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+
+    explaining = False
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if explaining:
+            statement = "EXPLAIN QUERY PLAN " + statement
+        return statement, parameters
+
+    base = select(*TASK_COLUMNS).where(Task.user_id == user["id"])
+    queries = {}
+    for (filter_name, filters), sort in itertools.product(FILTERS.items(), SORTS):
+        query = filter_task_list(base, filters.get("status"), filters.get("priority"),
+                                 filters.get("due_after"), filters.get("due_before"), sort=sort)
+        queries[f"{filter_name}, sort={sort}"] = paginate_task_list(query, 0, 100, None, sort)
+        if sort == "created_at":
+            cursor = encode_cursor(datetime(2024, 1, 1, 0, 30), 1000)
+            queries[f"{filter_name}, cursor page"] = paginate_task_list(query, 0, 100, cursor, sort)
+    queries["due in 7 days"] = due_task_list(base, datetime(2024, 3, 1), datetime(2024, 3, 8)).limit(100)
+    queries["overdue"] = due_task_list(base, None, datetime(2024, 3, 1)).limit(100)
+
+    failures = 0
+    with SessionLocal() as db:
+        explaining = True
+        for name, query in queries.items():
+            plan = [row[-1] for row in db.execute(query)]
+            bad = [step for step in plan if step.startswith("SCAN") or "TEMP B-TREE" in step]
+            failures += bool(bad)
+            print(f"{'FAIL' if bad else 'ok  '}  {name:<42} {' | '.join(plan)}")
+        explaining = False
+
+    if failures:
+        print(f"FAIL: {failures} of {len(queries)} queries scan or sort instead of searching an index in order")
+        sys.exit(1)
+    print(f"OK: all {len(queries)} queries search an index in order")
+
+
+if __name__ == "__main__":
+    main()
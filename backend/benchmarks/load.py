@@ -0,0 +1,296 @@
+"""End-to-end load test of the API with per-endpoint latency percentiles.
+
+Seeds a throwaway SQLite database with N users x M tasks, starts uvicorn on
+localhost and drives a weighted mix of login, list (filtered and deep cursor
+pages), create, update, delete and stats requests from concurrent virtual
+users. Prints throughput and p50/p95/p99 per endpoint, optionally writes the
+report as JSON, and compares it against an earlier report:
+
+    cd backend && python -m benchmarks.load --output before.json
+    # ...change something...
+    python -m benchmarks.load --baseline before.json --tolerance 0.25
+
+The comparison exits non-zero if any endpoint's p95 grew or its throughput
+dropped by more than the tolerance, or if the error rate is above the limit.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from .common import BACKEND_DIR, free_port, percentile, seed, start_server, use_scratch_database
+
+# Relative weight of each operation in the request mix
+DEFAULT_MIX = {
+    "login": 1,
+    "list": 30,
+    "list_deep": 5,
+    "create": 15,
+    "update": 15,
+    "delete": 5,
+    "stats": 10,
+}
+
+STATUSES = ["todo", "in_progress", "done"]
+PRIORITIES = ["low", "medium", "high", "critical"]
+
+
+class Recorder:
+    """Collects (operation, latency, ok) samples inside the measured window"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.recording = False
+
+    def add(self, operation: str, seconds: float, ok: bool):
+        if not self.recording:
+            return
+        self.latencies[operation].append(seconds * 1000)
+        if not ok:
+            self.errors[operation] += 1
+
+
+class VirtualUser:
+    """One simulated client working on its own user's tasks"""
+
+    def __init__(self, client, user: dict, recorder: Recorder, rng: random.Random, deep_pages: int):
+        self.client = client
+        self.user = user
+        self.recorder = recorder
+        self.rng = rng
+        self.deep_pages = deep_pages
+        self.headers = {"Authorization": f"Bearer {user['token']}"}
+        self.created = []
+
+    async def request(self, operation: str, method: str, url: str, expected: int, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code == expected
+        except Exception:
+            response, ok = None, False
+        self.recorder.add(operation, time.perf_counter() - t0, ok)
+        return response if ok else None
+
+    async def login(self):
+        await self.request("login", "POST", "/api/auth/login", 200,
+                           json={"email": self.user["email"], "password": self.user["password"]})
+
+    async def list(self):
+        params = {"limit": 50}
+        if self.rng.random() < 0.5:
+            params["status"] = self.rng.choice(STATUSES)
+        if self.rng.random() < 0.5:
+            params["priority"] = self.rng.choice(PRIORITIES)
+        await self.request("list", "GET", "/api/tasks", 200, params=params, headers=self.headers)
+
+    async def list_deep(self):
+        # Walk cursor pages; only pages past the first are recorded as deep
+        response = await self.request("list", "GET", "/api/tasks", 200,
+                                      params={"limit": 50}, headers=self.headers)
+        for _ in range(self.deep_pages):
+            cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+            if not cursor:
+                break
+            response = await self.request("list_deep", "GET", "/api/tasks", 200,
+                                          params={"limit": 50, "cursor": cursor}, headers=self.headers)
+
+    async def create(self):
+        payload = {
+            "title": f"load {self.rng.randrange(1_000_000)}",
+            "description": "created by benchmarks.load",
+            "priority": self.rng.choice(PRIORITIES),
+        }
+        response = await self.request("create", "POST", "/api/tasks", 201, json=payload, headers=self.headers)
+        if response is not None:
+            self.created.append(response.json()["id"])
+
+    async def update(self):
+        if not self.created:
+            return await self.create()
+        task_id = self.rng.choice(self.created)
+        await self.request("update", "PUT", f"/api/tasks/{task_id}", 200,
+                           json={"status": self.rng.choice(STATUSES)}, headers=self.headers)
+
+    async def delete(self):
+        if not self.created:
+            return await self.create()
+        task_id = self.created.pop(self.rng.randrange(len(self.created)))
+        await self.request("delete", "DELETE", f"/api/tasks/{task_id}", 204, headers=self.headers)
+
+    async def stats(self):
+        await self.request("stats", "GET", "/api/tasks/stats/summary", 200, headers=self.headers)
+
+    async def run(self, mix: dict, stop_at: float):
+        operations = list(mix)
+        weights = [mix[operation] for operation in operations]
+        while time.monotonic() < stop_at:
+            operation = self.rng.choices(operations, weights)[0]
+            await getattr(self, operation)()
+
+
+async def drive(base_url: str, users: list, args, mix: dict) -> tuple:
+    import httpx
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        clients = [
+            VirtualUser(client, users[n % len(users)], recorder, random.Random(args.seed + n), args.deep_pages)
+            for n in range(args.concurrency)
+        ]
+        started = time.monotonic()
+        stop_at = started + args.warmup + args.duration
+        tasks = [asyncio.create_task(vu.run(mix, stop_at)) for vu in clients]
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        measured_from = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - measured_from
+    return recorder, elapsed
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for operation, samples in sorted(recorder.latencies.items()):
+        endpoints[operation] = {
+            "requests": len(samples),
+            "errors": recorder.errors[operation],
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+        }
+    everything = [sample for samples in recorder.latencies.values() for sample in samples]
+    total = {
+        "requests": len(everything),
+        "errors": sum(recorder.errors.values()),
+        "throughput_rps": round(len(everything) / elapsed, 2),
+        "p50_ms": round(percentile(everything, 50), 2),
+        "p95_ms": round(percentile(everything, 95), 2),
+        "p99_ms": round(percentile(everything, 99), 2),
+    }
+    return {"endpoints": endpoints, "total": total}
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for name, row in rows:
+        print(f"{name:<10} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>9.1f} "
+              f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+
+
+def check_thresholds(report: dict, baseline: dict, tolerance: float, max_error_rate: float) -> list:
+    """Return human-readable threshold violations; empty means the run passes"""
+    violations = []
+    total = report["total"]
+    if total["requests"] and total["errors"] / total["requests"] > max_error_rate:
+        violations.append(f"error rate {total['errors'] / total['requests']:.2%} above {max_error_rate:.2%}")
+    if baseline is None:
+        return violations
+    for name, before in baseline["endpoints"].items():
+        after = report["endpoints"].get(name)
+        if after is None:
+            violations.append(f"{name}: missing from this run")
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            violations.append(f"{name}: p95 {before['p95_ms']:.2f} -> {after['p95_ms']:.2f} ms")
+        if after["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            violations.append(f"{name}: throughput {before['throughput_rps']:.1f} -> {after['throughput_rps']:.1f} req/s")
+    return violations
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before the run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--deep-pages", type=int, default=10, help="cursor pages walked by list_deep")
+    parser.add_argument("--mix", action="append", default=[], metavar="OPERATION=WEIGHT",
+                        help=f"override a weight of the request mix {DEFAULT_MIX}")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra server environment, e.g. ASYNC_DB_ENABLED=true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative p95 increase / throughput drop per endpoint")
+    parser.add_argument("--max-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix:
+        operation, weight = item.split("=", 1)
+        if operation not in DEFAULT_MIX:
+            parser.error(f"unknown operation {operation!r}")
+        mix[operation] = float(weight)
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    database_url = use_scratch_database()
+    print(f"Seeding {args.users} users x {args.tasks_per_user} tasks...")
+    users = seed(args.users, args.tasks_per_user)
+
+    port = free_port()
+    server = start_server({"DATABASE_URL": database_url, **extra_env}, port, workers=args.workers)
+    try:
+        recorder, elapsed = asyncio.run(drive(f"http://127.0.0.1:{port}", users, args, mix))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "users": args.users,
+            "tasks_per_user": args.tasks_per_user,
+            "concurrency": args.concurrency,
+            "duration_seconds": round(elapsed, 2),
+            "workers": args.workers,
+            "mix": mix,
+            "env": extra_env,
+        },
+        **summarize(recorder, elapsed),
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    violations = check_thresholds(report, baseline, args.tolerance, args.max_error_rate)
+    for violation in violations:
+        print(f"FAIL: {violation}")
+    if violations:
+        sys.exit(1)
+    if baseline is not None:
+        print(f"OK: within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
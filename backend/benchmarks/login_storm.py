@@ -0,0 +1,92 @@
+"""Login throughput next to mixed task traffic.
+
+Starts uvicorn once per hashing mode and, for a fixed period, runs task
+clients (list and create) alongside clients hammering POST /api/auth/login.
+Reports successful logins/s, 503s, and task latency with and without the
+login storm. Modes:
+
+    inline  PASSWORD_HASH_WORKERS=0, unbounded queue: hashes run on the request threadpool
+    pool    the configured process pool with its PASSWORD_HASH_MAX_PENDING bound
+
+    cd backend && python -m benchmarks.login_storm
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from .common import free_port, percentile, seed, start_server, use_scratch_database
+
+MODES = {
+    "inline": {"PASSWORD_HASH_WORKERS": "0", "PASSWORD_HASH_MAX_PENDING": "100000"},
+    "pool": {},
+}
+
+
+async def run_phase(base_url: str, users: list, task_clients: int, login_clients: int, seconds: float):
+    import httpx
+
+    task_latencies = []
+    login_outcomes = Counter()
+    stop_at = time.monotonic() + seconds
+
+    async def task_client(client, user):
+        headers = {"Authorization": f"Bearer {user['token']}"}
+        n = 0
+        while time.monotonic() < stop_at:
+            n += 1
+            t0 = time.perf_counter()
+            if n % 4 == 0:
+                await client.post("/api/tasks", json={"title": f"storm {n}"}, headers=headers)
+            else:
+                await client.get("/api/tasks", params={"limit": 20}, headers=headers)
+            task_latencies.append((time.perf_counter() - t0) * 1000)
+
+    async def login_client(client, user):
+        while time.monotonic() < stop_at:
+            response = await client.post("/api/auth/login", json={"email": user["email"], "password": user["password"]})
+            login_outcomes[response.status_code] += 1
+            if response.status_code == 503:
+                await asyncio.sleep(float(response.headers.get("Retry-After", "1")) / 10)
+
+    limits = httpx.Limits(max_connections=task_clients + login_clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await asyncio.gather(
+            *(task_client(client, users[n % len(users)]) for n in range(task_clients)),
+            *(login_client(client, users[n % len(users)]) for n in range(login_clients)),
+        )
+    return task_latencies, login_outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--task-clients", type=int, default=8)
+    parser.add_argument("--login-clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    database_url = use_scratch_database()
+    users = seed(args.users, 200)
+
+    print(f"{'mode':>7} {'storm':>6} {'task p50':>9} {'task p99':>9} {'tasks/s':>8} {'logins/s':>9} {'503s':>6} {'other':>6}")
+    for mode in args.modes:
+        port = free_port()
+        server = start_server({"DATABASE_URL": database_url, **MODES[mode]}, port)
+        try:
+            for login_clients in (0, args.login_clients):
+                latencies, outcomes = asyncio.run(run_phase(
+                    f"http://127.0.0.1:{port}", users, args.task_clients, login_clients, args.seconds
+                ))
+                other = sum(count for code, count in outcomes.items() if code not in (200, 503))
+                print(f"{mode:>7} {login_clients:>6} {percentile(latencies, 50):>9.1f} {percentile(latencies, 99):>9.1f} "
+                      f"{len(latencies) / args.seconds:>8.1f} {outcomes[200] / args.seconds:>9.1f} "
+                      f"{outcomes[503]:>6} {other:>6}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
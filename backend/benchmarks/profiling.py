@@ -0,0 +1,132 @@
+"""Cost of the request profiling hook, switched off, armed, and profiling every request.
+
+First times in-process what the hook adds to a request and to a SQL
+statement while the switch is off, and exits non-zero if that is more than
+--budget-us. Then times GET /api/tasks and the stats summary through the app
+with the switch off, on without picking the request, and on profiling every
+request, and reports how many function calls and statements each profile got.
+
+    cd backend && python -m benchmarks.profiling
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from .common import seed, use_scratch_database
+
+
+def off_cost(iterations: int) -> tuple:
+    """Microseconds the switched-off hook adds per request and per statement"""
+    from app.utils.profiler import ProfilingMiddleware, RequestProfiler, _after_cursor_execute, _before_cursor_execute
+
+    async def app(scope, receive, send):
+        pass
+
+    middleware = ProfilingMiddleware(app, RequestProfiler(False, 0, 10, tempfile.mkdtemp()))
+    scope = {"type": "http", "method": "GET", "path": "/api/tasks", "query_string": b"", "headers": []}
+
+    async def run(handler):
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            await handler(scope, None, None)
+        return time.perf_counter() - t0
+
+    request = (asyncio.run(run(middleware)) - asyncio.run(run(app))) / iterations * 1e6
+
+    class Context:
+        pass
+
+    context = Context()
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        _before_cursor_execute(None, None, "SELECT 1", (), context, False)
+        _after_cursor_execute(None, None, "SELECT 1", (), context, False)
+    statement = (time.perf_counter() - t0) / iterations * 1e6
+    return max(request, 0.0), statement
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--budget-us", type=float, default=2.0,
+                        help="most the switched-off hook may add to a request plus one statement")
+    args = parser.parse_args()
+
+    # Every list request does its work rather than coming from the response cache
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    use_scratch_database()
+
+    request_us, statement_us = off_cost(args.iterations)
+    print(f"switched off: {request_us:.3f} us per request, {statement_us:.3f} us per SQL statement")
+    failed = request_us + statement_us > args.budget_us
+    if failed:
+        print(f"FAIL: the switched-off hook costs more than {args.budget_us} us")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    from app.database import engine
+    from app.main import app
+    from app.utils.profiler import profiler
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    users = seed(args.users, args.tasks_per_user)
+    admin = users[0]
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE users SET role = 'admin' WHERE id = :id"), {"id": admin["id"]})
+    user = users[1]
+    headers = {"Authorization": f"Bearer {user['token']}"}
+    routes = {"list": ("/api/tasks", {"limit": 100}), "stats": ("/api/tasks/stats/summary", {})}
+    modes = {
+        "off": dict(enabled=False),
+        "armed": dict(enabled=True, sample_rate=0.0),
+        "every request": dict(enabled=True, sample_rate=1.0, user_id=user["id"]),
+    }
+
+    latencies = {(mode, name): [] for mode in modes for name in routes}
+    call_counts = []
+    sql_counts = []
+    with TestClient(app) as client:
+        # Verifies the tokens, so the hook can tell who is asking
+        assert client.get("/api/tasks", headers=headers).status_code == 200
+        assert client.get("/api/admin/profiling", headers={"Authorization": f"Bearer {admin['token']}"}).status_code == 200
+        # Modes take turns in rounds, so drift over the run doesn't favour the first
+        for _ in range(args.rounds):
+            for mode, switch in modes.items():
+                profiler.switch(**switch, duration_seconds=None)
+                profiler.clear()
+                for name, (path, params) in routes.items():
+                    for _ in range(args.requests // args.rounds):
+                        t0 = time.perf_counter()
+                        response = client.get(path, params=params, headers=headers)
+                        latencies[mode, name].append((time.perf_counter() - t0) * 1000)
+                        assert response.status_code == 200, response.text
+                if mode == "every request":
+                    call_counts += [profile.calls for profile in profiler.recent()]
+                    sql_counts += [profile.sql_count for profile in profiler.recent()]
+        profiler.switch(False)
+
+    print(f"median of {args.requests} requests, ms")
+    print(f"{'mode':<14} {'list':>7} {'stats':>7}")
+    for mode in modes:
+        print(f"{mode:<14} {statistics.median(latencies[mode, 'list']):>7.2f} {statistics.median(latencies[mode, 'stats']):>7.2f}")
+    if not call_counts:
+        print("FAIL: no request was profiled")
+        failed = True
+    else:
+        print(f"profiles: {statistics.mean(call_counts):.1f} function calls and {statistics.mean(sql_counts):.1f} statements on average")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
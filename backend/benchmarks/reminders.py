@@ -0,0 +1,84 @@
+"""Memory and speed of the reminder scheduler with a million scheduled tasks.
+
+Inserts N unfinished tasks with due dates spread over the next 30 days, loads
+them into a ReminderScheduler, and reports load time and the memory the heap
+retains (tracemalloc). Then advances an injected clock and fires a slice of
+the reminders. Exits non-zero if the retained memory is over the budget.
+
+    cd backend && python -m benchmarks.reminders
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from .common import use_scratch_database
+
+# Retained heap memory allowed per million scheduled tasks
+BUDGET_MB_PER_MILLION = 64
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--fire", type=int, default=50_000, help="reminders to fire after loading")
+    args = parser.parse_args()
+
+    use_scratch_database()
+    from sqlalchemy import insert
+    from app.database import SessionLocal, create_tables
+    from app.models import Task, User
+    from app.utils.reminders import ReminderScheduler
+    from app.utils.shards import allocate_task_ids
+
+    create_tables()
+    rng = random.Random(0)
+    start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(minutes=1)
+    with SessionLocal() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        t0 = time.perf_counter()
+        first_id = allocate_task_ids(db.connection(), args.tasks)
+        for offset in range(0, args.tasks, 50_000):
+            db.execute(insert(Task), [
+                {"id": first_id + n, "title": f"Task {n}", "user_id": user.id,
+                 "due_date": start + timedelta(seconds=rng.randrange(30 * 86400))}
+                for n in range(offset, min(offset + 50_000, args.tasks))
+            ])
+        db.commit()
+    print(f"inserted {args.tasks:,} tasks in {time.perf_counter() - t0:.1f}s")
+
+    clock = [start.timestamp() - 60]
+    scheduler = ReminderScheduler(SessionLocal, clock=lambda: clock[0])
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    scheduler.load()
+    load_seconds = time.perf_counter() - t0
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained_mb, peak_mb = retained / 2**20, peak / 2**20
+    budget_mb = BUDGET_MB_PER_MILLION * args.tasks / 1_000_000
+    print(f"loaded {len(scheduler):,} due dates in {load_seconds:.1f}s")
+    print(f"heap memory retained {retained_mb:.1f} MB ({retained / max(len(scheduler), 1):.0f} B/task), "
+          f"peak during load {peak_mb:.1f} MB, budget {budget_mb:.0f} MB")
+
+    # Jump the clock to just past the first `--fire` due dates
+    fired = 0
+    t0 = time.perf_counter()
+    while fired < args.fire and scheduler.next_due() is not None:
+        clock[0] = scheduler.next_due() + 60
+        fired += len(scheduler.fire_due())
+    fire_seconds = time.perf_counter() - t0
+    print(f"fired {fired:,} reminders in {fire_seconds:.1f}s ({fired / fire_seconds:,.0f}/s)")
+
+    if retained_mb > budget_mb:
+        print(f"FAIL: {retained_mb:.1f} MB retained is over the {budget_mb:.0f} MB budget")
+        sys.exit(1)
+    print("OK: within memory budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare task list latency with the response cache off and on.
+
+Seeds one user, then replays the same request mix twice, once per setting:
+clients cycling through a handful of filter/page combinations, with a task
+update every --write-every requests. After each write the next list must show
+it, so the run exits non-zero on any stale read.
+
+    cd backend && python -m benchmarks.response_cache
+"""
+import argparse
+import logging
+import random
+import statistics
+import sys
+import time
+
+from .common import seed, use_scratch_database
+
+QUERIES = [
+    {},
+    {"status": "todo"},
+    {"status": "todo,in_progress"},
+    {"status": "in_progress,todo"},
+    {"priority": "high,critical"},
+    {"sort": "priority"},
+    {"sort": "due_date", "skip": 200},
+    {"skip": 1000},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=50)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    from fastapi.testclient import TestClient
+    from app.config import settings
+    from app.database import engine
+    from app.main import app
+    from app.utils.response_cache import response_cache
+    from app.utils.task_search import rebuild_search_index
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    user = seed(1, args.tasks)[0]
+    # Seeded rows bypass the search triggers; index them so updates stay consistent
+    rebuild_search_index(engine)
+    headers = {"Authorization": f"Bearer {user['token']}"}
+
+    def replay(client, label):
+        picks = random.Random(0)
+        samples, stale = [], 0
+        newest = client.get("/api/tasks", params={"limit": 1}, headers=headers).json()[0]["id"]
+        for n in range(args.requests):
+            if n and n % args.write_every == 0:
+                title = f"{label} write {n}"
+                client.put(f"/api/tasks/{newest}", json={"title": title}, headers=headers)
+                stale += client.get("/api/tasks", params={"limit": 1}, headers=headers).json()[0]["title"] != title
+            t0 = time.perf_counter()
+            response = client.get("/api/tasks", params=picks.choice(QUERIES), headers=headers)
+            samples.append((time.perf_counter() - t0) * 1000)
+            assert response.status_code == 200, response.text
+        return statistics.median(samples), sorted(samples)[int(len(samples) * 0.95)], stale
+
+    results = {}
+    with TestClient(app) as client:
+        for enabled in (False, True):
+            settings.response_cache_enabled = enabled
+            results["on" if enabled else "off"] = replay(client, "on" if enabled else "off")
+    cache = response_cache.stats()
+
+    print(f"{args.tasks} tasks, {args.requests} list requests over {len(QUERIES)} queries, a write every {args.write_every}")
+    print(f"{'cache':>6} {'p50 ms':>8} {'p95 ms':>8} {'stale':>6}")
+    for label, (p50, p95, stale) in results.items():
+        print(f"{label:>6} {p50:>8.2f} {p95:>8.2f} {stale:>6}")
+    lookups = cache["hits"] + cache["misses"]
+    print(f"hit rate {cache['hits'] / lookups:.0%} ({cache['hits']} of {lookups}), "
+          f"{cache['entries']} entries, {cache['bytes']} bytes")
+
+    if any(stale for _, _, stale in results.values()):
+        print("FAIL: a list read after a write did not show it")
+        sys.exit(1)
+    print("OK: no stale reads")
+
+
+if __name__ == "__main__":
+    main()
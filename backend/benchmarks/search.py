@@ -0,0 +1,60 @@
+"""Compare full-text search against a naive ILIKE scan.
+
+Seeds tasks with random vocabulary, builds the search index, then times
+the same searches through search_task_list() and through an
+ILIKE '%term%' filter on title and description. Common words favour the
+ILIKE scan (it stops after `limit` early hits, unranked); rare and absent
+words are where the index pays off.
+
+    cd backend && python -m benchmarks.search
+"""
+import argparse
+import statistics
+import time
+
+from .common import seed, use_scratch_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--tasks-per-user", type=int, default=40_000)
+    parser.add_argument("--terms", nargs="+", default=["invoice", "rollback migration", "ref4242", "ref777 crash", "zebra"])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    from sqlalchemy import or_
+    from app.database import SessionLocal, engine
+    from app.models import Task
+    from app.utils.task_search import rebuild_search_index, search_task_list
+
+    user = seed(args.users, args.tasks_per_user)[0]
+    rebuild_search_index(engine)
+
+    def timed(build):
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            rows = build().limit(args.limit).all()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples), len(rows)
+
+    db = SessionLocal()
+    print(f"{args.users * args.tasks_per_user} tasks, median of {args.repeat} searches")
+    print(f"{'query':>20} {'fts ms':>8} {'ilike ms':>9}")
+    for term in args.terms:
+        base = lambda: db.query(Task).filter(Task.user_id == user["id"])
+        fts_ms, _ = timed(lambda: search_task_list(base(), engine.dialect.name, term))
+        ilike_ms, _ = timed(lambda: base().filter(*(
+            or_(Task.title.ilike(f"%{word}%"), Task.description.ilike(f"%{word}%"))
+            for word in term.split()
+        )).order_by(Task.created_at.desc()))
+        print(f"{term:>20} {fts_ms:>8.2f} {ilike_ms:>9.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
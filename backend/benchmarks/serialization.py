@@ -0,0 +1,64 @@
+"""Compare rows/sec of the default and fast task list serialization paths.
+
+Default: ORM Task instances -> pydantic Task schema -> jsonable_encoder ->
+JSONResponse. Fast: column rows -> dicts -> FastJSONResponse. Both render the
+same 100-row page and the script checks the bytes are identical.
+
+    cd backend && python -m benchmarks.serialization
+"""
+import argparse
+import time
+
+from .common import seed, use_scratch_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from app.database import SessionLocal
+    from app.models import Task
+    from app.schemas.task import Task as TaskSchema
+    from app.utils.fast_json import FastJSONResponse, orjson
+    from app.utils.task_queries import TASK_COLUMNS, task_rows_to_dicts
+
+    user = seed(1, args.page_size)[0]
+    db = SessionLocal()
+
+    def default_path():
+        tasks = db.query(Task).filter(Task.user_id == user["id"]).order_by(Task.id).all()
+        validated = [TaskSchema.from_orm(task) for task in tasks]
+        return JSONResponse(jsonable_encoder(validated)).body
+
+    def fast_path():
+        rows = db.query(*TASK_COLUMNS).filter(Task.user_id == user["id"]).order_by(Task.id).all()
+        return FastJSONResponse(task_rows_to_dicts(rows)).body
+
+    assert default_path() == fast_path(), "fast path output differs from the schema path"
+
+    def rows_per_second(render):
+        pages = 0
+        deadline = time.perf_counter() + args.seconds
+        t0 = time.perf_counter()
+        while time.perf_counter() < deadline:
+            render()
+            db.expunge_all()
+            pages += 1
+        return pages * args.page_size / (time.perf_counter() - t0)
+
+    default_rate = rows_per_second(default_path)
+    fast_rate = rows_per_second(fast_path)
+    print(f"{args.page_size}-row pages, encoder: {'orjson' if orjson else 'json (orjson not installed)'}")
+    print(f"default path: {default_rate:>10,.0f} rows/s")
+    print(f"fast path:    {fast_rate:>10,.0f} rows/s  ({fast_rate / default_rate:.1f}x)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
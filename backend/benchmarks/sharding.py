@@ -0,0 +1,134 @@
+"""Task write throughput with task data sharded over 1, 2 and 4 SQLite files.
+
+For each shard count a fresh set of databases is created, users are placed
+round robin across the shards, and --writers processes create tasks for them
+for --seconds, one task per transaction through the app's write path (the
+shard-bound session and record_task_writes). Writers on one file queue for its
+single write lock; each extra file adds a lock of its own. Exits non-zero if
+any write fails or a task lands on the wrong shard.
+
+    cd backend && python -m benchmarks.sharding
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+
+def _setup(users: int) -> list:
+    """Create the schema and the users, returning their ids"""
+    from app.database import shard_session
+    from app.models import User
+    from app.utils.schema import ensure_schema
+    from app.utils.shards import assign_user_shard
+
+    ensure_schema()
+    with shard_session() as db:
+        created = [User(email=f"bench{n}@example.com", username=f"bench{n}", hashed_password="x") for n in range(users)]
+        db.add_all(created)
+        db.flush()
+        for user in created:
+            assign_user_shard(db, user.id)
+        db.commit()
+        return [user.id for user in created]
+
+
+def _write(user_ids: list, start_at: float, seconds: float) -> tuple:
+    """Create one task per transaction until the deadline; returns (commits, errors)"""
+    from app.database import SessionLocal
+    from app.models import Task
+    from app.utils.shards import bind_user_shard
+    from app.utils.task_hooks import record_task_writes
+
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = start_at + seconds
+    commits = errors = 0
+    while time.time() < deadline:
+        user_id = user_ids[(commits + errors) % len(user_ids)]
+        with SessionLocal() as db:
+            try:
+                bind_user_shard(db, user_id)
+                task = Task(title=f"Task {commits}", user_id=user_id)
+                db.add(task)
+                db.flush()
+                record_task_writes(db, user_id, [(None, (task.status, task.priority))], [(task.id, task.due_date)], [task.id])
+                db.commit()
+                commits += 1
+            except Exception:
+                errors += 1
+    return commits, errors
+
+
+def _misplaced(shard_count: int) -> int:
+    """Tasks stored on a shard other than their user's"""
+    from sqlalchemy import func, select
+    from app.database import shard_session
+    from app.models import Task
+    from app.utils.shards import shard_map
+
+    misplaced = 0
+    with shard_session() as directory:
+        for shard in range(shard_count):
+            with shard_session(shard) as db:
+                for user_id, count in db.execute(select(Task.user_id, func.count(Task.id)).group_by(Task.user_id)):
+                    if shard_map.lookup(directory, user_id)[0] != shard:
+                        misplaced += count
+    return misplaced
+
+
+def run(shard_count: int, args) -> tuple:
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{directory}/directory.db"
+    os.environ["SHARD_DATABASE_URLS"] = ",".join(f"sqlite:///{directory}/shard{n}.db" for n in range(shard_count))
+    # Each configuration needs its own import of app.config, so the work runs in fresh processes
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        user_ids = pool.apply(_setup, (args.users,))
+    start_at = time.time() + 3
+    with context.Pool(args.writers) as pool:
+        results = pool.starmap(_write, [
+            (user_ids[n::args.writers] or user_ids, start_at, args.seconds) for n in range(args.writers)
+        ])
+    with context.Pool(1) as pool:
+        misplaced = pool.apply(_misplaced, (shard_count,))
+    commits = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+    return commits / args.seconds, errors, misplaced
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--synchronous", default="full",
+                        help="SQLITE_SYNCHRONOUS for the run; full makes every commit wait for its fsync")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "SQLITE_SYNCHRONOUS": args.synchronous,
+        "TASK_EVENTS_ENABLED": "false",
+        "REMINDERS_ENABLED": "false",
+    })
+    print(f"{args.writers} writer processes, {args.users} users, synchronous={args.synchronous}, {os.cpu_count()} CPUs")
+    if (os.cpu_count() or 1) < args.writers:
+        print("note: fewer CPUs than writers, so the writers queue for CPU as well as for the write locks")
+    print(f"{'shards':>6} {'writes/s':>9} {'speedup':>8} {'errors':>7}")
+    failed = False
+    baseline = None
+    for shard_count in args.shards:
+        throughput, errors, misplaced = run(shard_count, args)
+        baseline = baseline or throughput
+        print(f"{shard_count:>6} {throughput:>9.0f} {throughput / baseline:>7.2f}x {errors:>7}")
+        if errors or misplaced:
+            print(f"FAIL: {errors} failed writes, {misplaced} tasks on the wrong shard with {shard_count} shards")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Worker startup cost: app import, schema check and time to first request.
+
+Measures, each as the median of --repeat runs in fresh processes:
+
+    import         importing app.main in a new interpreter
+    create_all     the old per-worker startup: create_tables() + create_search_index()
+    ensure_schema  the schema version check against a current database
+    spawn worker   new interpreter -> app imported and schema checked (no preload)
+    fork worker    fork of a parent with the app loaded and checked (preload_app)
+    first request  uvicorn launched -> first 200 from /health
+
+With gunicorn installed it also times 4 workers with and without --preload to
+their first response.
+
+    cd backend && python -m benchmarks.startup
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from .common import BACKEND_DIR, free_port, start_server, use_scratch_database
+
+TIMED_SNIPPETS = {
+    "import": "import app.main",
+    "create_all": "from app.database import create_tables, engine\n"
+                  "from app.utils.task_search import create_search_index\n"
+                  "import app.main\n"
+                  "START\n"
+                  "create_tables(); create_search_index(engine)",
+    "ensure_schema": "from app.utils.schema import ensure_schema\n"
+                     "import app.main\n"
+                     "START\n"
+                     "ensure_schema()",
+    "spawn worker": "import app.main\n"
+                    "from app.utils.schema import ensure_schema\n"
+                    "ensure_schema()",
+}
+
+
+def time_snippet(snippet: str) -> float:
+    """Run a snippet in a new interpreter; timed from START, or from launch when there is none"""
+    before, _, after = snippet.rpartition("START\n")
+    code = (
+        f"{before}\nimport time\nt0 = time.perf_counter()\n{after}\nprint(time.perf_counter() - t0)"
+        if after and before else
+        f"import time\nt0 = time.perf_counter()\n{snippet}\nprint(time.perf_counter() - t0)"
+    )
+    launched = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    if not before:
+        # Include interpreter start-up, which a spawned worker pays too
+        return time.perf_counter() - launched
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def time_fork(repeat: int) -> float:
+    """Fork a loaded parent and wait until the child has checked the schema"""
+    import app.main  # noqa: F401 - loaded once, as gunicorn's master does with preload_app
+    from app.utils.schema import ensure_schema
+
+    ensure_schema()
+    samples = []
+    for _ in range(repeat):
+        read_end, write_end = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            ensure_schema()
+            os.write(write_end, b"1")
+            os._exit(0)
+        os.read(read_end, 1)
+        samples.append(time.perf_counter() - started)
+        os.waitpid(pid, 0)
+        os.close(read_end)
+        os.close(write_end)
+    return statistics.median(samples)
+
+
+def time_first_request(command: list, env: dict) -> float:
+    """Launch a server with `command` (and `{port}` filled in) and time its first /health 200"""
+    import httpx
+
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([arg.format(port=port) for arg in command], cwd=BACKEND_DIR,
+                               env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                time.sleep(0.01)
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(command[:3])} exited before answering")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    database_url = use_scratch_database()
+    # Create the schema once, so every measurement starts from a current database
+    start_server({"DATABASE_URL": database_url}, free_port()).terminate()
+
+    results = {}
+    for name, snippet in TIMED_SNIPPETS.items():
+        results[name] = statistics.median(time_snippet(snippet) for _ in range(args.repeat))
+    results["fork worker"] = time_fork(args.repeat)
+
+    servers = {
+        "first request": [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", "{port}",
+                          "--log-level", "warning"],
+    }
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        gunicorn_note = "gunicorn not installed, skipped the --preload comparison"
+    else:
+        gunicorn_note = None
+        gunicorn_cmd = [sys.executable, "-m", "gunicorn", "app.main:app", "--bind", "127.0.0.1:{port}", "--log-level", "warning"]
+        # gunicorn.conf.py preloads; without it the same 4 UvicornWorkers each import the app
+        servers["gunicorn first request"] = [*gunicorn_cmd, "-w", "4", "-k", "uvicorn.workers.UvicornWorker"]
+        servers["gunicorn preload first request"] = [*gunicorn_cmd, "-c", "gunicorn.conf.py"]
+    for name, command in servers.items():
+        results[name] = statistics.median(
+            time_first_request(command, {"DATABASE_URL": database_url}) for _ in range(args.repeat)
+        )
+
+    print(f"median of {args.repeat}, against a database whose schema is current")
+    for name, seconds in results.items():
+        print(f"{name:<36} {seconds * 1000:>9.1f} ms")
+    print(f"a preloaded worker is ready {results['spawn worker'] / results['fork worker']:.0f}x sooner than a spawned one; "
+          f"the schema check costs {results['ensure_schema'] / results['create_all']:.2f}x create_all")
+    if gunicorn_note:
+        print(gunicorn_note)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,29 @@
 # Gunicorn configuration for FastAPI
+import gc
+
 bind = "0.0.0.0:8000"
 workers = 4
 worker_class = "uvicorn.workers.UvicornWorker"
 timeout = 120
 keepalive = 2
 max_requests = 1000
-max_requests_jitter = 100 
\ No newline at end of file
+max_requests_jitter = 100
+
+# Import the app once in the master; workers, including the ones recycled after
+# max_requests, fork with it loaded and share its memory copy-on-write.
+# app.database disposes the inherited connection pools in each child.
+preload_app = True
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    # Check the schema once here; forked workers inherit the result and skip it
+    from app.database import engine
+    from app.utils.schema import ensure_schema
+
+    ensure_schema()
+    engine.dispose()
+    # Keep the loaded app out of the collector's reach, so collections in the
+    # workers don't write to (and so copy) the shared pages
+    gc.freeze()
@@ -0,0 +1,64 @@
+"""Fixtures for the API tests.
+
+The app reads its settings at import time, so the scratch database and test
+settings are set here, before any test module imports `app`.
+
+    cd backend && python -m pytest tests
+"""
+import itertools
+import os
+import tempfile
+
+import pytest
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ["ADMISSION_ENABLED"] = "false"
+# Hash passwords in the threadpool rather than a process pool the tests would have to start
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["TASK_EVENTS_BROKER"] = "local"
+os.environ["ASYNC_DB_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+_user_ids = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def register_user(client):
+    """Register a new user with no tasks and return their bearer headers"""
+
+    def register():
+        n = next(_user_ids)
+        email, password = f"user{n}@example.com", "password123"
+        response = client.post("/api/auth/register", json={"email": email, "username": f"user{n}", "password": password})
+        assert response.status_code == 200, response.text
+        response = client.post("/api/auth/login", json={"email": email, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return register
+
+
+@pytest.fixture
+def auth_headers(register_user):
+    return register_user()
+
+
+@pytest.fixture
+def create_task(client, auth_headers):
+    """Create a task of the auth_headers user and return it"""
+
+    def create(**fields):
+        response = client.post("/api/tasks", json={"title": "Task", **fields}, headers=auth_headers)
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    return create
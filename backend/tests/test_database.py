@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from app.config import settings
+from app.database import (
+    TimedAsyncAdaptedQueuePool, TimedQueuePool, _create_engine, engine, engine_options, pool_status, pool_telemetry,
+)
+
+
+def test_sqlite_file_gets_a_sized_queue_pool_without_pre_ping():
+    options = engine_options("sqlite:///./tasks.db")
+
+    assert options["poolclass"] is TimedQueuePool
+    assert options["pool_size"] == settings.db_pool_size
+    assert options["max_overflow"] == settings.db_max_overflow
+    assert options["pool_timeout"] == settings.db_pool_timeout
+    assert options["pool_recycle"] == settings.db_pool_recycle
+    assert options["pool_pre_ping"] is False
+    assert options["connect_args"] == {
+        "check_same_thread": False,
+        "timeout": settings.sqlite_busy_timeout_ms / 1000,
+    }
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:"])
+def test_in_memory_sqlite_keeps_the_default_pool(url):
+    options = engine_options(url)
+
+    assert "poolclass" not in options
+    assert options["connect_args"]["check_same_thread"] is False
+
+
+def test_postgres_pre_pings_and_takes_the_given_pool_class():
+    options = engine_options("postgresql+asyncpg://app@db/tasks", poolclass=TimedAsyncAdaptedQueuePool)
+
+    assert options["poolclass"] is TimedAsyncAdaptedQueuePool
+    assert options["pool_pre_ping"] is settings.db_pool_pre_ping
+    assert "connect_args" not in options
+
+
+def test_every_sqlite_connection_gets_the_pragmas():
+    with engine.connect() as connection:
+        pragmas = {
+            name: connection.execute(text(f"PRAGMA {name}")).scalar()
+            for name in ("journal_mode", "busy_timeout", "synchronous", "cache_size")
+        }
+
+    assert pragmas == {
+        "journal_mode": settings.sqlite_journal_mode,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        # NORMAL
+        "synchronous": 1,
+        "cache_size": -settings.sqlite_cache_size_kib,
+    }
+
+
+def test_pool_status_and_checkout_telemetry(tmp_path):
+    scratch = _create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    try:
+        assert isinstance(scratch.pool, QueuePool)
+        checkouts = pool_telemetry.stats()["checkouts"]
+        with scratch.connect():
+            status = pool_status(scratch)
+            assert status["pool"] == "TimedQueuePool"
+            assert status["checked_out"] == 1
+        assert pool_status(scratch)["checked_in"] == 1
+        assert pool_telemetry.stats()["checkouts"] == checkouts + 1
+    finally:
+        scratch.dispose()
+
+
+def test_pool_health_endpoint(client):
+    response = client.get("/health/pool")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["sync"]["pool"] == "TimedQueuePool"
+    assert {"checkouts", "waiting", "timeouts", "wait_seconds_total", "wait_seconds_max"} <= set(body["checkout"])
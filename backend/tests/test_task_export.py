@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+
+from app.routers import tasks as tasks_router
+from app.utils.task_export import EXPORT_FIELDS
+
+
+def _export(client, headers, **params):
+    response = client.get("/api/tasks/export", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_ndjson_lines_match_the_task_list(client, auth_headers, create_task):
+    create_task(title="First", priority="high", due_date="2030-01-02T03:04:05")
+    create_task(title="Second", description="with, a comma", status="done")
+
+    response = _export(client, auth_headers)
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="tasks.ndjson"'
+    assert response.text.endswith("\n")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [list(line) for line in lines] == [EXPORT_FIELDS] * 2
+    listed = client.get("/api/tasks", params={"sort": "created_at"}, headers=auth_headers).json()
+    assert lines == sorted(listed, key=lambda task: task["id"])
+
+
+def test_csv_has_a_header_and_empty_cells_for_nulls(client, auth_headers, create_task):
+    first = create_task(title="First", description="with, a comma", priority="critical")
+    second = create_task(title='Quoted "title"', due_date="2030-01-02T03:04:05")
+
+    response = _export(client, auth_headers, format="csv")
+
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="tasks.csv"'
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == EXPORT_FIELDS
+    exported = [dict(zip(EXPORT_FIELDS, row)) for row in rows[1:]]
+    assert [int(row["id"]) for row in exported] == [first["id"], second["id"]]
+    assert exported[0]["description"] == "with, a comma"
+    assert exported[0]["priority"] == "critical"
+    assert exported[0]["due_date"] == ""
+    assert exported[1]["title"] == 'Quoted "title"'
+    assert exported[1]["description"] == ""
+    assert exported[1]["due_date"] == "2030-01-02T03:04:05"
+
+
+def test_csv_of_no_tasks_is_the_header_only(client, auth_headers):
+    response = _export(client, auth_headers, format="csv")
+
+    assert list(csv.reader(io.StringIO(response.text))) == [EXPORT_FIELDS]
+
+
+def test_export_streams_every_chunk_in_id_order(client, auth_headers, create_task, monkeypatch):
+    monkeypatch.setattr(tasks_router, "EXPORT_CHUNK_ROWS", 2)
+    created = [create_task(title=f"Task {n}")["id"] for n in range(5)]
+
+    response = _export(client, auth_headers)
+
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == created
+
+
+def test_export_applies_filters_and_only_returns_own_tasks(client, auth_headers, create_task, register_user):
+    done = create_task(status="done", priority="low")
+    create_task(status="todo", priority="low")
+    other_user = register_user()
+    assert client.post("/api/tasks", json={"title": "Theirs", "status": "done"}, headers=other_user).status_code == 201
+
+    response = _export(client, auth_headers, status="done")
+
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [done["id"]]
+
+
+def test_export_rejects_unknown_formats_and_filters(client, auth_headers):
+    assert client.get("/api/tasks/export", params={"format": "xml"}, headers=auth_headers).status_code == 422
+    assert client.get("/api/tasks/export", params={"status": "nope"}, headers=auth_headers).status_code == 400
@@ -0,0 +1,114 @@
+import pytest
+
+
+def _list(client, headers, **params):
+    response = client.get("/api/tasks", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def _ids(response):
+    return [task["id"] for task in response.json()]
+
+
+@pytest.mark.parametrize("params", [
+    {"status": "nope"},
+    {"status": "todo,nope"},
+    {"priority": "urgent"},
+    {"priority": "low,,HIGH"},
+])
+def test_invalid_status_or_priority_is_a_400(client, auth_headers, params):
+    response = client.get("/api/tasks", params=params, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert "expected a comma-separated list of" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("params", [
+    {"sort": "title"},
+    {"limit": 0},
+    {"limit": 101},
+    {"skip": -1},
+    {"due_after": "tomorrow"},
+])
+def test_invalid_sort_or_paging_is_rejected(client, auth_headers, params):
+    assert client.get("/api/tasks", params=params, headers=auth_headers).status_code == 422
+
+
+def test_status_and_priority_lists(client, auth_headers, create_task):
+    todo = create_task(status="todo", priority="low")
+    doing = create_task(status="in_progress", priority="high")
+    done = create_task(status="done", priority="high")
+
+    assert _ids(_list(client, auth_headers, status="done")) == [done["id"]]
+    assert _ids(_list(client, auth_headers, status=" todo , in_progress,todo ")) == [doing["id"], todo["id"]]
+    assert _ids(_list(client, auth_headers, status="todo,done", priority="high")) == [done["id"]]
+    # An empty filter is no filter
+    assert len(_ids(_list(client, auth_headers, status=" "))) == 3
+
+
+def test_due_range_with_each_sort(client, auth_headers, create_task):
+    early = create_task(due_date="2030-01-01T00:00:00", priority="low")
+    late = create_task(due_date="2030-06-01T00:00:00", priority="critical")
+    create_task(due_date="2031-01-01T00:00:00")
+    create_task()
+
+    for sort in ("created_at", "updated_at", "due_date", "priority"):
+        response = _list(client, auth_headers, sort=sort, due_after="2030-01-01T00:00:00", due_before="2031-01-01T00:00:00")
+        assert set(_ids(response)) == {early["id"], late["id"]}, sort
+
+
+def test_sort_orders(client, auth_headers, create_task):
+    no_due = create_task(priority="critical")
+    later = create_task(due_date="2030-06-01T00:00:00", priority="low")
+    sooner = create_task(due_date="2030-01-01T00:00:00", priority="high")
+
+    assert _ids(_list(client, auth_headers)) == [sooner["id"], later["id"], no_due["id"]]
+    assert _ids(_list(client, auth_headers, sort="due_date")) == [sooner["id"], later["id"], no_due["id"]]
+    assert _ids(_list(client, auth_headers, sort="priority")) == [no_due["id"], sooner["id"], later["id"]]
+
+
+def test_cursor_pages_cover_the_list_once(client, auth_headers, create_task):
+    created = [create_task(title=f"Task {n}")["id"] for n in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = _list(client, auth_headers, **params)
+        seen += _ids(response)
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+
+    assert seen == created[::-1]
+
+
+def test_cursor_works_with_filters(client, auth_headers, create_task):
+    done = [create_task(status="done")["id"] for _ in range(3)]
+    create_task(status="todo")
+
+    first = _list(client, auth_headers, status="done", limit=2)
+    second = _list(client, auth_headers, status="done", limit=2, cursor=first.headers["x-next-cursor"])
+
+    assert _ids(first) + _ids(second) == done[::-1]
+    assert "x-next-cursor" not in second.headers
+
+
+@pytest.mark.parametrize("sort", ["updated_at", "due_date", "priority"])
+def test_cursor_with_another_sort_is_a_400(client, auth_headers, create_task, sort):
+    for n in range(3):
+        create_task(title=f"Task {n}")
+    cursor = _list(client, auth_headers, limit=2).headers["x-next-cursor"]
+
+    # Other orders page with skip/limit, so they hand out no cursor either
+    assert "x-next-cursor" not in _list(client, auth_headers, limit=2, sort=sort).headers
+    response = client.get("/api/tasks", params={"cursor": cursor, "sort": sort}, headers=auth_headers)
+    assert response.status_code == 400
+    assert "sort=created_at" in response.json()["detail"]
+
+
+def test_malformed_cursor_is_a_400(client, auth_headers):
+    response = client.get("/api/tasks", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
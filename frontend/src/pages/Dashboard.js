@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { useQuery, useQueryClient } from 'react-query';
 import { taskService } from '../services/taskService';
 import TaskList from '../components/Tasks/TaskList';
@@ -31,11 +31,18 @@ function Dashboard() {
   const [showStats, setShowStats] = useState(false);
   const queryClient = useQueryClient();
 
+  // The change feed says when to refetch, so focusing the window does not
   const { data: tasks = [], isLoading, isError } = useQuery(
     ['tasks', { status, priority }],
-    () => taskService.getTasks({ status, priority })
+    () => taskService.getTasks({ status, priority }),
+    { refetchOnWindowFocus: false }
   );
 
+  useEffect(() => taskService.subscribeToChanges(() => {
+    queryClient.invalidateQueries('tasks');
+    queryClient.invalidateQueries('taskStats');
+  }), [queryClient]);
+
   const handleOpenModal = (task = null) => {
     setEditTask(task);
     setShowModal(true);
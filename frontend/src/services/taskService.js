@@ -2,6 +2,9 @@ import axios from 'axios';
 
 const API_URL = process.env.REACT_APP_API_BASE_URL || 'http://localhost:8000/api';
 
+// Matches the retry delay the change feed asks EventSource for
+const RECONNECT_MS = 3000;
+
 // Create axios instance with base configuration
 const api = axios.create({
   baseURL: API_URL,
@@ -48,4 +51,56 @@ export const taskService = {
     const response = await api.get('/tasks/stats/summary');
     return response.data;
   },
+
+  // Live change feed. EventSource cannot send headers and its URL lands in access logs,
+  // so each connection uses a short-lived ticket from the API rather than the token.
+  // Calls onEvent with {type, task_id}, and with {type: 'resync'} after a reconnect
+  // since events sent while disconnected are lost. Returns an unsubscribe function.
+  subscribeToChanges(onEvent) {
+    if (!localStorage.getItem('token') || typeof EventSource === 'undefined') {
+      return () => {};
+    }
+    let source = null;
+    let retry = null;
+    let closed = false;
+    let opened = false;
+    const connect = async () => {
+      let ticket;
+      try {
+        ticket = (await api.post('/tasks/events/ticket')).data.ticket;
+      } catch (error) {
+        // Signed out or feed disabled: stay disconnected; otherwise try again later
+        if (!closed && !(error.response && error.response.status < 500)) {
+          retry = setTimeout(connect, RECONNECT_MS);
+        }
+        return;
+      }
+      if (closed) {
+        return;
+      }
+      source = new EventSource(`${API_URL}/tasks/events?ticket=${encodeURIComponent(ticket)}`);
+      source.onopen = () => {
+        if (opened) {
+          onEvent({ type: 'resync' });
+        }
+        opened = true;
+      };
+      source.onmessage = (message) => onEvent(JSON.parse(message.data));
+      // The ticket may have expired by the time EventSource retries, so reconnect with a new one
+      source.onerror = () => {
+        source.close();
+        if (!closed) {
+          retry = setTimeout(connect, RECONNECT_MS);
+        }
+      };
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      if (source) {
+        source.close();
+      }
+    };
+  },
 }; 
\ No newline at end of file